@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+from agent.scheduler import estimate_tokens
+
+FILE_START = "===== FILE: {path} ====="
+FILE_END = "===== END FILE: {path} ====="
+
+BATCH_INSTRUCTIONS = (
+    "The code contains several independent files, each delimited by `===== FILE: <path> =====` and "
+    "`===== END FILE: <path> =====` lines. Analyze every file separately. Every finding MUST include a "
+    "`file_path` field equal to the exact path of the file it belongs to, and its `line_hint` must be "
+    "relative to the first line of that file (the line right after its `===== FILE` marker)."
+)
+
+
+@dataclass
+class BatchingConfig:
+    enabled: bool = True
+    small_file_tokens: int = 1500  # Files up to this size are packed together
+    max_tokens: int = 6000  # Code budget of a whole batch
+    max_files: int = 10
+
+
+def pack_batches(groups: list[list[str]], languages: dict[str, str], sizes: dict[str, int], config: BatchingConfig) -> list[list[list[str]]]:
+    """
+    Packs the content groups of small files of the same language into batches within the token budget.
+
+    Every group ends up in exactly one job: a batch of several small files or a job of its own.
+    Job order follows the order of the first group of each job.
+    """
+    jobs: list[list[list[str]]] = []
+    open_batches: dict[str, tuple[list[list[str]], int]] = {}
+
+    for paths in groups:
+        file_path = paths[0]
+        tokens = estimate_tokens(sizes.get(file_path, 0))
+        if not config.enabled or tokens > config.small_file_tokens:
+            jobs.append([paths])
+            continue
+
+        language = languages[file_path]
+        batch, used = open_batches.get(language, (None, 0))
+        if batch is None or used + tokens > config.max_tokens or len(batch) >= config.max_files:
+            batch, used = [], 0
+            jobs.append(batch)
+        batch.append(paths)
+        open_batches[language] = (batch, used + tokens)
+    return jobs
+
+
+def format_batch(files: list[tuple[str, str]]) -> str:
+    """Concatenates the code of several files between delimiter lines."""
+    parts = []
+    for path, code in files:
+        parts.append(f"{FILE_START.format(path=path)}\n{code.rstrip()}\n{FILE_END.format(path=path)}")
+    return "\n\n".join(parts)
+
+
+def match_batch_path(reported: object, paths: list[str]) -> str:
+    """Resolves the `file_path` reported by the model to one of the batch paths, or raises ValueError if ambiguous."""
+    if not isinstance(reported, str) or not reported.strip():
+        raise ValueError("Finding without file_path in a batch response")
+    candidate = reported.strip().strip("`'\"").removeprefix("./")
+    if candidate in paths:
+        return candidate
+    # Tolerate a shortened path when it identifies a single file of the batch
+    matches = [p for p in paths if PurePosixPath(p).match(candidate)]
+    if len(matches) != 1:
+        raise ValueError(f"Finding file_path {reported!r} does not identify a single file of the batch")
+    return matches[0]
@@ -0,0 +1,104 @@
+import re
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from deps.deps import AnalysisStats
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*([smh]?)$")
+_CLOCK_TIME = re.compile(r"^(\d{1,2}):(\d{2})$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+@dataclass
+class BudgetConfig:
+    max_tokens: Optional[int] = None  # Input and output tokens of every model call of the run
+    max_cost: Optional[float] = None  # Estimated USD, from the prices of the `metrics` section
+    deadline: Optional[str] = None  # A duration ("90m", "2h", seconds) or the local time the run must end by ("06:30")
+
+
+def parse_deadline(value: str, now: Optional[datetime] = None) -> float:
+    """Seconds left until a deadline given as a duration or as the next occurrence of a local clock time."""
+    value = value.strip().lower()
+    if match := _DURATION.match(value):
+        return float(match[1]) * _UNITS[match[2]]
+    if match := _CLOCK_TIME.match(value):
+        now = now or datetime.now()
+        target = now.replace(hour=int(match[1]), minute=int(match[2]), second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+    raise ValueError(f"Invalid deadline {value!r}: use a duration like 90m or 2h, or a clock time like 06:30")
+
+
+class ScanBudget:
+    """
+    The token, cost and time budget of a run, shared by every repository of a batch.
+
+    An analysis only starts if its estimated tokens fit in what is left, counting the analyses in flight, and the
+    deadline has not passed. Analyses in flight always finish, so a run that runs out stops cleanly.
+    The run stops near the budget rather than at the first file that does not fit.
+    """
+
+    def __init__(self, config: BudgetConfig, model_name: str, cost_of: Callable[[str, int, int], Optional[float]]):
+        self.config = config
+        self.model_name = model_name
+        self.cost_of = cost_of
+        self.deadline = time.monotonic() + parse_deadline(config.deadline) if config.deadline else None
+        self.tokens = 0
+        self.cost = 0.0
+        self._reserved_tokens = 0
+        self._reserved_cost = 0.0
+        # Estimates of the finished analyses, to calibrate the next ones against what those actually used
+        self._estimated_tokens = 0
+        self._estimated_cost = 0.0
+        self.exhausted: Optional[str] = None  # Why every analysis is refused, once the deadline passed or the budget is spent
+
+    @property
+    def limited(self) -> bool:
+        return self.config.max_tokens is not None or self.config.max_cost is not None or self.deadline is not None
+
+    def _cost(self, model: Optional[str], input_tokens: int, output_tokens: int) -> float:
+        return self.cost_of(model or self.model_name, input_tokens, output_tokens) or 0.0
+
+    def start(self, tokens: int, model: Optional[str] = None) -> Optional[str]:
+        """
+        Reserves the estimated tokens of an analysis about to start. Returns None if it may start, or why it may not.
+
+        Once the deadline has passed, or the tokens or cost are all spent, every later analysis is refused. An analysis
+        that only does not fit in what is left is refused on its own, so the smaller files queued after it still start.
+        """
+        if self.exhausted:
+            return self.exhausted
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.exhausted = "deadline reached"
+        elif self.config.max_tokens is not None and self.tokens >= self.config.max_tokens:
+            self.exhausted = "token budget exhausted"
+        elif self.config.max_cost is not None and self.cost >= self.config.max_cost:
+            self.exhausted = "cost budget exhausted"
+        if self.exhausted:
+            return self.exhausted
+        cost = self._cost(model, tokens, 0)
+        # Estimates leave out the prompts' boilerplate and the output, so they are scaled by what the finished analyses used
+        token_scale = self.tokens / self._estimated_tokens if self._estimated_tokens else 1.0
+        cost_scale = self.cost / self._estimated_cost if self._estimated_cost else 1.0
+        if self.config.max_tokens is not None and self.tokens + (self._reserved_tokens + tokens) * token_scale > self.config.max_tokens:
+            return "token budget exhausted"
+        if self.config.max_cost is not None and self.cost + (self._reserved_cost + cost) * cost_scale > self.config.max_cost:
+            return "cost budget exhausted"
+        self._reserved_tokens += tokens
+        self._reserved_cost += cost
+        return None
+
+    def finish(self, tokens: int, model: Optional[str], stats: list[AnalysisStats]):
+        """Releases the reservation of an analysis and charges what it actually used."""
+        cost = self._cost(model, tokens, 0)
+        self._reserved_tokens -= tokens
+        self._reserved_cost -= cost
+        self._estimated_tokens += tokens
+        self._estimated_cost += cost
+        for s in stats:
+            self.tokens += s.input_tokens + s.output_tokens
+            self.cost += self._cost(model, s.input_tokens, s.output_tokens)
@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from agent.rules import LanguageRule
+
+# Verdicts of the first pass, from cheapest to most expensive to act on
+VERDICTS = ("clean", "suspicious", "needs_review")
+
+
+@dataclass
+class ModelTier:
+    model: str
+    max_iters: Optional[int] = None  # ReAct steps of the agent's analyzer, DSPy's default if None
+    chunk_max_tokens: Optional[int] = None  # Context per request, `analysis.chunk_max_tokens` if None
+
+
+@dataclass
+class CascadeConfig:
+    enabled: bool = False
+    first_pass: str = "fast"  # Tier that classifies every file
+    analysis: str = "deep"  # Tier that analyzes the escalated files
+    escalate: list[str] = field(default_factory=lambda: ["suspicious", "needs_review"])
+    tiers: dict[str, ModelTier] = field(default_factory=dict)
+
+    def tiers_for(self, rule: LanguageRule) -> tuple[ModelTier, ModelTier]:
+        """The first pass and analysis tiers of a rule, which can override the defaults in its `config.yaml`."""
+        first_pass = self.tiers.get(rule.cascade.get("first_pass", self.first_pass)) or self.tiers[self.first_pass]
+        analysis = self.tiers.get(rule.cascade.get("analysis", self.analysis)) or self.tiers[self.analysis]
+        return first_pass, analysis
+
+    def unknown_tiers(self, rules: list[LanguageRule]) -> list[str]:
+        """Tier names used by the config or a rule but not defined under `cascade.tiers`."""
+        names = [self.first_pass, self.analysis, *(name for rule in rules for name in rule.cascade.values())]
+        return sorted({name for name in names if name not in self.tiers})
+
+    def cache_key(self, rules: list[LanguageRule]) -> str:
+        """Describes the tiers of every rule, so cached findings are invalidated when the cascade changes."""
+        parts = set()
+        for rule in rules:
+            first_pass, analysis = self.tiers_for(rule)
+            parts.add(f"{rule.language}:{first_pass.model}>{analysis.model}/{analysis.max_iters}/{analysis.chunk_max_tokens}")
+        return f"cascade({','.join(sorted(self.escalate))};{';'.join(sorted(parts))})"
+
+
+def parse_verdict(verdict: str) -> str:
+    """Normalizes the first pass verdict. Anything unexpected is treated as needing a review."""
+    verdict = verdict.strip().strip("\"'`").lower().replace(" ", "_")
+    return verdict if verdict in VERDICTS else "needs_review"
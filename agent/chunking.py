@@ -0,0 +1,201 @@
+import ast
+import re
+from dataclasses import dataclass, replace
+from itertools import accumulate, pairwise
+from typing import Optional
+
+from agent.scheduler import CHARS_PER_TOKEN
+from deps.deps import Finding
+
+PYTHON_EXTS = {".py", ".pyw"}
+JS_EXTS = {".js", ".ts", ".jsx", ".tsx", ".mjs", ".cjs"}
+
+# Deepest nesting level used as a split point (e.g. module > class > method) before falling back to lines
+MAX_LEVEL = 2
+
+# Characters after which a `/` starts a regex literal rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+
+
+@dataclass
+class ChunkingConfig:
+    max_tokens: int = 12000
+    overlap_lines: int = 20
+    max_chunks: int = 20
+
+
+@dataclass
+class Chunk:
+    start_line: int  # 1-based line of the original file where the chunk starts
+    end_line: int
+    code: str
+
+
+def _python_boundaries(code: str) -> Optional[list[tuple[int, int]]]:
+    """Start lines (0-based) of statements, with their nesting level inside classes and functions."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    boundaries = []
+
+    def visit(body: list[ast.stmt], level: int):
+        for node in body:
+            # Decorators belong to the definition they decorate
+            decorators = getattr(node, "decorator_list", [])
+            start = min([node.lineno, *(d.lineno for d in decorators)])
+            boundaries.append((start - 1, level))
+            if level < MAX_LEVEL and isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(node.body, level + 1)
+
+    visit(tree.body, 0)
+    return boundaries
+
+
+def _js_boundaries(lines: list[str]) -> list[tuple[int, int]]:
+    """Line starts (0-based) with their brace depth, skipping strings, template literals, regexes and comments."""
+    boundaries = []
+    depth = 0
+    state = None  # None, "/*", a quote character or "regex"
+    template_depths: list[int] = []  # Brace depth at each `${` of nested template literals
+    prev = ""  # Last significant character outside strings and comments
+
+    for i, line in enumerate(lines):
+        if state is None and depth <= MAX_LEVEL and line.strip() and not line.lstrip().startswith("}"):
+            boundaries.append((i, depth))
+        j = 0
+        while j < len(line):
+            c = line[j]
+            nxt = line[j + 1] if j + 1 < len(line) else ""
+            if state == "/*":
+                if c == "*" and nxt == "/":
+                    state = None
+                    j += 1
+            elif state in ("'", '"', "regex"):
+                if c == "\\":
+                    j += 1
+                elif (state == "regex" and c == "/") or c == state:
+                    state = None
+                    prev = c
+            elif state == "`":
+                if c == "\\":
+                    j += 1
+                elif c == "`":
+                    state = None
+                    prev = c
+                elif c == "$" and nxt == "{":
+                    template_depths.append(depth)
+                    depth += 1
+                    state = None
+                    j += 1
+            elif c == "/" and nxt == "/":
+                break
+            elif c == "/" and nxt == "*":
+                state = "/*"
+                j += 1
+            elif c in "'\"`":
+                state = c
+            elif c == "/" and (not prev or prev in _REGEX_PRECEDERS):
+                state = "regex"
+            elif c == "{":
+                depth += 1
+                prev = c
+            elif c == "}":
+                depth = max(depth - 1, 0)
+                if template_depths and template_depths[-1] == depth:
+                    template_depths.pop()
+                    state = "`"
+                prev = c
+            elif not c.isspace():
+                prev = c
+            j += 1
+        # Strings and regexes do not span lines (template literals and block comments do)
+        if state in ("'", '"', "regex"):
+            state = None
+    return boundaries
+
+
+def split_into_chunks(code: str, extension: str, config: ChunkingConfig) -> list[Chunk]:
+    """
+    Splits oversized code into overlapping windows at function and class boundaries.
+
+    Returns a single chunk when the code fits in `config.max_tokens`.
+    """
+    lines = code.splitlines(keepends=True)
+    max_chars = config.max_tokens * CHARS_PER_TOKEN
+    if len(code) <= max_chars or not lines:
+        return [Chunk(1, max(len(lines), 1), code)]
+
+    boundaries = None
+    if extension in PYTHON_EXTS:
+        boundaries = _python_boundaries(code)
+    elif extension in JS_EXTS:
+        boundaries = _js_boundaries(lines)
+    by_level: dict[int, list[int]] = {}
+    for line, level in boundaries or []:
+        by_level.setdefault(level, []).append(line)
+
+    offsets = [0, *accumulate(len(line) for line in lines)]
+
+    def size(lo: int, hi: int) -> int:
+        return offsets[hi] - offsets[lo]
+
+    def units(lo: int, hi: int, level: int) -> list[tuple[int, int]]:
+        """Line ranges [lo, hi) that each fit in a chunk, split at the shallowest possible level."""
+        if level > MAX_LEVEL:
+            return [(i, i + 1) for i in range(lo, hi)]
+        cuts = [lo, *sorted(set(b for b in by_level.get(level, []) if lo < b < hi)), hi]
+        result = []
+        for a, b in pairwise(cuts):
+            result.extend(units(a, b, level + 1) if size(a, b) > max_chars else [(a, b)])
+        return result
+
+    # Greedily pack consecutive units into windows of at most max_chars
+    windows: list[tuple[int, int]] = []
+    for lo, hi in units(0, len(lines), 0):
+        if windows and size(windows[-1][0], hi) <= max_chars:
+            windows[-1] = (windows[-1][0], hi)
+        else:
+            windows.append((lo, hi))
+
+    chunks = []
+    for lo, hi in windows:
+        if size(lo, hi) > max_chars:
+            # A single line longer than a chunk (minified bundles): split it by characters, keeping its line number
+            line = "".join(lines[lo:hi])
+            chunks.extend(Chunk(lo + 1, hi, line[k : k + max_chars]) for k in range(0, len(line), max_chars))
+            continue
+        start = max(lo - config.overlap_lines, 0) if chunks else lo
+        chunks.append(Chunk(start + 1, hi, "".join(lines[start:hi])))
+    return chunks
+
+
+def remap_findings(findings: list[Finding], chunk: Chunk) -> list[Finding]:
+    """Maps chunk-relative `line_hint`s back to line numbers of the original file."""
+    return [replace(f, line_hint=f.line_hint + chunk.start_line - 1) if f.line_hint is not None else f for f in findings]
+
+
+def _issue_key(finding: Finding) -> tuple[Optional[int], str, str]:
+    """Identifies a finding by its line, severity and issue title, ignoring case and punctuation."""
+    return finding.line_hint, finding.severity, " ".join(re.findall(r"\w+", finding.issue.lower()))
+
+
+def merge_chunk_findings(results: list[tuple[Chunk, list[Finding]]]) -> list[Finding]:
+    """
+    Merges the remapped findings of consecutive chunks.
+
+    A finding in the overlap with the previous chunk is dropped if that chunk already reported
+    the same issue with the same severity on the same line. Different issues on one line are all kept.
+    """
+    merged: list[Finding] = []
+    previous: Optional[tuple[Chunk, list[Finding]]] = None
+    for chunk, findings in results:
+        previous_keys = {_issue_key(p) for p in previous[1]} if previous else set()
+        for f in findings:
+            in_overlap = previous and f.line_hint is not None and chunk.start_line <= f.line_hint <= previous[0].end_line
+            if in_overlap and _issue_key(f) in previous_keys:
+                continue
+            merged.append(f)
+        previous = (chunk, findings)
+    return merged
@@ -0,0 +1,188 @@
+"""
+A local stand-in for the OpenAI model, to measure the pipeline without network or tokens.
+
+`FakeLM` answers DSPy calls and `fake_agent_model` drives the pydantic-ai agent through its tools. Both
+simulate latency, token usage, retryable errors and malformed findings, deterministically for a given seed.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import dspy
+from pydantic_ai.messages import ModelMessage, ModelResponse, RetryPromptPart, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agent.scheduler import CHARS_PER_TOKEN
+
+_OUTPUT_FIELDS_SECTION = re.compile(r"Your output fields are:\n(.*?)(?:All interactions|\Z)", re.DOTALL)
+_FIELD_NAME = re.compile(r"^\d+\. `(\w+)`", re.MULTILINE)
+_INPUT_FIELD = re.compile(r"\[\[ ## (\w+) ## \]\]\n(.*?)(?=\n\n\[\[ ## |\Z)", re.DOTALL)
+_BATCH_FILE = re.compile(r"^===== FILE: (.+) =====$", re.MULTILINE)
+
+FAKE_SYSTEM_PROMPT = "You are a security reviewer. Report the vulnerabilities of the file as a JSON array of findings, with nothing else."
+
+
+@dataclass
+class FakeLMConfig:
+    latency: float = 0.5  # Seconds per call
+    latency_jitter: float = 0.5  # Fraction of the latency added or removed at random
+    output_tokens: int = 150  # Minimum completion tokens reported per call
+    error_rate: float = 0.0  # Calls failing with a retryable 429 or 503
+    malformed_rate: float = 0.0  # Responses whose findings are not valid JSON, half of them repairable locally (fenced, trailing commas)
+    findings_rate: float = 0.3  # Files reported with a finding
+    escalation_rate: float = 0.3  # Files the cascade's first pass does not classify as clean
+    seed: int = 0
+
+
+class FakeLMError(Exception):
+    """A simulated API error, retried by the scheduler like a real rate limit or outage."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Simulated API error {status_code}")
+        self.status_code = status_code
+
+
+class FakeBackend:
+    """The simulation shared by the DSPy LM and the agent model."""
+
+    def __init__(self, config: FakeLMConfig):
+        self.config = config
+        self._attempts: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def rng(self, key: str) -> random.Random:
+        """A random generator for one call. Retries of the same request draw different numbers."""
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.config.seed}:{digest}:{attempt}")
+
+    def latency(self, rng: random.Random) -> float:
+        jitter = self.config.latency * self.config.latency_jitter
+        return max(self.config.latency + rng.uniform(-jitter, jitter), 0.0)
+
+    def maybe_fail(self, rng: random.Random):
+        if rng.random() < self.config.error_rate:
+            raise FakeLMError(rng.choice((429, 503)))
+
+    def findings_json(self, paths: list[str], rng: random.Random) -> str:
+        malformed = rng.random() < self.config.malformed_rate
+        if malformed and rng.random() < 0.5:
+            return '[{"issue": "Truncated response", "severity": '
+        findings = []
+        for path in paths:
+            # Whether a file has a finding depends on the file only, so batched and single runs agree
+            if random.Random(f"{self.config.seed}:{path}").random() < self.config.findings_rate:
+                findings.append(
+                    {
+                        "file_path": path,
+                        "issue": "Simulated injection",
+                        "severity": "WARNING",
+                        "explanation": "Reported by the fake model backend.",
+                        "recommendation": "None, this finding is not real.",
+                        "line_hint": 1,
+                    }
+                )
+        if malformed:
+            # Near-valid JSON: fenced, with a trailing comma and a line hint as a string
+            for finding in findings:
+                finding["line_hint"] = "L1"
+            return "```json\n" + json.dumps(findings)[:-1] + (",]" if findings else "]") + "\n```"
+        return json.dumps(findings)
+
+    def verdict(self, path: str) -> str:
+        draw = random.Random(f"{self.config.seed}:verdict:{path}").random()
+        if draw < self.config.escalation_rate / 2:
+            return "needs_review"
+        return "suspicious" if draw < self.config.escalation_rate else "clean"
+
+
+class FakeLM(dspy.BaseLM):
+    """A DSPy LM that fills the requested output fields without any network call."""
+
+    def __init__(self, model_name: str, backend: FakeBackend):
+        super().__init__(model=f"fake/{model_name}", model_type="chat", temperature=0.0, max_tokens=1000, cache=False)
+        self.backend = backend
+
+    def _field_value(self, name: str, inputs: dict[str, str], rng: random.Random) -> Any:
+        if name == "findings_json":
+            batch_paths = _BATCH_FILE.findall(inputs.get("code", ""))
+            return self.backend.findings_json(batch_paths or [inputs.get("filename", "").strip()], rng)
+        if name == "verdict":
+            return self.backend.verdict(inputs.get("filename", "").strip())
+        if name == "next_tool_name":
+            return "finish"
+        if name == "next_tool_args":
+            return {}
+        if name == "system_prompt":
+            return FAKE_SYSTEM_PROMPT
+        return "Simulated reasoning."
+
+    def forward(self, prompt: Optional[str] = None, messages: Optional[list[dict[str, Any]]] = None, **kwargs: Any) -> SimpleNamespace:
+        messages = messages or [{"role": "user", "content": prompt or ""}]
+        system = "\n".join(str(m["content"]) for m in messages if m.get("role") == "system")
+        user = str(messages[-1]["content"])
+        rng = self.backend.rng(json.dumps(messages, sort_keys=True, default=str))
+
+        # Blocking like a real HTTP call, DSPy is called from worker threads
+        time.sleep(self.backend.latency(rng))
+        self.backend.maybe_fail(rng)
+
+        section = _OUTPUT_FIELDS_SECTION.search(system)
+        fields = _FIELD_NAME.findall(section.group(1)) if section else []
+        inputs = {name: value for name, value in _INPUT_FIELD.findall(user)}
+        values = {name: self._field_value(name, inputs, rng) for name in fields}
+        if "[[ ## completed ## ]]" in system:
+            text = "".join(f"[[ ## {name} ## ]]\n{json.dumps(v) if isinstance(v, dict) else v}\n\n" for name, v in values.items()) + "[[ ## completed ## ]]"
+        else:
+            # DSPy's JSON adapter, used as a fallback when a chat-formatted call fails
+            text = json.dumps(values)
+
+        prompt_tokens = sum(len(str(m["content"])) for m in messages) // CHARS_PER_TOKEN
+        completion_tokens = max(len(text) // CHARS_PER_TOKEN, self.backend.config.output_tokens)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            model=self.model,
+        )
+
+
+def fake_agent_model(backend: FakeBackend) -> FunctionModel:
+    """
+    A pydantic-ai model that reads the file, calls `analyze_code` with it (again if it asks for a retry) and
+    returns the findings of the tool as native structured output, like a well-behaved model would. The findings
+    themselves come from the (fake) DSPy analyzer.
+    """
+
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        parts = messages[-1].parts
+        # The first request holds the instructions of the file, later ones the tool results
+        rng = backend.rng("".join(str(getattr(p, "content", "")) for p in messages[0].parts) + str(len(messages)))
+        await asyncio.sleep(backend.latency(rng))
+        backend.maybe_fail(rng)
+
+        returned = next((p for p in reversed(parts) if isinstance(p, (ToolReturnPart, RetryPromptPart))), None)
+        if returned is None and len(messages) == 1:
+            return ModelResponse(parts=[ToolCallPart("read_current_file", {})])
+        read = [p for m in messages for p in getattr(m, "parts", []) if isinstance(p, ToolReturnPart) and p.tool_name == "read_current_file"]
+        # Analyzes the file once read, and again when the findings of the last analysis were malformed
+        if isinstance(returned, ToolReturnPart) and returned.tool_name == "read_current_file" or isinstance(returned, RetryPromptPart) and returned.tool_name == "analyze_code":
+            return ModelResponse(parts=[ToolCallPart("analyze_code", {"code": read[-1].content if read else ""})])
+
+        # Final answer: the findings returned by `analyze_code`
+        findings: Any = []
+        analyzed = [p for m in messages for p in getattr(m, "parts", []) if isinstance(p, ToolReturnPart) and p.tool_name == "analyze_code"]
+        if analyzed:
+            findings = json.loads(analyzed[-1].content)
+        return ModelResponse(parts=[TextPart(json.dumps({"findings": findings}))])
+
+    return FunctionModel(respond)
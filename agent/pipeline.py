@@ -0,0 +1,261 @@
+import asyncio
+import json
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, TypeVar
+
+from agent.batching import BATCH_INSTRUCTIONS, format_batch, match_batch_path
+from agent.cascade import ModelTier, parse_verdict
+from agent.chunking import Chunk, ChunkingConfig, merge_chunk_findings, remap_findings, split_into_chunks
+from agent.repair import coerce_line_hint, repair_json, unwrap_findings
+from agent.rules import LanguageRule
+from agent.scheduler import CHARS_PER_TOKEN, AnalysisScheduler, estimate_tokens
+from agent.triage import TriageHint, format_hints
+from agent.usage import record_agent_usage, record_dspy_usage
+from deps.deps import Finding, FindingsList
+from reporting.metrics import count, span
+
+if TYPE_CHECKING:
+    import httpx
+
+ANALYSIS_MODES = ("direct", "agent")
+# "fake" simulates the model locally, see `agent.fake_lm`
+MODEL_BACKENDS = ("openai", "fake")
+SEVERITIES = ("CRITICAL", "WARNING")
+# Times a response whose findings cannot be repaired locally is asked again, with a new rollout
+MAX_REASKS = 1
+REASK_TEMPERATURE = 0.7  # Lets the model answer differently than the malformed response
+
+R = TypeVar("R")
+
+
+def _load_findings_array(findings_json: str) -> tuple[list[Any], bool]:
+    """The findings array of a response, and whether it had to be repaired to get it."""
+    repaired = False
+    try:
+        data = json.loads(findings_json)
+    except json.JSONDecodeError:
+        data = repair_json(findings_json)
+        repaired = True
+    if not isinstance(data, list):
+        data = unwrap_findings(data)
+        repaired = True
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array of findings, got {type(data).__name__}")
+    return data, repaired
+
+
+def _parse_finding(item: Any, file_path: str) -> Finding:
+    if not isinstance(item, dict) or not item.get("issue"):
+        raise ValueError(f"Malformed finding: {item!r}")
+    severity = str(item.get("severity", "")).strip().upper()
+    if severity not in SEVERITIES:
+        raise ValueError(f"Invalid severity {item.get('severity')!r} for finding {item['issue']!r}")
+    return Finding(
+        file_path=file_path,
+        issue=str(item["issue"]),
+        severity=severity,
+        explanation=str(item.get("explanation", "")),
+        recommendation=item.get("recommendation"),
+        line_hint=coerce_line_hint(item.get("line_hint")),
+    )
+
+
+def parse_findings(findings_json: str, file_path: str) -> list[Finding]:
+    """
+    Parses the JSON array returned by `StaticCodeAnalysis` into validated findings for `file_path`.
+
+    Near-valid JSON is repaired locally (see `agent.repair`). Raises ValueError if it cannot be.
+    """
+    data, repaired = _load_findings_array(findings_json)
+    findings = [_parse_finding(item, file_path) for item in data]
+    if repaired:
+        count("findings_repaired")
+    return findings
+
+
+def parse_batch_findings(findings_json: str, paths: list[str]) -> dict[str, list[Finding]]:
+    """Parses the findings of a batch and splits them by file. Raises ValueError if any finding is malformed or ambiguous."""
+    findings: dict[str, list[Finding]] = {path: [] for path in paths}
+    data, repaired = _load_findings_array(findings_json)
+    for item in data:
+        file_path = match_batch_path(item.get("file_path") if isinstance(item, dict) else None, paths)
+        findings[file_path].append(_parse_finding(item, file_path))
+    if repaired:
+        count("findings_repaired")
+    return findings
+
+
+def reask_options(rollout_id: int) -> dict[str, Any]:
+    """
+    The DSPy call options of the `rollout_id`th re-ask of a response, none for the first ask.
+
+    A new rollout id bypasses DSPy's cache, which would return the same malformed response.
+    """
+    return {"config": {"rollout_id": rollout_id, "temperature": REASK_TEMPERATURE}} if rollout_id else {}
+
+
+async def ask_for_findings(ask: Callable[[int], Awaitable[str]], parse: Callable[[str], R], label: str) -> R:
+    """
+    Parses the findings JSON returned by `ask(rollout_id)`, repairing it locally if needed.
+
+    The model is only asked again, up to `MAX_REASKS` times, when a response cannot be repaired.
+    """
+    findings_json = await ask(0)
+    for rollout_id in range(1, MAX_REASKS + 1):
+        try:
+            return parse(findings_json)
+        except ValueError as e:
+            print(f"[!] Could not parse the findings of {label} ({e}), asking the model again...")
+            count("findings_reasked")
+        findings_json = await ask(rollout_id)
+    return parse(findings_json)
+
+
+async def analyze_direct(
+    repo_root: Path,
+    file_path: str,
+    rule: LanguageRule,
+    scheduler: AnalysisScheduler,
+    chunking: ChunkingConfig,
+    hints: Optional[list[TriageHint]] = None,
+    tier: Optional[ModelTier] = None,
+) -> list[Finding]:
+    """
+    Reads the file locally and makes a single structured `StaticCodeAnalysis` call, with the model of `tier` if given.
+
+    Files larger than `chunking.max_tokens` are split into overlapping chunks that are analyzed in parallel,
+    with their `line_hint`s mapped back to the original file. Pre-triage `hints` are added to the instructions
+    of the chunks they fall in. A response that cannot be repaired locally is asked again, see `ask_for_findings`.
+    """
+    from agent.pydantic_agent import call_module, direct_analyzer, lm_for
+
+    lm = lm_for(tier)
+
+    code = (repo_root / file_path).read_text(encoding="utf-8", errors="ignore")
+    chunks = split_into_chunks(code, Path(file_path).suffix.lower(), chunking)
+    if len(chunks) > chunking.max_chunks:
+        print(f"[!] {file_path} needs {len(chunks)} chunks, only the first {chunking.max_chunks} are analyzed.")
+        chunks = chunks[: chunking.max_chunks]
+
+    async def analyze_chunk(chunk: Chunk) -> tuple[Chunk, list[Finding]]:
+        filename = file_path if len(chunks) == 1 else f"{file_path} (part starting at line {chunk.start_line}, line numbers relative to this part)"
+        hints_text = format_hints(hints or [], chunk.start_line, chunk.end_line)
+        instructions = f"{rule.prompt}\n\n{hints_text}" if hints_text else rule.prompt
+
+        async def ask(rollout_id: int) -> str:
+            async def call() -> str:
+                with span("dspy_call", file=file_path):
+                    result = await asyncio.to_thread(call_module, direct_analyzer, lm, **reask_options(rollout_id), code=chunk.code, filename=filename, language_instructions=instructions)
+                record_dspy_usage(result)
+                return result.findings_json
+
+            return await scheduler.call(call, tokens=estimate_tokens(len(chunk.code)), label=file_path)
+
+        findings = await ask_for_findings(ask, lambda findings_json: parse_findings(findings_json, file_path), file_path)
+        return chunk, remap_findings(findings, chunk)
+
+    results = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+    return merge_chunk_findings(results)
+
+
+async def analyze_batch(
+    repo_root: Path,
+    file_paths: list[str],
+    rule: LanguageRule,
+    scheduler: AnalysisScheduler,
+    hints: Optional[dict[str, list[TriageHint]]] = None,
+    tier: Optional[ModelTier] = None,
+) -> dict[str, list[Finding]]:
+    """
+    Analyzes several small files of the same rule in a single `StaticCodeAnalysis` call.
+
+    Raises ValueError if the response cannot be repaired or split back into files, in which case the caller
+    falls back to analyzing them one by one rather than asking for the whole batch again.
+    """
+    from agent.pydantic_agent import call_module, direct_analyzer, lm_for
+
+    lm = lm_for(tier)
+
+    files = [(path, (repo_root / path).read_text(encoding="utf-8", errors="ignore")) for path in file_paths]
+    code = format_batch(files)
+
+    instructions = f"{rule.prompt}\n\n{BATCH_INSTRUCTIONS}"
+    for path in file_paths:
+        hints_text = format_hints((hints or {}).get(path, []))
+        if hints_text:
+            instructions += f"\n\nFor `{path}`: {hints_text}"
+
+    async def call() -> dict[str, list[Finding]]:
+        with span("dspy_call", file=", ".join(file_paths)):
+            result = await asyncio.to_thread(call_module, direct_analyzer, lm, code=code, filename=", ".join(file_paths), language_instructions=instructions)
+        record_dspy_usage(result)
+        return parse_batch_findings(result.findings_json, file_paths)
+
+    return await scheduler.call(call, tokens=estimate_tokens(len(code)), label=f"batch of {len(file_paths)} files")
+
+
+async def analyze_with_agent(
+    repo_root: Path,
+    file_path: str,
+    rule: LanguageRule,
+    client: Optional["httpx.AsyncClient"],
+    hints: Optional[list[TriageHint]] = None,
+    tier: Optional[ModelTier] = None,
+) -> list[Finding]:
+    """Lets the pydantic-ai agent read the file and call the ReAct analyzer through its tools, with the models of `tier` if given."""
+    from agent.pydantic_agent import Deps, agent_model_for, analyzer_for, lm_for, security_agent
+
+    deps = Deps(
+        repo_root=repo_root,
+        file_index=file_path,
+        analyzer=analyzer_for(tier),
+        active_rule=rule,
+        http=client,
+        selector=None,
+        lm=lm_for(tier),
+    )
+
+    instructions = f"Analyze the file '{file_path}' using the rules for {rule.language}. First, call `read_current_file` to get the code, then call `analyze_code` to analyze it."
+    hints_text = format_hints(hints or [])
+    if hints_text:
+        instructions = f"{instructions}\n\n{hints_text}"
+
+    with span("agent_run", file=file_path):
+        result = await security_agent.run(instructions, deps=deps, model=agent_model_for(tier, client))
+    # `usage` is a method in pydantic-ai 1.x and a property since 2.0
+    record_agent_usage(result.usage() if callable(result.usage) else result.usage)
+    findings_list: FindingsList = result.output
+    return list(findings_list.findings)
+
+
+async def classify_file(
+    repo_root: Path,
+    file_path: str,
+    rule: LanguageRule,
+    scheduler: AnalysisScheduler,
+    tier: ModelTier,
+    max_tokens: int,
+    hints: Optional[list[TriageHint]] = None,
+) -> str:
+    """
+    First pass of the cascade: classifies a file as clean, suspicious or needs_review with the cheap `tier`.
+
+    Files larger than `max_tokens` are not worth a cheap look and need a review.
+    """
+    from agent.pydantic_agent import call_module, classifier, lm_for
+
+    code = (repo_root / file_path).read_text(encoding="utf-8", errors="ignore")
+    if len(code) > max_tokens * CHARS_PER_TOKEN:
+        return "needs_review"
+    hints_text = format_hints(hints or [])
+    instructions = f"{rule.prompt}\n\n{hints_text}" if hints_text else rule.prompt
+    lm = lm_for(tier)
+
+    async def call() -> str:
+        with span("classify_call", file=file_path):
+            result = await asyncio.to_thread(call_module, classifier, lm, code=code, filename=file_path, language_instructions=instructions)
+        record_dspy_usage(result)
+        return parse_verdict(str(result.verdict))
+
+    return await scheduler.call(call, tokens=estimate_tokens(len(code)), label=file_path)
@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+PROMPT_CACHE_DIR = Path(".agent_prompts")
+
+# Placeholder passed to the PromptComposer instead of the real file name, substituted on every file
+FILE_PLACEHOLDER = "{{FILE_PATH}}"
+
+
+def prompt_key(*parts: str) -> str:
+    """Hash of everything the composed prompt depends on (rule prompt, mission, contract, model...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def render_system_prompt(template: str, file_path: str) -> str:
+    """Fills the file name into a cached system prompt template."""
+    if FILE_PLACEHOLDER in template:
+        return template.replace(FILE_PLACEHOLDER, file_path)
+    # The composer did not keep the placeholder, so state the file explicitly
+    return f"{template}\n\nFile to analyze: {file_path}"
+
+
+class PromptCache:
+    """Composed system prompts, cached in memory and on disk so each is built once until its inputs change."""
+
+    def __init__(self, root: Path = PROMPT_CACHE_DIR):
+        self.root = root
+        self._memory: dict[str, str] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.txt"
+
+    async def get_or_compose(self, key: str, compose: Callable[[], Awaitable[str]]) -> str:
+        if key in self._memory:
+            return self._memory[key]
+
+        # Concurrent files of the same language wait for a single composition
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            if key in self._memory:
+                return self._memory[key]
+
+            path = self._path(key)
+            if path.exists():
+                template = path.read_text(encoding="utf-8")
+            else:
+                template = await compose()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # A unique temporary name, so two processes composing the same prompt never publish a mix of both
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=f"{key}.", suffix=".tmp", delete=False) as tmp:
+                    tmp.write(template)
+                os.replace(tmp.name, path)
+
+            self._memory[key] = template
+            return template
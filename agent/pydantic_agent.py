@@ -1,35 +1,138 @@
+import asyncio
+import json
 import os
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Optional
 
 import dspy
-from pydantic_ai import Agent, RunContext
+from dspy.utils.callback import BaseCallback
+from pydantic_ai import Agent, ModelRetry, NativeOutput, RunContext
 
+from agent.pipeline import MAX_REASKS, parse_findings, reask_options
+from agent.prompt_cache import FILE_PLACEHOLDER, PromptCache, prompt_key, render_system_prompt
+from agent.usage import count_lm_call, record_dspy_usage
+from config import init_telemetry, load_fake_lm_config, load_model_id, load_model_name
 from deps.deps import Deps, FindingsList
-from prompts.signatures import PromptComposer, StaticCodeAnalysis
+from prompts.signatures import FileClassification, PromptComposer, StaticCodeAnalysis
+from reporting.metrics import count, span
 
-# DSPy config
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY is missing from .env")
+if TYPE_CHECKING:
+    import httpx
 
-logfire_token = os.getenv("LOGFIRE_TOKEN")
-if not logfire_token:
-    raise RuntimeError("LOGFIRE_TOKEN is missing from .env")
+    from agent.cascade import ModelTier
 
-lm = dspy.LM("openai/gpt-4o-mini", api_key=api_key)
-dspy.configure(lm=lm)
+model_name = load_model_name()
 
-# DSPy Modules
+# DSPy Modules. They only need a configured LM when called, see `init_models`
 analyzer = dspy.ReAct(StaticCodeAnalysis, tools=[])
+direct_analyzer = dspy.Predict(StaticCodeAnalysis)
 prompter = dspy.Predict(PromptComposer)
-
-# Pydantic AI Agent
+classifier = dspy.Predict(FileClassification)
+prompt_cache = PromptCache()
+
+lm: Optional[dspy.BaseLM] = None
+model_id = model_name  # Name of the model in the prompt cache keys
+agent_model: Any = None  # Replaces the agent's OpenAI model on other backends
+backend_name = "openai"
+
+# LMs and ReAct analyzers of the cascade tiers, created on first use
+_tier_lms: dict[str, dspy.BaseLM] = {}
+_tier_analyzers: dict[int, dspy.Module] = {}
+_fake_backend: Any = None
+# OpenAI models of the agent bound to the run's HTTP client, by model name and client
+_openai_models: dict[tuple[str, int], Any] = {}
+
+# Pydantic AI Agent. The OpenAI model is resolved on the first run, so importing this module needs no API key.
+# Its output uses the model's native structured output, so the API itself enforces the JSON schema of the findings
 security_agent = Agent(
-    "openai:gpt-4o-mini",
+    f"openai:{model_name}",
     deps_type=Deps,
-    output_type=FindingsList,
+    output_type=NativeOutput(FindingsList),
+    defer_model_check=True,
 )
 
 
+class UsageCallback(BaseCallback):
+    """Counts every DSPy LM call against the file being analyzed."""
+
+    def on_lm_end(self, call_id: str, outputs: Optional[dict[str, Any]], exception: Optional[Exception] = None):
+        count_lm_call()
+
+
+def init_models(backend: str = "openai"):
+    """Configures DSPy and the agent for `backend` and enables telemetry. Called once, before the first analysis."""
+    global lm, model_id, agent_model, backend_name, _fake_backend
+    if lm is not None:
+        return
+
+    model_id = load_model_id(backend)
+    backend_name = backend
+    if backend == "fake":
+        from agent.fake_lm import FakeBackend, fake_agent_model
+
+        _fake_backend = FakeBackend(load_fake_lm_config())
+        agent_model = fake_agent_model(_fake_backend)
+    elif not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is missing from .env")
+
+    init_telemetry()
+    lm = _make_lm(model_name)
+    dspy.configure(lm=lm, track_usage=True, callbacks=[UsageCallback()])
+
+
+def _make_lm(name: str) -> dspy.BaseLM:
+    if backend_name == "fake":
+        from agent.fake_lm import FakeLM
+
+        return FakeLM(name, _fake_backend)
+    return dspy.LM(f"openai/{name}", api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def lm_for(tier: Optional["ModelTier"]) -> Optional[dspy.BaseLM]:
+    """The LM of a cascade tier, or None for the configured one."""
+    if tier is None or tier.model == model_name:
+        return None
+    if tier.model not in _tier_lms:
+        _tier_lms[tier.model] = _make_lm(tier.model)
+    return _tier_lms[tier.model]
+
+
+def agent_model_for(tier: Optional["ModelTier"], http_client: Optional["httpx.AsyncClient"] = None) -> Any:
+    """
+    The model of the pydantic-ai agent for a cascade tier, sending its requests through `http_client` if given,
+    so they share the connection pool and limits of the run. The fake backend serves every tier.
+    """
+    if backend_name == "fake":
+        return agent_model
+    name = tier.model if tier is not None else model_name
+    if http_client is None:
+        return f"openai:{name}"
+    key = (name, id(http_client))
+    if key not in _openai_models:
+        from pydantic_ai.models import infer_model
+        from pydantic_ai.providers.openai import OpenAIProvider
+
+        _openai_models[key] = infer_model(f"openai:{name}", lambda _: OpenAIProvider(http_client=http_client))
+    return _openai_models[key]
+
+
+def analyzer_for(tier: Optional["ModelTier"]) -> dspy.Module:
+    """The ReAct analyzer of the agent, with the number of steps of a cascade tier."""
+    if tier is None or tier.max_iters is None:
+        return analyzer
+    if tier.max_iters not in _tier_analyzers:
+        _tier_analyzers[tier.max_iters] = dspy.ReAct(StaticCodeAnalysis, tools=[], max_iters=tier.max_iters)
+    return _tier_analyzers[tier.max_iters]
+
+
+def call_module(module: dspy.Module, module_lm: Optional[dspy.BaseLM], **inputs: Any) -> Any:
+    """Calls a DSPy module with `module_lm`, or with the configured LM if None. Blocking, called from worker threads."""
+    if module_lm is None:
+        return module(**inputs)
+    with dspy.context(lm=module_lm):
+        return module(**inputs)
+
+
 @security_agent.system_prompt
 async def system_prompt(ctx: RunContext[Deps]) -> str:
     rule = ctx.deps.active_rule
@@ -41,17 +144,27 @@ async def system_prompt(ctx: RunContext[Deps]) -> str:
         mission = f"Evaluate security vulnerabilities in a {rule.language} file."
         lang_instructions = rule.prompt
 
-    output_contract = "Return a JSON array: [{file_path, issue, severity, explanation, recommendation, line_hint?}]. Nothing but the JSON, with no additional text."
+    output_contract = (
+        "Return a JSON object {findings: [{file_path, issue, severity, explanation, recommendation, line_hint}]}, line_hint being a line number or null. Nothing but the JSON, with no additional text."
+    )
     tools_hint = "Available tools:\n- read_current_file(): returns the code of the file currently being analyzed.\n- analyze_code(code): analyzes the code and returns findings in JSON format."
 
-    res = prompter(
-        mission=mission,
-        file_list=f"File to analyze: {ctx.deps.file_index}",
-        severity_policy=lang_instructions,  # Severity rules are now part of the language prompt
-        output_contract=output_contract,
-        tools_hint=tools_hint,
-    )
-    return res.system_prompt
+    def compose() -> str:
+        with span("prompt_composition", language=rule.language if rule else None):
+            res = prompter(
+                mission=mission,
+                file_list=f"File to analyze: {FILE_PLACEHOLDER}",
+                severity_policy=lang_instructions,  # Severity rules are now part of the language prompt
+                output_contract=output_contract,
+                tools_hint=tools_hint,
+            )
+        record_dspy_usage(res)
+        return res.system_prompt
+
+    # The composed prompt only depends on the rule and the contract, so it is built once and reused for every file
+    key = prompt_key(model_id, mission, lang_instructions, output_contract, tools_hint)
+    template = await prompt_cache.get_or_compose(key, lambda: asyncio.to_thread(compose))
+    return render_system_prompt(template, ctx.deps.file_index)
 
 
 # TOOLS
@@ -65,11 +178,19 @@ async def read_current_file(ctx: RunContext[Deps]) -> str:
     return file_path.read_text(encoding="utf-8", errors="ignore")
 
 
-@security_agent.tool
+@security_agent.tool(retries=MAX_REASKS)
 async def analyze_code(ctx: RunContext[Deps], code: str) -> str:
     """Runs the DSPy analysis on the code and returns the JSON of findings."""
     rule = ctx.deps.active_rule
     instructions = rule.prompt if rule else ""
 
-    result = ctx.deps.analyzer(code=code, filename=ctx.deps.file_index, language_instructions=instructions)
-    return result.findings_json
+    with span("dspy_call", file=ctx.deps.file_index):
+        result = await asyncio.to_thread(call_module, ctx.deps.analyzer, ctx.deps.lm, **reask_options(ctx.retry), code=code, filename=ctx.deps.file_index, language_instructions=instructions)
+    record_dspy_usage(result)
+    # Repaired locally when possible: the agent only calls the analyzer again for findings that cannot be
+    try:
+        findings = parse_findings(result.findings_json, ctx.deps.file_index)
+    except ValueError as e:
+        count("findings_reasked")
+        raise ModelRetry(f"The analysis returned malformed findings ({e}). Call `analyze_code` again.") from e
+    return json.dumps([asdict(f) for f in findings])
@@ -0,0 +1,83 @@
+"""
+Local repair of near-valid findings JSON, so a response that is only slightly off does not cost another model call.
+
+Handles the usual slips of a model asked for a bare JSON array: Markdown code fences, prose around the JSON,
+trailing commas, the array wrapped in an object or a single finding without its array.
+"""
+
+import json
+import re
+from typing import Any, Optional
+
+_CODE_FENCE = re.compile(r"```[\w-]*\s*\n(.*?)```", re.DOTALL)
+_LINE_REFERENCE = re.compile(r"^\s*(?:l(?:ines?)?\.?\s*)?(\d+)(?:\s*[-:,]\s*\d+)?\s*$", re.IGNORECASE)
+# Keys a model may wrap the findings array in, `__root__` being the agent's former output format
+_WRAPPER_KEYS = ("findings", "__root__", "items", "results")
+
+
+def _strip_code_fence(text: str) -> str:
+    match = _CODE_FENCE.search(text)
+    return match.group(1) if match else text
+
+
+def _outermost_json(text: str) -> str:
+    """The text from the first `[` or `{` to the last matching bracket, dropping any prose around it."""
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    end = text.rfind("]" if text[start] == "[" else "}")
+    return text[start : end + 1] if end > start else text[start:]
+
+
+def _drop_trailing_commas(text: str) -> str:
+    """Removes the commas right before a closing bracket, outside of strings."""
+    out: list[str] = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "," and text[i + 1 :].lstrip()[:1] in ("]", "}"):
+            continue
+        out.append(char)
+    return "".join(out)
+
+
+def repair_json(text: str) -> Any:
+    """
+    Parses the near-valid JSON of a findings response, or raises json.JSONDecodeError if it cannot be repaired.
+
+    Truncated responses are not completed: findings cut in half would be guessed, not repaired.
+    """
+    return json.loads(_drop_trailing_commas(_outermost_json(_strip_code_fence(text).strip())))
+
+
+def unwrap_findings(data: Any) -> Any:
+    """The findings array of a response that wrapped it in an object, or that returned a single finding."""
+    if isinstance(data, dict):
+        for key in _WRAPPER_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key]
+        if "issue" in data:
+            return [data]
+    return data
+
+
+def coerce_line_hint(value: Any) -> Optional[int]:
+    """The line number of a `line_hint` given as an int, or as a string like "12", "L12", "line 12" or "12-15". None for a code snippet."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and (match := _LINE_REFERENCE.match(value)):
+        return int(match[1])
+    return None
@@ -1,15 +1,33 @@
-from dataclasses import dataclass
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from functools import cached_property
 from pathlib import Path
 from typing import Optional
 
 import yaml
 
+from agent.triage import TriageRules, load_triage_rules
+
 
 @dataclass
 class LanguageRule:
     language: str
     extensions: list[str]
     prompt: str
+    triage: Optional[TriageRules] = None  # Local pre-triage patterns from `triage.yaml`
+    cascade: dict[str, str] = field(default_factory=dict)  # Tier names overriding `cascade.first_pass` and `cascade.analysis`
+
+    @cached_property
+    def prompt_hash(self) -> str:
+        """
+        Hash of the rule prompt and its triage patterns, used to invalidate cached results when `prompt.md` or
+        `triage.yaml` changes. The lines the patterns flag are passed to the model with the prompt.
+        """
+        h = hashlib.sha256(self.prompt.encode("utf-8"))
+        if self.triage:
+            h.update(json.dumps(asdict(self.triage), sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
 
 
 def load_rules(rules_dir: Path, allowed_extensions: Optional[set[str]] = None) -> dict[str, LanguageRule]:
@@ -33,7 +51,13 @@ def load_rules(rules_dir: Path, allowed_extensions: Optional[set[str]] = None) -
 
         prompt = prompt_path.read_text(encoding="utf-8").strip()
 
-        rule = LanguageRule(language=config.get("language", lang_dir.name), extensions=config.get("extensions", []), prompt=prompt)
+        rule = LanguageRule(
+            language=config.get("language", lang_dir.name),
+            extensions=config.get("extensions", []),
+            prompt=prompt,
+            triage=load_triage_rules(lang_dir / "triage.yaml"),
+            cascade=config.get("cascade") or {},
+        )
 
         # If no filter is specified, all rules are loaded
         if allowed_extensions is None:
@@ -46,3 +70,8 @@ def load_rules(rules_dir: Path, allowed_extensions: Optional[set[str]] = None) -
                     rules_map[ext.lower()] = rule
 
     return rules_map
+
+
+def unique_rules(rules_map: dict[str, LanguageRule]) -> list[LanguageRule]:
+    """The distinct rules of an extension map, where a rule appears once per extension."""
+    return list({id(rule): rule for rule in rules_map.values()}.values())
@@ -0,0 +1,160 @@
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import Optional, TypeVar
+
+from agent.usage import record_model_call
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# HTTP status codes that are worth retrying (rate limits and transient server errors)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class SchedulerConfig:
+    workers: int = 4
+    requests_per_minute: int = 0  # 0 disables the limit
+    tokens_per_minute: int = 0  # 0 disables the limit
+    max_retries: int = 3
+    backoff_base: float = 1.0
+    backoff_max: float = 30.0
+
+
+class RateLimiter:
+    """Sliding-window limiter for requests per minute and tokens per minute."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, window: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events: deque[tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            return False
+        # A single request larger than the whole budget is let through once the window is empty
+        return not (self.tokens_per_minute and self._events and self._tokens_in_window + tokens > self.tokens_per_minute)
+
+    async def acquire(self, tokens: int = 0):
+        """Waits until a request of `tokens` estimated tokens fits in the current window."""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        # Holding the lock while sleeping keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if self._fits(tokens):
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                await asyncio.sleep(max(self.window - (now - self._events[0][0]), 0.05))
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """Extracts an HTTP status code from openai, httpx or pydantic-ai exceptions."""
+    for candidate in (exc, getattr(exc, "response", None)):
+        code = getattr(candidate, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code_of(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    # Network-level failures (timeouts, dropped connections) carry no status code
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in {"ConnectError", "ReadTimeout", "RemoteProtocolError", "APIConnectionError", "APITimeoutError"}
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AnalysisScheduler:
+    """Runs analysis jobs with bounded concurrency, rate limiting and retries."""
+
+    def __init__(self, config: SchedulerConfig):
+        self.config = config
+        self.limiter = RateLimiter(config.requests_per_minute, config.tokens_per_minute)
+        self.in_flight = 0
+        self.completed = 0
+        self.total = 0
+        # Shared by every `map` call, so concurrent scans of several repos draw from one pool of workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.config.backoff_max)
+        # Full jitter: uniform between 0 and the exponential cap
+        return random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2**attempt))
+
+    async def _attempt(self, fn: Callable[[], Awaitable[R]], retry: bool) -> R:
+        # Rate limiting and backoff waits are left out of the model latency of the current file
+        start = time.perf_counter()
+        try:
+            return await fn()
+        finally:
+            record_model_call(time.perf_counter() - start, retry)
+
+    async def call(self, fn: Callable[[], Awaitable[R]], tokens: int = 0, label: str = "") -> R:
+        """Calls `fn` under the rate limiter, retrying 429/5xx errors with jittered backoff."""
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens)
+            try:
+                return await self._attempt(fn, retry=attempt > 0)
+            except Exception as e:
+                if attempt >= self.config.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                print(f"[!] Retrying {label or 'request'} in {delay:.1f}s (attempt {attempt}/{self.config.max_retries}): {e}")
+                await asyncio.sleep(delay)
+
+    async def map(self, items: Iterable[T], job: Callable[[T], Awaitable[R]]) -> list[R]:
+        """Runs `job` over every item with at most `workers` jobs in flight across all `map` calls, preserving input order."""
+        items = list(items)
+        self.total += len(items)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, self.config.workers))
+        semaphore = self._semaphore
+
+        async def run(item: T) -> R:
+            async with semaphore:
+                self.in_flight += 1
+                try:
+                    return await job(item)
+                finally:
+                    self.in_flight -= 1
+                    self.completed += 1
+                    print(f"[*] Progress: {self.completed}/{self.total} completed, {self.in_flight} in flight")
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+
+def estimate_tokens(n_chars: int) -> int:
+    """Rough token estimate for rate limiting (about 4 characters per token)."""
+    return n_chars // CHARS_PER_TOKEN + 1
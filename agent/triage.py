@@ -0,0 +1,196 @@
+import ast
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+
+# Below this many files a process pool costs more to start than it saves
+PROCESS_POOL_THRESHOLD = 200
+HINT_CONTEXT_LINES = 2
+MAX_HINTS_PER_PATTERN = 5
+# The arguments of a call up to its closing parenthesis, allowing one level of nested parentheses
+_CALL_ARGUMENTS = r"(?:[^()]|\([^()]*\))*?"
+
+
+@dataclass
+class TriageConfig:
+    enabled: bool = True
+    skip_clean: bool = False  # True skips clean files instead of analyzing them after the flagged ones
+    workers: Optional[int] = None
+
+
+@dataclass
+class TriagePattern:
+    name: str
+    weight: int = 1
+    regex: Optional[str] = None  # Matched line by line
+    call: Optional[str] = None  # Dotted call name matched with `ast` on Python files, e.g. "subprocess.run"
+    kwargs: dict[str, Any] = field(default_factory=dict)  # Constant keyword arguments the call must have
+    contains: list[str] = field(default_factory=list)  # Cheap prefilter: the regex only runs if one of these substrings is present (case-insensitive)
+
+
+@dataclass
+class TriageRules:
+    patterns: list[TriagePattern]
+    min_score: int = 1  # Files scoring below are considered clean
+
+
+@dataclass
+class TriageHint:
+    name: str
+    start_line: int
+    end_line: int
+
+
+@dataclass
+class TriageResult:
+    file_path: str
+    score: int
+    hints: list[TriageHint]
+
+
+def load_triage_rules(path: Path) -> Optional[TriageRules]:
+    """Loads the `triage.yaml` that sits next to a rule's `prompt.md`."""
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    patterns = [TriagePattern(**p) for p in config.get("patterns", [])]
+    for pattern in patterns:
+        pattern.contains = [c.lower() for c in pattern.contains]
+    return TriageRules(patterns=patterns, min_score=config.get("min_score", 1))
+
+
+def _call_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        parent = _call_name(node.value)
+        return f"{parent}.{node.attr}" if parent else node.attr
+    return None
+
+
+def _call_matches(node: ast.Call, pattern: TriagePattern) -> bool:
+    name = _call_name(node.func)
+    if not name:
+        return False
+    if "." not in pattern.call:
+        # Builtins like `eval` must not match methods like `model.eval()`
+        if name != pattern.call:
+            return False
+    # `from subprocess import run` leaves only the last part of the name
+    elif not (name == pattern.call or pattern.call.endswith(f".{name}") or name.endswith(f".{pattern.call}")):
+        return False
+    keywords = {k.arg: k.value for k in node.keywords if k.arg}
+    for arg, expected in pattern.kwargs.items():
+        value = keywords.get(arg)
+        if not isinstance(value, ast.Constant) or value.value != expected:
+            return False
+    return True
+
+
+def _literal_regex(value: Any) -> str:
+    """A constant keyword argument as written in Python or JavaScript source."""
+    if isinstance(value, bool):
+        return "(?:True|true)" if value else "(?:False|false)"
+    if value is None:
+        return "(?:None|null)"
+    if isinstance(value, str):
+        return rf"[\"'`]{re.escape(value)}[\"'`]"
+    return re.escape(str(value))
+
+
+def _call_regex(pattern: TriagePattern) -> re.Pattern[str]:
+    """
+    Textual fallback of a call pattern: the call, with each of its `kwargs` inside the parentheses, either as a
+    Python keyword argument (`shell=True`) or as a key of a JavaScript options object (`{ shell: true }`).
+    """
+    required = "".join(rf"(?={_CALL_ARGUMENTS}\b{re.escape(arg)}[\"']?\s*[=:]\s*{_literal_regex(value)}(?!\w))" for arg, value in pattern.kwargs.items())
+    return re.compile(rf"\b{re.escape(pattern.call)}\s*\({required}")
+
+
+def _hint(name: str, start: int, end: int) -> TriageHint:
+    return TriageHint(name=name, start_line=max(start - HINT_CONTEXT_LINES, 1), end_line=end + HINT_CONTEXT_LINES)
+
+
+def triage_code(code: str, file_path: str, rules: TriageRules) -> TriageResult:
+    """Scores a file by the sinks, sources and secrets it contains and records where they are."""
+    lines = code.split("\n")
+    matched: dict[str, list[TriageHint]] = {}
+
+    # Parsing and walking the tree is the expensive part, so it is skipped when no call name appears in the text
+    call_patterns = [p for p in rules.patterns if p.call and p.call.rsplit(".", 1)[-1] in code]
+    tree = None
+    if call_patterns and file_path.endswith((".py", ".pyw")):
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            tree = None
+    if tree is not None:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                for pattern in call_patterns:
+                    if _call_matches(node, pattern):
+                        matched.setdefault(pattern.name, []).append(_hint(pattern.name, node.lineno, node.end_lineno or node.lineno))
+
+    regexes = [(p, re.compile(p.regex, re.MULTILINE)) for p in rules.patterns if p.regex]
+    if tree is None:
+        # Without a syntax tree (JS/TS or invalid Python), fall back to matching the calls textually
+        regexes += [(p, _call_regex(p)) for p in call_patterns]
+
+    # One search over the whole file per pattern, mapping match offsets back to line numbers
+    lowered = code.lower()
+    for pattern, regex in regexes:
+        if pattern.contains and not any(s in lowered for s in pattern.contains):
+            continue
+        for m in regex.finditer(code):
+            line_no = code.count("\n", 0, m.start()) + 1
+            if lines[line_no - 1].lstrip().startswith(("#", "//", "*")):
+                continue
+            hints = matched.setdefault(pattern.name, [])
+            if len(hints) >= MAX_HINTS_PER_PATTERN:
+                break
+            hints.append(_hint(pattern.name, line_no, line_no))
+
+    weights = {p.name: p.weight for p in rules.patterns}
+    score = sum(weights[name] for name in matched)
+    hints = sorted((h for hs in matched.values() for h in hs[:MAX_HINTS_PER_PATTERN]), key=lambda h: h.start_line)
+    return TriageResult(file_path=file_path, score=score, hints=hints)
+
+
+def _triage_file(args: tuple[Path, str, TriageRules]) -> TriageResult:
+    repo_root, file_path, rules = args
+    try:
+        code = (repo_root / file_path).read_text(encoding="utf-8", errors="ignore")
+    except OSError:
+        # Unreadable files are left to the model, which reports the error
+        return TriageResult(file_path=file_path, score=rules.min_score, hints=[])
+    return triage_code(code, file_path, rules)
+
+
+def triage_files(repo_root: Path, files: dict[str, TriageRules], workers: Optional[int] = None) -> dict[str, TriageResult]:
+    """Triages every file with the rules of its language, in a process pool for large scans."""
+    jobs = [(repo_root, file_path, rules) for file_path, rules in files.items()]
+    if len(jobs) < PROCESS_POOL_THRESHOLD:
+        results = [_triage_file(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_triage_file, jobs, chunksize=32))
+    return {r.file_path: r for r in results}
+
+
+def format_hints(hints: list[TriageHint], first_line: int = 1, last_line: Optional[int] = None) -> str:
+    """
+    Describes the flagged line ranges for the model, relative to a chunk starting at `first_line`.
+
+    Returns an empty string when no hint falls inside the chunk.
+    """
+    relevant = [h for h in hints if h.end_line >= first_line and (last_line is None or h.start_line <= last_line)]
+    if not relevant:
+        return ""
+    offset = first_line - 1
+    lines = [f"- lines {max(h.start_line - offset, 1)}-{h.end_line - offset}: {h.name}" for h in relevant]
+    return "A local pre-analysis flagged these lines. Review them first, but report any other issue you find too:\n" + "\n".join(lines)
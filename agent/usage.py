@@ -0,0 +1,44 @@
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from deps.deps import AnalysisStats
+
+# Stats of the file being analyzed by the current task. asyncio tasks and `asyncio.to_thread` copy the context,
+# so DSPy calls made on behalf of a file are attributed to it even when files are analyzed concurrently.
+current_stats: ContextVar[Optional[AnalysisStats]] = ContextVar("current_stats", default=None)
+
+
+def count_lm_call():
+    """Counts a DSPy LM call against the file being analyzed."""
+    stats = current_stats.get()
+    if stats is not None:
+        stats.llm_calls += 1
+
+
+def record_model_call(seconds: float, retry: bool = False):
+    """Adds the duration of a model request, and whether it was a retry, to the current file."""
+    stats = current_stats.get()
+    if stats is not None:
+        stats.model_latency += seconds
+        stats.retries += int(retry)
+
+
+def record_dspy_usage(prediction: Any):
+    """Adds the token usage of a DSPy prediction (requires `track_usage=True`) to the current file."""
+    stats = current_stats.get()
+    if stats is None or not hasattr(prediction, "get_lm_usage"):
+        return
+    for usage in (prediction.get_lm_usage() or {}).values():
+        stats.input_tokens += usage.get("prompt_tokens") or 0
+        stats.output_tokens += usage.get("completion_tokens") or 0
+
+
+def record_agent_usage(usage: Any):
+    """Adds the requests and tokens of a pydantic-ai run to the current file."""
+    stats = current_stats.get()
+    if stats is None:
+        return
+    stats.llm_calls += getattr(usage, "requests", 0) or 0
+    # pydantic-ai renamed request/response tokens to input/output tokens
+    stats.input_tokens += getattr(usage, "input_tokens", None) or getattr(usage, "request_tokens", 0) or 0
+    stats.output_tokens += getattr(usage, "output_tokens", None) or getattr(usage, "response_tokens", 0) or 0
@@ -0,0 +1,191 @@
+"""
+Runs the full `main` pipeline on synthetic repositories with the fake model backend, measuring throughput,
+peak memory and time per stage with no network and no tokens.
+
+Each size is scanned twice in a fresh working directory (own config, caches and reports): a cold run that
+analyzes every flagged file and a warm run served by the caches. Compare the results before and after a
+scheduler, cache or walker change.
+
+Usage:
+    python -m benchmarks.bench_pipeline --files 50 500 5000 --latency 0.05
+    python -m benchmarks.bench_pipeline --files 20000 --latency 0 --error-rate 0.05 --malformed-rate 0.02 --json results.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Stages shown in the table, in pipeline order (all of them are in the JSON output)
+STAGES = ("index", "hash", "cache_restore", "triage", "prioritize", "classify_call", "prompt_composition", "dspy_call", "agent_run", "report_write", "report_finalize")
+
+PYTHON_TEMPLATE = """import subprocess
+
+
+def handler_{i}(value):
+{body}    return value
+"""
+JS_TEMPLATE = """export function handler{i}(value) {{
+{body}  return value;
+}}
+"""
+RISKY = {".py": "    subprocess.run(value, shell=True)\n", ".js": "  eval(value);\n", ".ts": "  eval(value);\n"}
+
+
+def make_repo(root: Path, n_files: int, risky_rate: float, duplicate_rate: float, seed: int):
+    """Writes `n_files` Python, JavaScript and TypeScript files, a share of them with a risky call or identical to another file."""
+    rng = random.Random(seed)
+    for i in range(n_files):
+        ext = (".py", ".js", ".ts")[i % 3]
+        path = root / "src" / f"package_{i // 100}" / f"module_{i}{ext}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Duplicates reuse the content of the first file of the same language
+        index = i % 3 if i >= 3 and rng.random() < duplicate_rate else i
+        content_rng = random.Random(f"{seed}:{index}")
+        body = "".join(f"    # step {j}\n" if ext == ".py" else f"  // step {j}\n" for j in range(content_rng.randint(5, 200)))
+        if content_rng.random() < risky_rate:
+            body += RISKY[ext]
+        template = PYTHON_TEMPLATE if ext == ".py" else JS_TEMPLATE
+        path.write_text(template.format(i=index, body=body), encoding="utf-8")
+
+
+def write_config(workdir: Path, args: argparse.Namespace):
+    """Copies the repository's config and rules, switched to the fake backend and without rate limits."""
+    with open(ROOT / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config["model"] = {
+        **(config.get("model") or {}),
+        "backend": "fake",
+        "fake": {
+            "latency": args.latency,
+            "latency_jitter": args.latency_jitter,
+            "error_rate": args.error_rate,
+            "malformed_rate": args.malformed_rate,
+            "escalation_rate": args.escalation_rate,
+            "seed": args.seed,
+        },
+    }
+    config["analysis"] = {**(config.get("analysis") or {}), "mode": args.mode}
+    config["scheduler"] = {**(config.get("scheduler") or {}), "workers": args.workers, "requests_per_minute": 0, "tokens_per_minute": 0, "backoff_base": 0.1}
+    config["metrics"] = {**(config.get("metrics") or {}), "enabled": True}
+    config["cascade"] = {**(config.get("cascade") or {}), "enabled": args.cascade}
+    with open(workdir / "config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    shutil.copytree(ROOT / "rules", workdir / "rules")
+
+
+def run_main(workdir: Path, log_path: Path) -> tuple[float, int, Optional[float]]:
+    """Runs a scan of `workdir/repo`. Returns the wall time, the exit code and the peak memory in MB (None where unavailable)."""
+    env = {k: v for k, v in os.environ.items() if k != "LOGFIRE_TOKEN"}
+    start = time.perf_counter()
+    with open(log_path, "a", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable, str(ROOT / "main.py"), "--directory", "repo", "--backend", "fake"], cwd=workdir, stdout=log, stderr=subprocess.STDOUT, env=env)
+        if not hasattr(os, "wait4"):
+            return time.perf_counter() - start, proc.wait(), None
+        _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return elapsed, proc.returncode, peak_mb
+
+
+def bench_size(n_files: int, args: argparse.Namespace) -> list[dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        make_repo(workdir / "repo", n_files, args.risky_rate, args.duplicate_rate, args.seed)
+        if args.git:
+            subprocess.run(["git", "init", "-q"], cwd=workdir / "repo", check=True)
+            subprocess.run(["git", "add", "-A"], cwd=workdir / "repo", check=True)
+        write_config(workdir, args)
+
+        for run in ("cold", "warm"):
+            elapsed, code, peak_mb = run_main(workdir, workdir / "main.log")
+            if code != 0:
+                print(f"[x] The {run} run of {n_files} files failed with exit code {code}:")
+                print((workdir / "main.log").read_text(encoding="utf-8", errors="ignore")[-2000:])
+                break
+            metrics = json.loads((workdir / "reports" / "repo-metrics.json").read_text(encoding="utf-8"))
+            results.append(
+                {
+                    "files": n_files,
+                    "run": run,
+                    "seconds": elapsed,
+                    "files_per_second": n_files / elapsed if elapsed else 0.0,
+                    "analyzed": metrics["counters"].get("files_analyzed", 0),
+                    "peak_mb": peak_mb,
+                    "retries": metrics["totals"]["retries"],
+                    "findings_repaired": metrics["counters"].get("findings_repaired", 0),
+                    "findings_reasked": metrics["counters"].get("findings_reasked", 0),
+                    "escalation_rate": metrics["escalation_rate"],
+                    "latency_p50": metrics["latency"]["p50"],
+                    "latency_p95": metrics["latency"]["p95"],
+                    "stages": {name: stage["seconds"] for name, stage in metrics["stages"].items()},
+                }
+            )
+            if args.keep:
+                kept = Path(args.keep) / f"{n_files}-{run}"
+                shutil.copytree(workdir / "reports", kept, dirs_exist_ok=True)
+                shutil.copy(workdir / "main.log", kept / "main.log")
+    return results
+
+
+def print_results(results: list[dict[str, Any]]):
+    print(f"\n{'Files':>7} {'Run':<5} {'Wall':>8} {'Files/s':>9} {'Analyzed':>9} {'Escalated':>9} {'Peak MB':>8} {'Retries':>8} {'p50':>6} {'p95':>6}")
+    for r in results:
+        peak = f"{r['peak_mb']:.0f}" if r["peak_mb"] is not None else "n/a"
+        escalated = f"{r['escalation_rate']:.0%}" if r["escalation_rate"] is not None else "-"
+        print(
+            f"{r['files']:>7} {r['run']:<5} {r['seconds']:>7.1f}s {r['files_per_second']:>9.1f} {r['analyzed']:>9} {escalated:>9} {peak:>8} {r['retries']:>8} "
+            f"{r['latency_p50']:>5.2f}s {r['latency_p95']:>5.2f}s"
+        )
+
+    stages = [s for s in STAGES if any(s in r["stages"] for r in results)]
+    print(f"\nSeconds per stage (summed over concurrent spans)\n{'Files':>7} {'Run':<5} " + " ".join(f"{s:>15}" for s in stages))
+    for r in results:
+        print(f"{r['files']:>7} {r['run']:<5} " + " ".join(f"{r['stages'].get(s, 0.0):>15.2f}" for s in stages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark with the fake model backend")
+    parser.add_argument("--files", type=int, nargs="+", default=[50, 500, 5000], help="Sizes of the synthetic repositories")
+    parser.add_argument("--mode", choices=("direct", "agent"), default="direct")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per model call")
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of model calls failing with a retryable error")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of responses with malformed findings JSON")
+    parser.add_argument("--cascade", action="store_true", help="Enable the two-tier cascade of config.yaml")
+    parser.add_argument("--escalation-rate", type=float, default=0.3, help="Share of files the cascade's first pass escalates")
+    parser.add_argument("--risky-rate", type=float, default=0.5, help="Share of files with a risky call, the others are analyzed after them (skipped with triage.skip_clean)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Share of files identical to another one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--git", action="store_true", help="Make the synthetic repositories git repos, to index them with `git ls-files`")
+    parser.add_argument("--json", type=Path, help="Also write the results to this JSON file")
+    parser.add_argument("--keep", help="Copy the reports, metrics and logs of every run to this directory")
+    args = parser.parse_args()
+
+    results = []
+    for n_files in args.files:
+        print(f"[*] Scanning a synthetic repository of {n_files} files ({args.mode} mode, {args.workers} workers, {args.latency}s per call)...")
+        results.extend(bench_size(n_files, args))
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n[+] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures the startup cost of the CLI: the time to import `main` (what every run pays, including the
+index-only, cache-only and dry-run fast paths) and to load the model stack on top of it.
+
+Each measurement runs in a fresh interpreter. `-X importtime` breaks the cost down by module.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 5
+    python -X importtime -c "import main" 2> importtime.log
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that only a run that calls the model may load
+HEAVY_MODULES = ("dspy", "pydantic_ai", "httpx", "logfire", "litellm", "openai")
+
+STAGES = {
+    "python (baseline)": "pass",
+    "import main": "import main",
+    "import main + models": "import main\nfrom agent.pydantic_agent import init_models",
+}
+
+
+def run(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def loaded_heavy_modules() -> list[str]:
+    code = f"import json, sys\nimport main\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for label, code in STAGES.items():
+        try:
+            best = min(run(code) for _ in range(args.repeat))
+        except subprocess.CalledProcessError as e:
+            print(f"{label:<24} failed: {e.stderr.decode(errors='ignore').strip().splitlines()[-1]}")
+            continue
+        print(f"{label:<24} {best * 1000:10.1f} ms")
+
+    heavy = loaded_heavy_modules()
+    if heavy:
+        print(f"\n[!] `import main` loads heavy modules: {', '.join(heavy)}")
+    else:
+        print(f"\n`import main` loads none of: {', '.join(HEAVY_MODULES)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the file index walkers on a synthetic repository with a large `node_modules`.
+
+Usage:
+    python -m benchmarks.bench_walker --packages 2000 --files-per-package 20 --git
+"""
+
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from scanner.walker import build_file_index, walk_files
+
+ALLOWED_EXTS = {".js", ".ts", ".py"}
+IGNORED_DIRS = {".git", "node_modules", "dist", "build", "__pycache__"}
+IGNORED_FILES = {"LICENSE", "README.md"}
+
+
+def legacy_build_file_index(root: Path, allowed_exts: set[str], ignored_dirs: set[str], ignored_files: set[str]) -> tuple[list[str], list[str]]:
+    """The original rglob walker, which filters ignored directories only after descending into them."""
+    indexed_files = []
+    non_indexed_files = []
+
+    for p in root.rglob("*"):
+        relative_path = p.relative_to(root)
+        if any(part in ignored_dirs for part in relative_path.parts):
+            continue
+        if p.is_file():
+            if p.name in ignored_files:
+                continue
+            path_str = relative_path.as_posix()
+            if p.suffix.lower() in allowed_exts:
+                indexed_files.append(path_str)
+            else:
+                non_indexed_files.append(path_str)
+    return indexed_files, non_indexed_files
+
+
+def make_tree(root: Path, packages: int, files_per_package: int, source_files: int):
+    for i in range(source_files):
+        path = root / "src" / f"module_{i // 50}" / f"file_{i}.ts"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"export const value{i} = {i};\n")
+    for i in range(packages):
+        package = root / "node_modules" / f"package_{i}" / "lib"
+        package.mkdir(parents=True, exist_ok=True)
+        for j in range(files_per_package):
+            (package / f"file_{j}.js").write_text("module.exports = {};\n")
+    (root / "dist").mkdir()
+    (root / "dist" / "bundle.js").write_text("console.log('bundle');\n")
+    (root / ".gitignore").write_text("node_modules/\ndist/\n")
+
+
+def bench(label: str, fn, repeat: int) -> tuple[int, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        indexed, non_indexed = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<24} {best * 1000:10.1f} ms  ({len(indexed)} indexed, {len(non_indexed)} non-indexed)")
+    return len(indexed), len(non_indexed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File index walker benchmark")
+    parser.add_argument("--packages", type=int, default=1000, help="Number of packages in node_modules")
+    parser.add_argument("--files-per-package", type=int, default=20)
+    parser.add_argument("--source-files", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--git", action="store_true", help="Also benchmark the `git ls-files` fast path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, args.packages, args.files_per_package, args.source_files)
+        print(f"Synthetic tree: {args.source_files} source files, {args.packages * args.files_per_package} files in node_modules\n")
+
+        legacy = bench("rglob (legacy)", lambda: legacy_build_file_index(root, ALLOWED_EXTS, IGNORED_DIRS, IGNORED_FILES), args.repeat)
+        pruned = bench("scandir (pruned)", lambda: build_file_index(root, ALLOWED_EXTS, IGNORED_DIRS, IGNORED_FILES), args.repeat)
+
+        if args.git:
+            subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+            subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+            bench("git ls-files", lambda: build_file_index(root, ALLOWED_EXTS, IGNORED_DIRS, IGNORED_FILES), args.repeat)
+
+        if legacy != pruned:
+            print(f"\n[!] Walkers disagree: legacy {legacy}, pruned {pruned}")
+        print(f"\nFiles visited by the pruned walker: {sum(1 for _ in walk_files(root, IGNORED_DIRS))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Optional
+
+from deps.deps import AnalysisStats
+
+CHECKPOINT_DIR = Path(".agent_checkpoints")
+
+
+@dataclass
+class CheckpointEntry:
+    path: str
+    status: str  # "done" or "failed"
+    key: str  # Content key of the file when it was analyzed; its findings live in the findings store
+    source: Optional[str] = None  # File analyzed on its behalf, for duplicates
+    stats: Optional[AnalysisStats] = None  # Cost of the analysis, on the file that was sent to the model
+
+
+class ScanCheckpoint:
+    """
+    Append-only journal of the files finished by the running scan of a repo.
+
+    Each line is flushed as soon as a file completes, so an interrupted scan can be resumed
+    from it. The journal is removed once the scan's report is finalized.
+    """
+
+    def __init__(self, repo: str, root: Path = CHECKPOINT_DIR):
+        self.repo = repo
+        self.path = root / f"{hashlib.sha256(repo.encode()).hexdigest()[:16]}.jsonl"
+        self._file: Optional[IO[str]] = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> dict[str, CheckpointEntry]:
+        """Returns the last recorded entry of every file. A line cut short by a crash is ignored."""
+        entries: dict[str, CheckpointEntry] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if "path" not in data:
+                        continue  # Header line
+                    stats = data.pop("stats", None)
+                    entry = CheckpointEntry(**data, stats=AnalysisStats(**stats) if stats else None)
+                    entries[entry.path] = entry
+        except (OSError, TypeError):
+            return {}
+        return entries
+
+    def start(self, resume: bool = False):
+        """Opens the journal, appending to the previous one when resuming it or starting a new one otherwise."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        cut_short = False
+        if resume:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                cut_short = f.tell() > 0 and f.seek(-1, os.SEEK_END) >= 0 and f.read(1) != b"\n"
+        # The journal stays open for the whole scan so each entry is a single append; `complete` or `close` closes it
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")  # noqa: SIM115
+        if not resume:
+            self._append({"repo": self.repo, "started": time.time()})
+        elif cut_short:
+            # Terminate the line cut short by the crash so the next entry starts on its own line
+            self._file.write("\n")
+
+    def record(self, path: str, status: str, key: str, source: Optional[str] = None, stats: Optional[AnalysisStats] = None):
+        self._append(asdict(CheckpointEntry(path, status, key, source, stats)))
+
+    def _append(self, data: dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(data) + "\n")
+        self._file.flush()
+
+    def complete(self):
+        """Removes the journal once the scan has finished."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "ScanCheckpoint":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Optional
+
+from deps.deps import Finding
+
+FINDINGS_DIR = Path(".agent_findings")
+# Walking the whole store is skipped when the last eviction is more recent than this
+EVICT_INTERVAL = 3600.0
+EVICT_MARKER = ".last_evict"
+
+
+def findings_key(file_hash: str, rule_hash: str, model: str) -> str:
+    """Content address of an analysis: same code, same rule prompt and same model give the same key."""
+    return hashlib.sha256(f"{file_hash}:{rule_hash}:{model}".encode()).hexdigest()
+
+
+class FindingsStore:
+    """Content-addressed store of findings, one JSON file per (file hash, rule prompt hash, model)."""
+
+    def __init__(self, root: Path = FINDINGS_DIR, max_age_days: float = 30, max_entries: int = 50000):
+        self.root = root
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.written = 0  # Entries put by this process, so a run that stored nothing never walks the store
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str, file_path: Optional[str] = None) -> Optional[list[Finding]]:
+        """Returns the cached findings for `key`, rewritten to `file_path` if given, or None on a miss."""
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            findings = [Finding(**f) for f in data["findings"]]
+        except (OSError, json.JSONDecodeError, KeyError, TypeError):
+            return None
+        # Refresh the access time so eviction by age keeps entries that are still in use
+        os.utime(path)
+        if file_path is not None:
+            findings = [replace(f, file_path=file_path) for f in findings]
+        return findings
+
+    def count(self, key: str) -> Optional[int]:
+        """Returns the number of cached findings for `key`, or None on a miss. Unlike `get`, it does not keep the entry alive."""
+        try:
+            return len(json.loads(self._path(key).read_text(encoding="utf-8"))["findings"])
+        except (OSError, json.JSONDecodeError, KeyError, TypeError):
+            return None
+
+    def put(self, key: str, findings: list[Finding]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A unique temporary name, so two processes writing the same key never publish each other's half-written file
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=f"{key}.", suffix=".tmp", delete=False) as tmp:
+            json.dump({"created": time.time(), "findings": [asdict(f) for f in findings]}, tmp)
+        os.replace(tmp.name, path)
+        self.written += 1
+
+    def evict(self) -> int:
+        """
+        Removes entries older than `max_age_days`, then the least recently used beyond `max_entries`.
+
+        It stats every entry of the store, so it only runs after this process stored new entries, and at most once per
+        `EVICT_INTERVAL`.
+        """
+        if not self.root.is_dir() or not self.written:
+            return 0
+        marker = self.root / EVICT_MARKER
+        try:
+            if time.time() - marker.stat().st_mtime < EVICT_INTERVAL:
+                return 0
+        except OSError:
+            pass  # Never evicted yet
+        marker.touch()
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+
+        cutoff = time.time() - self.max_age_days * 86400
+        expired = [p for mtime, p in entries if mtime < cutoff]
+        alive = sorted((e for e in entries if e[0] >= cutoff), reverse=True)
+        expired += [p for _, p in alive[self.max_entries :]]
+
+        for path in expired:
+            path.unlink(missing_ok=True)
+        return len(expired)
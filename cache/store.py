@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, cast
+
+LEGACY_CACHE_FILE = Path(".agent_cache.json")
+SQLITE_CACHE_FILE = Path(".agent_cache.sqlite3")
+
+STAT_FIELDS = ("size", "mtime_ns", "ino")
+
+
+class CacheStore(ABC):
+    """Per-repo, per-file hash and stat entries used to skip unchanged files."""
+
+    @abstractmethod
+    def load_repo(self, repo: str) -> dict[str, Any]:
+        """Returns the entries of every file of `repo`."""
+
+    @abstractmethod
+    def upsert(self, repo: str, entries: dict[str, dict[str, Any]]):
+        """Inserts or replaces the entries of the given files."""
+
+    @abstractmethod
+    def prune(self, repo: str, keep: set[str]):
+        """Drops the entries of files that are no longer part of `repo`."""
+
+    def close(self):
+        """Flushes and releases the store. Nothing to do for a store that writes every change through."""
+        return
+
+    def __enter__(self) -> "CacheStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonCacheStore(CacheStore):
+    """The original single JSON file holding every repo, rewritten on close."""
+
+    def __init__(self, path: Path = LEGACY_CACHE_FILE):
+        self.path = path
+        self.cache = self._load()
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        with open(self.path) as f:
+            try:
+                # Cast to handle the case where the file is empty or malformed
+                return cast(dict[str, Any], json.load(f))
+            except json.JSONDecodeError:
+                return {}
+
+    def load_repo(self, repo: str) -> dict[str, Any]:
+        with self._lock:
+            return dict(self.cache.get(repo, {}))
+
+    def upsert(self, repo: str, entries: dict[str, dict[str, Any]]):
+        with self._lock:
+            self.cache.setdefault(repo, {}).update(entries)
+            self.dirty = True
+
+    def prune(self, repo: str, keep: set[str]):
+        with self._lock:
+            repo_cache = self.cache.get(repo, {})
+            self.cache[repo] = {path: entry for path, entry in repo_cache.items() if path in keep}
+            self.dirty = True
+
+    def close(self):
+        if not self.dirty:
+            return
+        # Write to a temporary file first so a crash never leaves a truncated cache behind
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.cache, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+class SqliteCacheStore(CacheStore):
+    """SQLite cache in WAL mode: one row per file, upserted as soon as the file is done."""
+
+    def __init__(self, path: Path = SQLITE_CACHE_FILE, legacy_path: Path = LEGACY_CACHE_FILE):
+        self.path = path
+        # Autocommit: every upsert is its own small transaction, so concurrent scans only lock briefly
+        # Shared by the threads that index several repos at once, one statement at a time
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                repo TEXT NOT NULL,
+                path TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                ino INTEGER,
+                PRIMARY KEY (repo, path)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self._migrate(legacy_path)
+
+    def _migrate(self, legacy_path: Path):
+        """Imports the legacy JSON cache once."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone() or not legacy_path.exists():
+            return
+        legacy = JsonCacheStore(legacy_path)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for repo, entries in legacy.cache.items():
+                if isinstance(entries, dict):
+                    self._upsert_rows(repo, entries)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (str(legacy_path),))
+        print(f"[+] Migrated {len(legacy.cache)} repo(s) from {legacy_path} to {self.path}.")
+
+    def _upsert_rows(self, repo: str, entries: dict[str, Any]):
+        rows = []
+        for path, entry in entries.items():
+            # Legacy entries are plain hash strings
+            if not isinstance(entry, dict):
+                entry = {"hash": entry}
+            rows.append((repo, path, entry["hash"], *(entry.get(field) for field in STAT_FIELDS)))
+        self.conn.executemany(
+            "INSERT INTO files (repo, path, hash, size, mtime_ns, ino) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (repo, path) DO UPDATE SET hash = excluded.hash, size = excluded.size, mtime_ns = excluded.mtime_ns, ino = excluded.ino",
+            rows,
+        )
+
+    def load_repo(self, repo: str) -> dict[str, Any]:
+        repo_cache = {}
+        with self._lock:
+            rows = self.conn.execute("SELECT path, hash, size, mtime_ns, ino FROM files WHERE repo = ?", (repo,)).fetchall()
+        for path, file_hash, *stat in rows:
+            entry: dict[str, Any] = {"hash": file_hash}
+            if stat[1] is not None:
+                entry.update(zip(STAT_FIELDS, stat, strict=True))
+            repo_cache[path] = entry
+        return repo_cache
+
+    def upsert(self, repo: str, entries: dict[str, dict[str, Any]]):
+        if not entries:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self._upsert_rows(repo, entries)
+
+    def prune(self, repo: str, keep: set[str]):
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_paths (path TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep_paths")
+            self.conn.executemany("INSERT OR IGNORE INTO keep_paths (path) VALUES (?)", ((p,) for p in keep))
+            self.conn.execute("DELETE FROM files WHERE repo = ? AND path NOT IN (SELECT path FROM keep_paths)", (repo,))
+
+    def close(self):
+        self.conn.close()
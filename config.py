@@ -1,23 +1,64 @@
+import functools
 import hashlib
-import json
+import mmap
 import os
-from collections import defaultdict
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager
 from pathlib import Path
-from typing import Any, cast
+from typing import TYPE_CHECKING, Any, Optional
 
-import logfire
 import yaml
-from dotenv import load_dotenv
 
-from deps.deps import Finding
+from agent.batching import BatchingConfig
+from agent.budget import BudgetConfig
+from agent.cascade import CascadeConfig, ModelTier
+from agent.chunking import ChunkingConfig
+from agent.scheduler import SchedulerConfig
+from agent.triage import TriageConfig
+from cache.findings import FindingsStore
+from cache.store import LEGACY_CACHE_FILE, SQLITE_CACHE_FILE, CacheStore, JsonCacheStore, SqliteCacheStore
+from reporting.metrics import MetricsConfig
+from reporting.sinks import REPORT_FORMATS
+from scanner.git import CloneConfig
+from scanner.priority import PriorityConfig
+from scanner.watch import WatchConfig
+
+if TYPE_CHECKING:
+    from agent.fake_lm import FakeLMConfig
 
-load_dotenv(override=True)
+CONFIG_PATH = Path("config.yaml")
+DEFAULT_MODEL = "gpt-4o-mini"
 
-logfire.configure(token=os.getenv("LOGFIRE_TOKEN"))
-logfire.instrument_pydantic_ai()
+HASH_BUFFER_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 4 * 1024 * 1024
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+RACY_WINDOW_NS = 2_000_000_000
 
-CONFIG_PATH = Path("config.yaml")
-CACHE_FILE = Path(".agent_cache.json")
+
+def init_env():
+    """Loads `.env` into the environment, overriding existing variables."""
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+
+
+@functools.cache
+def init_telemetry() -> Optional[Callable[..., AbstractContextManager]]:
+    """
+    Sends pydantic-ai traces and the scan's stage spans to Logfire when `LOGFIRE_TOKEN` is set. Configured once.
+
+    Returns the span exporter for `ScanMetrics`, or None when telemetry is disabled.
+    """
+    token = os.getenv("LOGFIRE_TOKEN")
+    if not token:
+        return None
+    import logfire
+
+    logfire.configure(token=token)
+    logfire.instrument_pydantic_ai()
+    return logfire.span
 
 
 def load_config() -> dict:
@@ -40,42 +81,172 @@ def load_blacklist() -> tuple[set[str], set[str]]:
     return ignored_dirs, ignored_files
 
 
-def load_cache() -> dict[str, Any]:
-    """Loads the cache file from disk."""
-    if not CACHE_FILE.exists():
-        return {}
-    with open(CACHE_FILE) as f:
-        try:
-            # Cast to handle the case where the file is empty or malformed
-            return cast(dict[str, Any], json.load(f))
-        except json.JSONDecodeError:
-            return {}
+def load_scheduler_config() -> SchedulerConfig:
+    config = load_config()
+    scheduler_cfg = config.get("scheduler", {}) or {}
+    return SchedulerConfig(**{k: v for k, v in scheduler_cfg.items() if k in SchedulerConfig.__dataclass_fields__})
+
+
+def load_model_name() -> str:
+    config = load_config()
+    return (config.get("model", {}) or {}).get("name", DEFAULT_MODEL)
+
+
+def load_model_backend() -> str:
+    config = load_config()
+    return (config.get("model", {}) or {}).get("backend", "openai")
+
+
+def load_model_id(backend: str) -> str:
+    """The model as named in cache keys, so the findings and prompts of a fake backend never mix with the real model's."""
+    model_name = load_model_name()
+    return model_name if backend == "openai" else f"{backend}/{model_name}"
+
+
+def load_fake_lm_config() -> "FakeLMConfig":
+    # Imported here: the fake backend module loads dspy and pydantic-ai
+    from agent.fake_lm import FakeLMConfig
+
+    config = load_config()
+    fake_cfg = (config.get("model", {}) or {}).get("fake", {}) or {}
+    return FakeLMConfig(**{k: v for k, v in fake_cfg.items() if k in FakeLMConfig.__dataclass_fields__})
+
+
+def load_cascade_config() -> CascadeConfig:
+    config = load_config()
+    cascade_cfg = dict(config.get("cascade", {}) or {})
+    tiers = {name: ModelTier(**{k: v for k, v in (tier or {}).items() if k in ModelTier.__dataclass_fields__}) for name, tier in (cascade_cfg.pop("tiers", None) or {}).items()}
+    return CascadeConfig(tiers=tiers, **{k: v for k, v in cascade_cfg.items() if k in CascadeConfig.__dataclass_fields__})
+
+
+def load_clone_config() -> CloneConfig:
+    config = load_config()
+    git_cfg = config.get("git", {}) or {}
+    return CloneConfig(**{k: v for k, v in git_cfg.items() if k in CloneConfig.__dataclass_fields__})
+
+
+def load_analysis_mode() -> str:
+    config = load_config()
+    return (config.get("analysis", {}) or {}).get("mode", "direct")
+
+
+def load_chunking_config() -> ChunkingConfig:
+    config = load_config()
+    analysis_cfg = config.get("analysis", {}) or {}
+    chunking_cfg = {k.removeprefix("chunk_"): v for k, v in analysis_cfg.items() if k.startswith("chunk_")}
+    return ChunkingConfig(**{k: v for k, v in chunking_cfg.items() if k in ChunkingConfig.__dataclass_fields__})
+
+
+def load_batching_config() -> BatchingConfig:
+    config = load_config()
+    batching_cfg = config.get("batching", {}) or {}
+    return BatchingConfig(**{k: v for k, v in batching_cfg.items() if k in BatchingConfig.__dataclass_fields__})
 
 
-def save_cache(cache: dict[str, Any]):
-    """Saves the cache to disk."""
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f, indent=2)
+def load_triage_config() -> TriageConfig:
+    config = load_config()
+    triage_cfg = config.get("triage", {}) or {}
+    return TriageConfig(**{k: v for k, v in triage_cfg.items() if k in TriageConfig.__dataclass_fields__})
+
+
+def load_report_formats() -> list[str]:
+    config = load_config()
+    report_cfg = config.get("report", {}) or {}
+    formats = report_cfg.get("formats") or ["markdown"]
+    unknown = [f for f in formats if f not in REPORT_FORMATS]
+    if unknown:
+        print(f"[!] Warning: Unknown report format(s) {unknown} ignored. Supported: {', '.join(REPORT_FORMATS)}.")
+    return [f for f in formats if f in REPORT_FORMATS] or ["markdown"]
+
+
+def load_metrics_config() -> MetricsConfig:
+    config = load_config()
+    metrics_cfg = config.get("metrics", {}) or {}
+    return MetricsConfig(**{k: v for k, v in metrics_cfg.items() if k in MetricsConfig.__dataclass_fields__})
+
+
+def load_priority_config() -> PriorityConfig:
+    config = load_config()
+    priority_cfg = config.get("priority", {}) or {}
+    return PriorityConfig(**{k: v for k, v in priority_cfg.items() if k in PriorityConfig.__dataclass_fields__})
+
+
+def load_budget_config() -> BudgetConfig:
+    config = load_config()
+    budget_cfg = config.get("budget", {}) or {}
+    return BudgetConfig(**{k: v for k, v in budget_cfg.items() if k in BudgetConfig.__dataclass_fields__})
+
+
+def load_watch_config() -> WatchConfig:
+    config = load_config()
+    watch_cfg = config.get("watch", {}) or {}
+    return WatchConfig(**{k: v for k, v in watch_cfg.items() if k in WatchConfig.__dataclass_fields__})
+
+
+def load_findings_store() -> FindingsStore:
+    config = load_config()
+    cache_cfg = config.get("cache", {}) or {}
+    return FindingsStore(
+        max_age_days=cache_cfg.get("findings_max_age_days", 30),
+        max_entries=cache_cfg.get("findings_max_entries", 50000),
+    )
+
+
+def load_cache_store() -> CacheStore:
+    config = load_config()
+    cache_cfg = config.get("cache", {}) or {}
+    if cache_cfg.get("backend", "sqlite") == "json":
+        return JsonCacheStore(Path(cache_cfg.get("path", LEGACY_CACHE_FILE)))
+    return SqliteCacheStore(Path(cache_cfg.get("path", SQLITE_CACHE_FILE)))
 
 
 def _calculate_hash(file_path: Path) -> str:
     """Calculates the SHA256 hash of a file."""
     h = hashlib.sha256()
     with open(file_path, "rb") as f:
-        while chunk := f.read(8192):
-            h.update(chunk)
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            # Large files are hashed straight from the page cache, without copying them into Python buffers
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+        else:
+            while chunk := f.read(HASH_BUFFER_SIZE):
+                h.update(chunk)
     return h.hexdigest()
 
 
+def _stat_entry(st: os.stat_result, file_hash: str) -> dict[str, Any]:
+    # The size is always kept: the scan plans its batches, chunks and budget with it
+    entry: dict[str, Any] = {"hash": file_hash, "size": st.st_size}
+    # A file modified within the timestamp granularity of the scan could change again without its stat changing
+    # ("racily clean" in git terms), so it is only trusted by hash on the next run
+    if time.time_ns() - st.st_mtime_ns > RACY_WINDOW_NS:
+        entry.update(mtime_ns=st.st_mtime_ns, ino=st.st_ino)
+    return entry
+
+
+def _stat_matches(entry: Any, st: os.stat_result) -> bool:
+    # Entries written before stat tracking are plain hash strings
+    return isinstance(entry, dict) and "mtime_ns" in entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns and entry["ino"] == st.st_ino
+
+
+def _cached_hash(entry: Any) -> Optional[str]:
+    """Returns the file hash stored in a repo cache entry, in the current or the legacy format."""
+    return entry.get("hash") if isinstance(entry, dict) else entry
+
+
 def filter_files_by_cache(
     repo_root: Path,
     repo_identifier: str,
     all_files: list[str],
-    repo_cache: dict[str, str],
-) -> tuple[list[str], list[str], dict[str, str]]:
+    repo_cache: dict[str, Any],
+) -> tuple[list[str], list[str], dict[str, dict[str, Any]]]:
     """
     Filters files based on their hash, comparing them to a cached version.
 
+    Files whose size, mtime and inode match the cache are trusted without being read, like the git index.
+    The remaining files are hashed in a thread pool.
+
     Args:
         repo_root: The absolute path to the repository's root.
         repo_identifier: The unique identifier for the repository (URL or local path).
@@ -86,65 +257,37 @@ def filter_files_by_cache(
         A tuple containing:
         - A list of files that have changed or are new.
         - A list of files that have not changed.
-        - A dictionary with the new, updated hashes for all files.
+        - A dictionary with the new, updated hash and stat entries for all files.
     """
-    files_to_analyze = []
-    skipped_files = []
     new_repo_cache = {}
+    to_hash = []
 
     for file_path_str in all_files:
-        file_path = repo_root / file_path_str
-        if not file_path.exists():
+        try:
+            st = os.stat(repo_root / file_path_str)
+        except OSError:
             continue
+        entry = repo_cache.get(file_path_str)
+        if _stat_matches(entry, st):
+            new_repo_cache[file_path_str] = entry
+        else:
+            to_hash.append((file_path_str, st))
 
-        current_hash = _calculate_hash(file_path)
-        new_repo_cache[file_path_str] = current_hash
+    if to_hash:
+        # hashlib releases the GIL on large buffers, so threads hash files in parallel
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            hashes = pool.map(lambda item: _calculate_hash(repo_root / item[0]), to_hash)
+            for (file_path_str, st), current_hash in zip(to_hash, hashes, strict=True):
+                new_repo_cache[file_path_str] = _stat_entry(st, current_hash)
 
-        if repo_cache.get(file_path_str) == current_hash:
+    files_to_analyze = []
+    skipped_files = []
+    for file_path_str in all_files:
+        if file_path_str not in new_repo_cache:
+            continue
+        if _cached_hash(repo_cache.get(file_path_str)) == new_repo_cache[file_path_str]["hash"]:
             skipped_files.append(file_path_str)
         else:
             files_to_analyze.append(file_path_str)
 
     return files_to_analyze, skipped_files, new_repo_cache
-
-
-def generate_markdown_report(findings: list[Finding], unanalyzed_files: list[str], skipped_files: list[str], output_path: Path):
-    """Generates a Markdown report with colors from the list of findings."""
-    report_content = "# Security Analysis Report\n\nThis report details the security vulnerabilities found by the AI agent.\n"
-
-    if not findings and not skipped_files:
-        report_content += "\n**No security vulnerabilities were found in the analyzed files.**\n"
-    elif not findings and skipped_files:
-        report_content += "\n**No new security vulnerabilities were found. All files passed the cache check.**\n"
-    else:
-        findings_by_file = defaultdict(list)
-        for f in findings:
-            findings_by_file[f.file_path].append(f)
-
-        for file_path, file_findings in sorted(findings_by_file.items()):
-            report_content += f"\n---\n\n### File: `{file_path}`\n\n"
-            report_content += "| Severity | Issue | Explanation | Recommendation | Aprox Line |\n"
-            report_content += "|----------|-------|-------------|----------------|------------|\n"
-            for f in sorted(file_findings, key=lambda x: x.severity):
-                line = f.line_hint if f.line_hint is not None else "N/A"
-                recommendation = f.recommendation if f.recommendation is not None else "-"
-
-                severity_cell = f.severity
-                if f.severity == "CRITICAL":
-                    severity_cell = "<font color='red'>CRITICAL</font>"
-                elif f.severity == "WARNING":
-                    severity_cell = "<font color='orange'>WARNING</font>"
-
-                report_content += f"| {severity_cell} | {f.issue} | {f.explanation} | {recommendation} | {line} |\n"
-
-    if skipped_files:
-        report_content += """\n---\n\n### Skipped Files (Unchanged)\n\nThe following files were not analyzed in this run because their content has not changed since the last analysis:\n\n"""
-        report_content += "\n".join([f"- `{f}`" for f in sorted(skipped_files)])
-
-    if unanalyzed_files:
-        report_content += """\n---\n\n### Unanalyzed Files\n\nThe following files were not analyzed because their extensions are not in the whitelist or they are in the blacklist:\n\n"""
-        report_content += "\n".join([f"- `{f}`" for f in sorted(unanalyzed_files)])
-
-    # Ensure the reports directory exists
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(report_content, encoding="utf-8")
@@ -1,12 +1,14 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal, Optional
-
-import dspy
-import httpx
+from typing import TYPE_CHECKING, Literal, Optional
 
 from agent.rules import LanguageRule
 
+if TYPE_CHECKING:
+    # Only needed for type hints: importing dspy and httpx here would load them on every run
+    import dspy
+    import httpx
+
 
 @dataclass
 class Deps:
@@ -14,10 +16,11 @@ class Deps:
 
     repo_root: Path
     file_index: str  # File currently being analyzed
-    selector: dspy.Module
-    analyzer: dspy.Module
+    selector: "dspy.Module"
+    analyzer: "dspy.Module"
     active_rule: Optional[LanguageRule] = None  # Rule for the current language
-    http: Optional[httpx.AsyncClient] = None
+    http: Optional["httpx.AsyncClient"] = None
+    lm: Optional["dspy.BaseLM"] = None  # LM of the analyzer, DSPy's configured LM if None
 
 
 @dataclass
@@ -32,4 +35,18 @@ class Finding:
 
 @dataclass
 class FindingsList:
-    __root__: list[Finding]
+    """Output of the agent. An object at the top level, as native structured output (JSON schema) mode requires."""
+
+    findings: list[Finding]
+
+
+@dataclass
+class AnalysisStats:
+    """Cost of analyzing one file: LLM round trips, tokens, retries and wall time."""
+
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0.0
+    model_latency: float = 0.0  # Time spent waiting for the model, excluding rate limiting and backoff
+    retries: int = 0
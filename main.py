@@ -2,26 +2,76 @@ import argparse
 import asyncio
 import json
 import re
+import signal
 import subprocess
 import sys
+import time
+from collections.abc import AsyncIterator, Iterable
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+from dataclasses import asdict, dataclass, field, replace
+from functools import partial
 from pathlib import Path
-
-import httpx
+from typing import TYPE_CHECKING, Any, Optional
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-import config  # noqa: F401 # Import to override environment variables
-from agent.rules import load_rules
+from agent.batching import BatchingConfig, pack_batches
+from agent.budget import ScanBudget, parse_deadline
+from agent.cascade import CascadeConfig, ModelTier
+from agent.chunking import ChunkingConfig
+from agent.pipeline import ANALYSIS_MODES, MODEL_BACKENDS, analyze_batch, analyze_direct, analyze_with_agent, classify_file
+from agent.rules import LanguageRule, load_rules, unique_rules
+from agent.scheduler import AnalysisScheduler, estimate_tokens
+from agent.triage import TriageConfig, TriageHint, TriageResult, triage_files
+from agent.usage import current_stats
+from cache.checkpoint import CheckpointEntry, ScanCheckpoint
+from cache.findings import FindingsStore
+from cache.store import CacheStore
 from config import (
     filter_files_by_cache,
-    generate_markdown_report,
+    init_env,
+    init_telemetry,
+    load_analysis_mode,
+    load_batching_config,
     load_blacklist,
-    load_cache,
+    load_budget_config,
+    load_cache_store,
+    load_cascade_config,
+    load_chunking_config,
+    load_clone_config,
+    load_findings_store,
+    load_metrics_config,
+    load_model_backend,
+    load_model_id,
+    load_model_name,
+    load_priority_config,
+    load_report_formats,
+    load_scheduler_config,
+    load_triage_config,
+    load_watch_config,
     load_whitelist,
-    save_cache,
 )
-from deps.deps import FindingsList
+from deps.deps import AnalysisStats, Finding
+from reporting.metrics import ScanMetrics, current_metrics, span
+from reporting.sinks import ReportSummary, ReportWriter, open_report
+from reporting.summary import RepoSummary, write_batch_summary
+from scanner.dedup import content_keys, fan_out, group_by_content
+from scanner.git import CloneConfig, changed_files, churn, clone, is_shallow, normalize_url, repo_slug
+from scanner.priority import PriorityConfig, prioritize
+from scanner.walker import build_file_index, without_gitignored, without_ignored_dirs
+from scanner.watch import parse_endpoint, serve, submit, watch_changes
+
+if TYPE_CHECKING:
+    import httpx
+
+
+def deadline_arg(value: str) -> str:
+    try:
+        parse_deadline(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return value
 
 
 def parse_args():
@@ -29,14 +79,32 @@ def parse_args():
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--url", help="URL of the GitHub repo (e.g., https://github.com/user/repo)")
     group.add_argument("--directory", type=Path, help="Local path to the already cloned repo")
+    group.add_argument("--batch", type=Path, help="File listing many repos, one URL or directory per line or JSON Lines with a 'url' or 'directory' key, scanned concurrently")
+    group.add_argument("--submit", metavar="JOB", help="Send a job to a running --watch daemon and print its answer: 'scan', 'status', 'stop' or a JSON object like '{\"paths\": [\"app.py\"]}'")
+    parser.add_argument("--mode", choices=ANALYSIS_MODES, help="'direct' makes one structured call per file, 'agent' runs the pydantic-ai tool loop (overrides config.yaml)")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, help="'openai' calls the OpenAI API, 'fake' simulates the model locally for benchmarks (overrides config.yaml)")
+    parser.add_argument("--workers", type=int, help="Number of files analyzed concurrently (overrides config.yaml)")
+    parser.add_argument("--max-tokens", type=int, help="Start no new analysis once the model calls of the run used this many tokens (overrides config.yaml)")
+    parser.add_argument("--max-cost", type=float, help="Start no new analysis once the estimated cost of the run reaches this many USD (overrides config.yaml)")
+    parser.add_argument("--deadline", type=deadline_arg, help="Start no new analysis after a duration (90m, 2h) or a local time (06:30) (overrides config.yaml)")
+    parser.add_argument("--since", metavar="REF", help="Only scan the files changed since REF (e.g. origin/main), as listed by git diff, without walking or hashing the tree")
+    fast_path = parser.add_mutually_exclusive_group()
+    fast_path.add_argument("--index-only", action="store_true", help="Only index the repository and list the files that would be considered, without hashing or analyzing them")
+    fast_path.add_argument("--cache-only", action="store_true", help="Report the cached findings only, listing the files that would need an analysis")
+    fast_path.add_argument("--dry-run", action="store_true", help="Run the cache check, deduplication and triage and print the analysis plan without calling the model")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted scan of the same repository, skipping the files it already finished")
+    parser.add_argument("--watch", action="store_true", help="Keep running after the scan of --directory, rescanning the files that change and accepting jobs from --submit")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.watch and (not args.directory or args.since or is_fast_path(args)):
+        parser.error("--watch needs --directory and cannot be combined with --since, --index-only, --cache-only or --dry-run")
+    return args
 
 
-def get_repo(url: str, base_dir: Path = Path("repos")) -> Path:
+def get_repo(url: str, base_dir: Path = Path("repos"), clone_config: Optional[CloneConfig] = None, extensions: Optional[set[str]] = None) -> Path:
     base_dir.mkdir(parents=True, exist_ok=True)
-    repo_name = url.rstrip("/").split("/")[-1].removesuffix(".git")
-    repo_path = base_dir / repo_name
+    repo_name = normalize_url(url).split("/")[-1].split(":")[-1]
+    repo_path = base_dir / repo_slug(repo_name, url)
 
     def get_default_branch(path: Path) -> str:
         try:
@@ -54,7 +122,9 @@ def get_repo(url: str, base_dir: Path = Path("repos")) -> Path:
         print(f"[+] Repository already exists at {repo_path}.")
         print("[+] Resetting to remote state of default branch...")
         try:
-            subprocess.run(["git", "fetch", "origin"], cwd=repo_path, check=True, capture_output=True)
+            # Keep a shallow clone shallow instead of fetching the whole history
+            depth = ["--depth", str(clone_config.depth)] if clone_config and clone_config.depth and is_shallow(repo_path) else []
+            subprocess.run(["git", "fetch", *depth, "origin"], cwd=repo_path, check=True, capture_output=True)
             subprocess.run(["git", "reset", "--hard", "origin/HEAD"], cwd=repo_path, check=True, capture_output=True)
             subprocess.run(["git", "clean", "-fdx"], cwd=repo_path, check=True, capture_output=True)
         except subprocess.CalledProcessError as e:
@@ -62,44 +132,640 @@ def get_repo(url: str, base_dir: Path = Path("repos")) -> Path:
             raise
     else:
         print(f"[*] Cloning repository {url}...")
-        clone_cmd = ["git", "clone", url]
         try:
-            subprocess.run(clone_cmd, cwd=base_dir, check=True, capture_output=True, text=True)
+            clone(url, base_dir, repo_path, clone_config or CloneConfig(depth=0, blob_filter=False, sparse=False), extensions or set())
         except subprocess.CalledProcessError as e:
             print(f"[x] Error cloning repository: {e.stderr}")
             raise
     return repo_path
 
 
-def build_file_index(root: Path, allowed_exts: set[str], ignored_dirs: set[str], ignored_files: set[str]) -> tuple[list[str], list[str]]:
-    indexed_files = []
-    non_indexed_files = []
+async def analyze_file(
+    file_path: str,
+    active_rule: LanguageRule,
+    repo_root: Path,
+    client: Optional["httpx.AsyncClient"],
+    scheduler: AnalysisScheduler,
+    chunking: ChunkingConfig,
+    mode: str = "direct",
+    hints: Optional[list[TriageHint]] = None,
+    tier: Optional[ModelTier] = None,
+) -> tuple[Optional[list[Finding]], AnalysisStats]:
+    """Analyzes a single file, with the models and context of a cascade `tier` if given. The findings are None if the analysis failed."""
+    if tier and tier.chunk_max_tokens:
+        chunking = replace(chunking, max_tokens=tier.chunk_max_tokens)
+    try:
+        tokens = estimate_tokens((repo_root / file_path).stat().st_size)
+    except OSError as e:
+        # Routine under --watch: the file was removed or renamed after it was indexed
+        print(f"[!] Skipping {file_path}, it can no longer be read: {e}")
+        return None, AnalysisStats()
+    if mode == "agent" and tokens > chunking.max_tokens:
+        # The agent would carry the whole file through its context, so oversized files are chunked on the direct path
+        mode = "direct"
+    print(f"[*] Analyzing {file_path} with {active_rule.language} rules ({mode} mode)...")
+
+    stats = AnalysisStats()
+    current_stats.set(stats)
+
+    start = time.perf_counter()
+    try:
+        if mode == "agent":
+            # The file content travels through the model context more than once on the agent path
+            analyze = partial(analyze_with_agent, repo_root, file_path, active_rule, client, hints, tier)
+            findings = await scheduler.call(analyze, tokens=2 * tokens, label=file_path)
+        else:
+            # Rate limiting and retries are applied per chunk
+            findings = await analyze_direct(repo_root, file_path, active_rule, scheduler, chunking, hints, tier)
+        stats.latency = time.perf_counter() - start
+        usage = f"{stats.latency:.1f}s, {stats.llm_calls} LLM call(s), {stats.input_tokens} in / {stats.output_tokens} out tokens"
+
+        if findings:
+            print(f"[+] Found {len(findings)} potential issues in {file_path} ({usage})")
+        else:
+            print(f"[+] {file_path} analyzed. No issues found. ({usage})")
+        return findings, stats
+    except json.JSONDecodeError as e:
+        print(f"[!] Could not decode the response for {file_path}, even after asking again: {e}")
+    except Exception as e:
+        print(f"[x] Error analyzing {file_path}: {e}")
+    stats.latency = time.perf_counter() - start
+    return None, stats
+
+
+async def analyze_small_files(
+    file_paths: list[str],
+    active_rule: LanguageRule,
+    repo_root: Path,
+    scheduler: AnalysisScheduler,
+    hints: dict[str, list[TriageHint]],
+    tier: Optional[ModelTier] = None,
+) -> tuple[Optional[dict[str, list[Finding]]], AnalysisStats]:
+    """Analyzes a batch of small files in a single request. The findings are None if the batch must be analyzed file by file."""
+    print(f"[*] Analyzing {len(file_paths)} small {active_rule.language} files in one request: {', '.join(file_paths)}")
+
+    stats = AnalysisStats()
+    current_stats.set(stats)
+
+    start = time.perf_counter()
+    try:
+        findings = await analyze_batch(repo_root, file_paths, active_rule, scheduler, hints, tier)
+        stats.latency = time.perf_counter() - start
+        usage = f"{stats.latency:.1f}s, {stats.llm_calls} LLM call(s), {stats.input_tokens} in / {stats.output_tokens} out tokens"
+        print(f"[+] Batch of {len(file_paths)} files analyzed. Found {sum(len(f) for f in findings.values())} potential issues ({usage})")
+        return findings, stats
+    except (ValueError, json.JSONDecodeError) as e:
+        print(f"[!] Could not split the batch response, analyzing its files one by one: {e}")
+    except Exception as e:
+        print(f"[x] Error analyzing a batch, analyzing its files one by one: {e}")
+    stats.latency = time.perf_counter() - start
+    return None, stats
+
+
+async def classify(
+    file_path: str,
+    active_rule: LanguageRule,
+    repo_root: Path,
+    scheduler: AnalysisScheduler,
+    tier: ModelTier,
+    max_tokens: int,
+    hints: Optional[list[TriageHint]] = None,
+) -> tuple[str, AnalysisStats]:
+    """Runs the first pass of the cascade on a file. A file that cannot be classified needs a review."""
+    stats = AnalysisStats()
+    current_stats.set(stats)
+
+    start = time.perf_counter()
+    try:
+        verdict = await classify_file(repo_root, file_path, active_rule, scheduler, tier, max_tokens, hints)
+    except Exception as e:
+        print(f"[!] Could not classify {file_path}, escalating it: {e}")
+        verdict = "needs_review"
+    stats.latency = time.perf_counter() - start
+    return verdict, stats
+
+
+def print_usage_summary(mode: str, all_stats: list[AnalysisStats], n_files: int):
+    """Prints the total and per-file LLM cost of the scan, to compare analysis modes."""
+    if not all_stats or not n_files:
+        return
+    n = n_files
+    calls = sum(s.llm_calls for s in all_stats)
+    input_tokens = sum(s.input_tokens for s in all_stats)
+    output_tokens = sum(s.output_tokens for s in all_stats)
+    latency = sum(s.latency for s in all_stats)
+    print(f"[*] Usage ({mode} mode): {n} file(s), {calls} LLM call(s), {input_tokens} in / {output_tokens} out tokens")
+    print(f"[*] Per file: {calls / n:.1f} LLM call(s), {(input_tokens + output_tokens) / n:.0f} tokens, {latency / n:.1f}s latency")
+
+
+def restore_cached_findings(files: list[str], file_keys: dict[str, str], store: FindingsStore, report: ReportWriter) -> tuple[int, list[str], list[str]]:
+    """
+    Looks up the stored findings of files by their content key and writes them to the report.
+
+    Returns:
+        A tuple containing:
+        - The number of cached findings restored, rewritten to their paths.
+        - The files whose findings were restored (files without a rule have nothing to restore and count as restored).
+        - The files with no stored findings for the current content, rule and model, which must be analyzed.
+    """
+    cached_findings = 0
+    restored_files = []
+    missing_files = []
+
+    for file_path in files:
+        if file_path not in file_keys:
+            restored_files.append(file_path)
+            continue
+        findings = store.get(file_keys[file_path], file_path)
+        if findings is None:
+            missing_files.append(file_path)
+        else:
+            report.write(file_path, findings)
+            cached_findings += len(findings)
+            restored_files.append(file_path)
+
+    return cached_findings, restored_files, missing_files
+
+
+def resume_checkpoint(checkpoint: ScanCheckpoint, file_keys: dict[str, str], store: FindingsStore, report: ReportWriter) -> dict[str, CheckpointEntry]:
+    """
+    Restores the findings of the files finished by an interrupted scan and writes them to the report.
+
+    Returns the entries of the files that are done: their content is unchanged since and their findings are still stored.
+    Failed files and files modified since the interruption are analyzed again.
+    """
+    resumed = {}
+    for path, entry in checkpoint.load().items():
+        if entry.status != "done" or file_keys.get(path) != entry.key:
+            continue
+        findings = store.get(entry.key, path)
+        if findings is not None:
+            report.write(path, findings)
+            resumed[path] = entry
+    return resumed
+
+
+def apply_triage(
+    repo_root: Path,
+    content_groups: list[list[str]],
+    rules_map: dict[str, LanguageRule],
+    triage_config: TriageConfig,
+) -> tuple[list[list[str]], dict[str, TriageResult], list[str]]:
+    """
+    Scores the file groups with the local triage patterns of their rule.
 
-    for p in root.rglob("*"):
-        relative_path = p.relative_to(root)
-        if any(part in ignored_dirs for part in relative_path.parts):
+    Returns:
+        A tuple containing:
+        - The groups to analyze, highest scoring first (files without triage patterns after the flagged ones).
+        - The triage result of each analyzed file, whose hints are passed to the model.
+        - The files skipped because no risky pattern was found.
+    """
+    if not triage_config.enabled:
+        return content_groups, {}, []
+
+    candidates = {paths[0]: rule.triage for paths in content_groups if (rule := rules_map[Path(paths[0]).suffix.lower()]).triage}
+    if not candidates:
+        return content_groups, {}, []
+    triage_results = triage_files(repo_root, candidates, triage_config.workers)
+    clean = {path for path, result in triage_results.items() if result.score < candidates[path].min_score}
+    print(f"[*] Pre-triage: {len(candidates) - len(clean)} file(s) flagged, {len(clean)} clean.")
+
+    triaged_files = []
+    if triage_config.skip_clean:
+        triaged_files = [path for paths in content_groups if paths[0] in clean for path in paths]
+        content_groups = [paths for paths in content_groups if paths[0] not in clean]
+    content_groups = sorted(content_groups, key=lambda paths: -triage_results[paths[0]].score if paths[0] in triage_results else 0)
+    return content_groups, triage_results, triaged_files
+
+
+def prioritize_groups(
+    repo_root: Path,
+    content_groups: list[list[str]],
+    config: PriorityConfig,
+    triage_results: dict[str, TriageResult],
+    sizes: dict[str, int],
+    repo_cache: dict[str, Any],
+    rules_map: dict[str, LanguageRule],
+    model_id: str,
+    store: FindingsStore,
+) -> list[list[str]]:
+    """Orders the groups to analyze by risk, from their triage score, entry point names, git churn, past findings and size."""
+    paths = [path for paths in content_groups for path in paths]
+    # The findings of the content analyzed last time, under the same rule and model (legacy cache entries are plain hashes)
+    old_hashes = {path: entry["hash"] if isinstance(entry, dict) else entry for path in paths if (entry := repo_cache.get(path))}
+    past_findings = {path: store.count(key) or 0 for path, key in content_keys(old_hashes, rules_map, model_id).items()}
+    file_churn = churn(repo_root, config.churn_days) if config.churn_days else {}
+    triage_scores = {path: result.score for path, result in triage_results.items()}
+    return prioritize(content_groups, config, triage_scores, sizes, file_churn, past_findings)
+
+
+def resolve_repo(url: Optional[str], directory: Optional[Path], whitelisted_exts: set[str]) -> Optional[tuple[Path, str, str]]:
+    """
+    Clones or updates a remote repo, or checks a local directory. Returns its root, identifier and report name, or None on error.
+
+    The report name is unique per identifier, so same-named repositories of a batch never write to the same reports.
+    """
+    if url:
+        try:
+            repo_root = get_repo(url, Path("repos"), load_clone_config(), whitelisted_exts)
+            return repo_root, url, repo_root.name
+        except subprocess.CalledProcessError:
+            print(f"[x] The repository URL {url} is incorrect or does not exist.")
+            return None
+
+    if not directory or not directory.is_dir():
+        print(f"[x] The specified directory '{directory}' does not exist.")
+        return None
+    repo_root = directory.resolve()
+    try:
+        # Use git remote url as the most reliable identifier
+        result = subprocess.run(["git", "remote", "get-url", "origin"], cwd=repo_root, check=True, capture_output=True, text=True)
+        repo_identifier = result.stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # Fallback to relative path if not a git repo or no remote
+        print(f"[!] Warning: Could not determine git remote of {directory}. Using directory path as cache key.")
+        repo_identifier = directory.as_posix()
+    return repo_root, repo_identifier, repo_slug(repo_root.name, repo_root.as_posix())
+
+
+def load_batch_targets(path: Path) -> list[tuple[Optional[str], Optional[Path]]]:
+    """
+    Reads the repositories of a batch: one per line, either a JSON object with a `url` or `directory`
+    key (JSON Lines) or a plain URL or directory path. Blank lines and `#` comments are ignored.
+    """
+    targets = []
+    for line_no, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
             continue
-        if p.is_file():
-            if p.name in ignored_files:
+        if line.startswith("{"):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"[!] Warning: Skipping malformed line {line_no} of {path}: {e}")
                 continue
-            path_str = relative_path.as_posix()
-            if p.suffix.lower() in allowed_exts:
-                indexed_files.append(path_str)
-            else:
-                non_indexed_files.append(path_str)
-    return indexed_files, non_indexed_files
+            url, directory = entry.get("url"), entry.get("directory")
+        elif "://" in line or line.startswith("git@"):
+            url, directory = line, None
+        else:
+            url, directory = None, line
+        if not url and not directory:
+            print(f"[!] Warning: Skipping line {line_no} of {path}: no 'url' or 'directory'.")
+            continue
+        targets.append((url, Path(directory) if directory else None))
+    return targets
+
+
+def unique_targets(targets: list[tuple[Optional[str], Optional[Path]]]) -> list[tuple[Optional[str], Optional[Path]]]:
+    """Drops the repositories listed more than once in a batch, which would otherwise be scanned twice at the same time into the same clone."""
+    seen: set[str] = set()
+    unique = []
+    for url, directory in targets:
+        key = normalize_url(url) if url else str(directory.resolve() if directory else None)
+        if key in seen:
+            print(f"[!] Warning: {url or directory} is listed more than once in the batch. Scanning it once.")
+            continue
+        seen.add(key)
+        unique.append((url, directory))
+    return unique
+
+
+def is_fast_path(args: argparse.Namespace) -> bool:
+    """Index-only, cache-only and dry runs never call the model, so they never load dspy, pydantic-ai or httpx."""
+    return args.index_only or args.cache_only or args.dry_run
+
+
+def is_plan_run(args: argparse.Namespace) -> bool:
+    """Index-only and dry runs only plan a scan: they write a `-security-plan` file and leave the last report and metrics alone."""
+    return args.index_only or args.dry_run
+
+
+def report_kind(args: argparse.Namespace) -> str:
+    """
+    The name of the report file after the repository: a plan for plan runs, and a report of its own for a --since scan,
+    which only covers the changed files and must not replace the report of a full scan.
+    """
+    kind = "security-plan" if is_plan_run(args) else "security-report"
+    if args.since:
+        ref = re.sub(r"[^\w.-]+", "-", args.since).strip("-")
+        kind = f"since-{ref}-{kind}"
+    return kind
+
+
+@dataclass
+class ScanContext:
+    """Configuration and resources shared by the scans of every repository of a run."""
+
+    args: argparse.Namespace
+    rules_map: dict[str, LanguageRule]
+    whitelisted_exts: set[str]
+    ignored_dirs: set[str]
+    ignored_files: set[str]
+    cache_store: CacheStore
+    findings_store: FindingsStore
+    scheduler: AnalysisScheduler
+    client: Optional["httpx.AsyncClient"]  # None on the fast paths, which never call the model
+    mode: str
+    backend: str
+    chunking: ChunkingConfig
+    batching: BatchingConfig
+    cascade: CascadeConfig
+    metrics: ScanMetrics
+    budget: ScanBudget
+    # The analyses in flight by content key, so a repository of a batch awaits the analysis of a file another one already started
+    analyses: dict[str, "asyncio.Future[Optional[list[Finding]]]"] = field(default_factory=dict)
+
+
+@asynccontextmanager
+async def open_scan_context(args: argparse.Namespace, rules_map: dict[str, LanguageRule], whitelisted_exts: set[str]) -> AsyncIterator[ScanContext]:
+    """Opens the caches, the scheduler, the HTTP client and the metrics shared by every scan of the run."""
+    ignored_dirs, ignored_files = load_blacklist()
+    scheduler_config = load_scheduler_config()
+    if args.workers:
+        scheduler_config.workers = args.workers
+    mode = args.mode or load_analysis_mode()
+    batching = load_batching_config()
+    # The agent reads its file through a tool, so batching only applies to direct mode
+    batching.enabled = batching.enabled and mode == "direct"
+    cascade = load_cascade_config()
+    unknown_tiers = cascade.unknown_tiers(unique_rules(rules_map)) if cascade.enabled else []
+    if unknown_tiers:
+        print(f"[!] Warning: Unknown cascade tier(s) {unknown_tiers}. Define them under cascade.tiers; the cascade is disabled.")
+        cascade.enabled = False
+
+    # Logfire is an optional exporter of the stage spans, never loaded on the fast paths
+    metrics = ScanMetrics(load_model_name(), load_metrics_config(), None if is_fast_path(args) else init_telemetry())
+    budget_config = load_budget_config()
+    budget_config.max_tokens = args.max_tokens if args.max_tokens is not None else budget_config.max_tokens
+    budget_config.max_cost = args.max_cost if args.max_cost is not None else budget_config.max_cost
+    if args.deadline or budget_config.deadline is not None:
+        # A number of seconds in config.yaml is read as an int
+        budget_config.deadline = args.deadline or str(budget_config.deadline)
+        try:
+            parse_deadline(budget_config.deadline)
+        except ValueError as e:
+            print(f"[!] Warning: {e}. budget.deadline is ignored.")
+            budget_config.deadline = None
+    if budget_config.max_cost is not None:
+        models = {metrics.model_name, *(tier.model for tier in cascade.tiers.values() if cascade.enabled)}
+        unpriced = sorted(model for model in models if metrics.estimate_cost(model, 1, 1) is None)
+        if unpriced:
+            print(f"[!] Warning: No price for {', '.join(unpriced)}. Set metrics.input_price and metrics.output_price; the cost budget is ignored.")
+            budget_config.max_cost = None
+    budget = ScanBudget(budget_config, metrics.model_name, metrics.estimate_cost)
+    if budget.limited and not is_fast_path(args):
+        budget_limits = []
+        if budget_config.max_tokens is not None:
+            budget_limits.append(f"{budget_config.max_tokens} tokens")
+        if budget_config.max_cost is not None:
+            budget_limits.append(f"${budget_config.max_cost:g}")
+        if budget.deadline is not None:
+            budget_limits.append(f"{max(budget.deadline - time.monotonic(), 0) / 60:.0f} min")
+        print(f"[*] Budget of the run: {', '.join(budget_limits)}. The riskiest files are analyzed first.")
+
+    async with AsyncExitStack() as stack:
+        cache_store = stack.enter_context(load_cache_store())
+        client = None
+        if not is_fast_path(args):
+            import httpx
+
+            # The agent's OpenAI requests go through this client, see `agent_model_for`. DSPy's go through litellm
+            limits = httpx.Limits(max_connections=scheduler_config.workers * 2, max_keepalive_connections=scheduler_config.workers)
+            client = await stack.enter_async_context(httpx.AsyncClient(limits=limits))
+        yield ScanContext(
+            args=args,
+            rules_map=rules_map,
+            whitelisted_exts=whitelisted_exts,
+            ignored_dirs=ignored_dirs,
+            ignored_files=ignored_files,
+            cache_store=cache_store,
+            findings_store=load_findings_store(),
+            scheduler=AnalysisScheduler(scheduler_config),
+            client=client,
+            mode=mode,
+            backend=args.backend or load_model_backend(),
+            chunking=load_chunking_config(),
+            batching=batching,
+            cascade=cascade,
+            metrics=metrics,
+            budget=budget,
+        )
+
+
+async def scan_target(ctx: ScanContext, url: Optional[str], directory: Optional[Path], clone_slots: Optional[asyncio.Semaphore] = None) -> RepoSummary:
+    """Resolves and scans one repository, turning any failure into the error of its summary."""
+    start = time.perf_counter()
+    name = url or str(directory)
+    try:
+        if clone_slots:
+            async with clone_slots:
+                resolved = await asyncio.to_thread(resolve_repo, url, directory, ctx.whitelisted_exts)
+        else:
+            resolved = resolve_repo(url, directory, ctx.whitelisted_exts)
+        if resolved is None:
+            return RepoSummary(repo=name, error="could not get the repository")
+        repo_root, repo_identifier, report_name = resolved
+
+        # Findings are streamed to the report as each file completes, so a crashed scan leaves its partial results
+        with open_report(Path("reports"), report_name, load_report_formats(), kind=report_kind(ctx.args)) as report, ScanCheckpoint(repo_identifier) as checkpoint:
+            summary = await scan_repo(ctx, repo_root, repo_identifier, report, checkpoint)
+    except Exception as e:
+        print(f"[x] Error scanning {name}: {e}")
+        summary = RepoSummary(repo=name, error=str(e) or type(e).__name__)
+    summary.duration = time.perf_counter() - start
+    return summary
+
+
+async def run_batch(ctx: ScanContext, targets: list[tuple[Optional[str], Optional[Path]]]):
+    """Scans every repository of a batch concurrently, all feeding the same analysis queue."""
+    clone_workers = max(1, load_clone_config().workers)
+    clone_slots = asyncio.Semaphore(clone_workers)
+    print(f"[*] Batch of {len(targets)} repositories: {clone_workers} cloned at a time, {ctx.scheduler.config.workers} analysis worker(s) shared.")
+
+    summaries = await asyncio.gather(*(scan_target(ctx, url, directory, clone_slots) for url, directory in targets))
+
+    summary_path = Path("reports") / ("batch-plan.md" if is_plan_run(ctx.args) else "batch-summary.md")
+    write_batch_summary(summaries, summary_path)
+    failed = sum(1 for s in summaries if s.error)
+    print("\n--- BATCH SUMMARY ---")
+    print(f"[+] {len(summaries) - failed}/{len(summaries)} repositories scanned, {sum(s.findings for s in summaries)} finding(s).")
+    print(f"[+] Summary generated at: {summary_path.resolve()}")
+
+
+async def run_watch(ctx: ScanContext, directory: Path):
+    """
+    Scans `directory`, then keeps the rules, models, caches and HTTP client loaded and rescans the files that change,
+    rewriting the report in place, until Ctrl-C or a "stop" job. Editors and CI submit scan jobs on `watch.endpoint`.
+    """
+    resolved = resolve_repo(None, directory, ctx.whitelisted_exts)
+    if resolved is None:
+        return
+    repo_root, repo_identifier, report_name = resolved
+    watch_config = load_watch_config()
+    # Findings of every file in the report, so a rescan rewrites it without reading the findings of unchanged files again
+    reported: dict[str, list[Finding]] = {}
+    scan_lock = asyncio.Lock()
+    stop = asyncio.Event()
+    scans = 0
+
+    async def rescan(files: Optional[list[str]], deleted: Iterable[str] = ()) -> RepoSummary:
+        """Scans the given files (every file for None) and rewrites the report with the findings of the other ones."""
+        nonlocal scans
+        async with scan_lock:
+            start = time.perf_counter()
+            # Changed files are written again by the scan, unless they are no longer analyzed (e.g. skipped by the triage)
+            for path in [*deleted, *(files or ())]:
+                reported.pop(path, None)
+            if files is None:
+                reported.clear()
+            try:
+                with open_report(Path("reports"), report_name, load_report_formats(), reported.__setitem__) as report:
+                    for path, findings in sorted(reported.items()):
+                        report.write(path, findings)
+                    if files == []:
+                        # Only deletions: nothing to analyze
+                        report.finalize(ReportSummary())
+                        summary = RepoSummary(repo=repo_identifier, reports=[str(p) for p in report.paths], findings=report.findings_count)
+                        print(f"[+] Report updated at: {', '.join(str(p.resolve()) for p in report.paths)}")
+                    else:
+                        with ScanCheckpoint(repo_identifier) as checkpoint:
+                            summary = await scan_repo(ctx, repo_root, repo_identifier, report, checkpoint, files)
+            except Exception as e:
+                print(f"[x] Error scanning {repo_root}: {e}")
+                summary = RepoSummary(repo=repo_identifier, error=str(e) or type(e).__name__)
+            scans += 1
+            summary.duration = time.perf_counter() - start
+            return summary
+
+    async def apply_changes(paths: Optional[Iterable[str]]) -> Optional[RepoSummary]:
+        """Rescans the changed paths, or every file for None. Returns None if none of the paths is scanned or reported."""
+        if paths is None:
+            print("[!] Some changes were missed. Rescanning the whole repository.")
+            return await rescan(None)
+        paths = set(paths)
+        present = [path for path in paths if (repo_root / path).is_file()]
+        gone = paths.difference(present)
+        # A removed directory takes the reported files under it along
+        deleted = [path for path in reported if path in gone or any(path.startswith(f"{d}/") for d in gone)]
+        files = [path for path in without_ignored_dirs(present, ctx.ignored_dirs) if Path(path).suffix.lower() in ctx.whitelisted_exts]
+        files = await asyncio.to_thread(without_gitignored, repo_root, files)
+        if not files and not deleted:
+            return None
+        print(f"\n[*] {len(files)} file(s) changed and {len(deleted)} removed in {repo_root.name}. Rescanning...")
+        return await rescan(sorted(files), deleted)
+
+    def relative(path: str) -> Optional[str]:
+        try:
+            return (repo_root / path).resolve().relative_to(repo_root).as_posix()
+        except ValueError:
+            return None  # Outside the watched repository
+
+    async def handle(request: dict[str, Any]) -> dict[str, Any]:
+        action = request.get("action", "scan")
+        if action == "status":
+            findings = sum(len(f) for f in reported.values())
+            return {"ok": True, "repo": repo_identifier, "files": len(reported), "findings": findings, "scans": scans, "scanning": scan_lock.locked()}
+        if action == "stop":
+            stop.set()
+            return {"ok": True}
+        if action != "scan":
+            return {"ok": False, "error": f"unknown action {action!r}, expected 'scan', 'status' or 'stop'"}
+
+        url, other = request.get("url"), request.get("directory")
+        if url or (other and Path(other).resolve() != repo_root):
+            if not watch_config.allow_other_repos:
+                return {"ok": False, "error": "jobs for another repository are disabled, set watch.allow_other_repos to accept them"}
+            # Another repository, scanned with the same warm context
+            summary = await scan_target(ctx, url, Path(other) if other else None)
+        elif request.get("paths") is not None:
+            paths = [rel for path in request["paths"] if (rel := relative(path)) is not None]
+            summary = await apply_changes(paths) or RepoSummary(repo=repo_identifier, findings=sum(len(f) for f in reported.values()))
+        else:
+            summary = await rescan(None)
+        return {"ok": summary.error is None, **asdict(summary)}
+
+    async def follow():
+        async for batch in watch_changes(repo_root, ctx.ignored_dirs, ctx.whitelisted_exts, watch_config):
+            await apply_changes(batch)
+
+    server = None
+    if watch_config.endpoint:
+        try:
+            server = await serve(watch_config.endpoint, handle, Path(watch_config.token_file))
+            print(f"[+] Accepting scan jobs on {watch_config.endpoint}.")
+        except (OSError, ValueError, NotImplementedError) as e:
+            print(f"[!] Warning: Could not listen on {watch_config.endpoint}: {e}. Scan jobs are disabled.")
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # Not on Windows, where Ctrl-C interrupts the daemon directly
+        with suppress(NotImplementedError, RuntimeError):
+            loop.add_signal_handler(sig, stop.set)
+
+    # Changes made during the first scan are picked up right after it
+    follower = asyncio.create_task(follow())
+    await rescan(None)
+    ctx.args.resume = False  # Only the first scan continues an interrupted one
+    print(f"\n[+] Watching {repo_root} for changes. Press Ctrl-C to stop.")
+    stopper = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait({follower, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if follower.done() and follower.exception():
+            print(f"[x] The watcher stopped: {follower.exception()}")
+    finally:
+        follower.cancel()
+        stopper.cancel()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError, RuntimeError):
+                loop.remove_signal_handler(sig)
+        if server:
+            server.close()
+            address = parse_endpoint(watch_config.endpoint)
+            (address if isinstance(address, Path) else Path(watch_config.token_file)).unlink(missing_ok=True)
+    print(f"[+] Watch stopped after {scans} scan(s).")
+
+
+async def submit_job(job: str):
+    """Sends a job to the running --watch daemon and prints its answer. Exits with 1 if the daemon is unreachable or the job failed."""
+    watch_config = load_watch_config()
+    endpoint = watch_config.endpoint
+    if not endpoint:
+        print("[x] The watch endpoint is disabled in config.yaml (watch.endpoint).")
+        sys.exit(1)
+    try:
+        request = json.loads(job)
+    except json.JSONDecodeError:
+        request = {"action": job}
+    try:
+        response = await submit(endpoint, request, Path(watch_config.token_file))
+    except (OSError, ValueError) as e:
+        print(f"[x] Could not reach the watch daemon on {endpoint}: {e}")
+        sys.exit(1)
+    print(json.dumps(response, indent=2))
+    if not response.get("ok"):
+        sys.exit(1)
+
+
+def write_metrics(metrics: ScanMetrics, name: str):
+    """Writes the metrics of the run to `reports/<name>-metrics.json` and prints their summary."""
+    metrics_path = Path("reports") / f"{name}-metrics.json"
+    data = metrics.write(metrics_path)
+    metrics.print_summary(data)
+    print(f"[+] Metrics written to: {metrics_path.resolve()}")
 
 
 async def main():
     args = parse_args()
+    if args.submit:
+        await submit_job(args.submit)
+        return
+    init_env()
 
-    # 1. Load configurations and cache
+    # 1. Load configurations and rules
     whitelisted_exts = set(e.lower() for e in load_whitelist())
     if not whitelisted_exts:
         print("[x] The 'config.yaml' file does not exist, is empty, or has no whitelisted extensions. Nothing to analyze.")
         return
 
-    ignored_dirs, ignored_files = load_blacklist()
     rules_map = load_rules(Path("rules"), allowed_extensions=whitelisted_exts)
     if not rules_map:
         print("[x] No rules found for the extensions specified in 'whitelist.yaml'.")
@@ -110,103 +776,359 @@ async def main():
         if ext not in rules_map:
             print(f"[!] Warning: Extension '{ext}' is in the whitelist but no rule was found for it.")
 
-    cache = load_cache()
+    targets = unique_targets(load_batch_targets(args.batch)) if args.batch else [(args.url, args.directory)]
+    if not targets:
+        print(f"[x] No repositories found in {args.batch}.")
+        return
 
-    # 2. Get the source code and determine repo identifier
-    if args.url:
-        repo_identifier = args.url
-        try:
-            repo_root = get_repo(args.url, Path("repos"))
-        except subprocess.CalledProcessError:
-            print("[x] The repository URL is incorrect or does not exist.")
-            return
-    else:  # args.directory
-        if not args.directory or not args.directory.is_dir():
-            print(f"[x] The specified directory '{args.directory}' does not exist.")
-            return
-        repo_root = args.directory.resolve()
-        try:
-            # Use git remote url as the most reliable identifier
-            result = subprocess.run(["git", "remote", "get-url", "origin"], cwd=repo_root, check=True, capture_output=True, text=True)
-            repo_identifier = result.stdout.strip()
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            # Fallback to relative path if not a git repo or no remote
-            print("[!] Warning: Could not determine git remote. Using directory path as cache key.")
-            repo_identifier = args.directory.as_posix()
+    # 2. Get the source code and scan it, with caches, rate limits and HTTP client shared by every repository
+    async with open_scan_context(args, rules_map, whitelisted_exts) as ctx:
+        # Every task of the run inherits the metrics, so the pipeline can time its stages
+        current_metrics.set(ctx.metrics)
+        if args.batch:
+            await run_batch(ctx, targets)
+        elif args.watch:
+            await run_watch(ctx, args.directory)
+        else:
+            await scan_target(ctx, *targets[0])
+        ctx.findings_store.evict()
+        if ctx.metrics.config.enabled and not is_plan_run(args):
+            # Every rescan of --watch adds its repository again
+            write_metrics(ctx.metrics, "batch" if args.batch or len(set(ctx.metrics.repos)) != 1 else ctx.metrics.repos[0])
+
+
+async def scan_repo(ctx: ScanContext, repo_root: Path, repo_identifier: str, report: ReportWriter, checkpoint: ScanCheckpoint, files: Optional[list[str]] = None) -> RepoSummary:
+    """
+    Indexes, analyzes and reports a single repository, or only its given `files` (the changes seen by --watch).
+
+    The blocking indexing steps run in threads, so several repositories can be prepared while others are analyzed.
+    """
+    args, rules_map, cache_store, findings_store = ctx.args, ctx.rules_map, ctx.cache_store, ctx.findings_store
+    summary = RepoSummary(repo=repo_identifier, reports=[str(p) for p in report.paths])
+    metrics = ctx.metrics
+    metrics.repos.append(repo_root.name)
 
     # 3. Index files and filter using cache
-    all_files, non_indexed_files = build_file_index(repo_root, whitelisted_exts, ignored_dirs, ignored_files)
-    repo_name = repo_root.name
-    report_path = Path("reports") / f"{repo_name}-security-report.md"
+    changed = files
+    if args.since and changed is None:
+        try:
+            with span("git_diff", repo=repo_root.name):
+                changed = await asyncio.to_thread(changed_files, repo_root, args.since, ctx.ignored_dirs, load_clone_config())
+        except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
+            print(f"[x] Could not list the files changed since {args.since}: {getattr(e, 'stderr', None) or e}")
+            summary.error = f"could not list the files changed since {args.since}"
+            return summary
+        print(f"[*] {len(changed)} file(s) changed since {args.since}.")
+    with span("index", repo=repo_root.name):
+        all_files, non_indexed_files = await asyncio.to_thread(build_file_index, repo_root, ctx.whitelisted_exts, ctx.ignored_dirs, ctx.ignored_files, changed)
+    summary.files_indexed = len(all_files)
+    metrics.count("files_indexed", len(all_files))
 
     if not all_files:
         print("[x] No files with the whitelisted extensions were found in the repository.")
-        generate_markdown_report([], non_indexed_files, [], report_path)
-        print(f"[+] Report generated for unanalyzed files at: {report_path.resolve()}")
-        return
+        report.finalize(ReportSummary(unanalyzed_files=non_indexed_files))
+        print(f"[+] Report generated for unanalyzed files at: {', '.join(str(p.resolve()) for p in report.paths)}")
+        if not is_fast_path(args):
+            checkpoint.complete()
+        return summary
+
+    if args.index_only:
+        print(f"[+] Index only: {len(all_files)} file(s) would be considered for analysis, {len(non_indexed_files)} other file(s).")
+        report.finalize(ReportSummary(unanalyzed_files=non_indexed_files, unscanned_files=dict.fromkeys(all_files, "index-only run")))
+        print(f"[+] Plan written with the file index to: {', '.join(str(p.resolve()) for p in report.paths)}")
+        return summary
+
+    with span("hash", repo=repo_root.name):
+        repo_cache = await asyncio.to_thread(cache_store.load_repo, repo_identifier)
+        files_to_analyze, skipped_files, new_repo_cache = await asyncio.to_thread(filter_files_by_cache, repo_root, repo_identifier, all_files, repo_cache)
 
-    repo_cache = cache.get(repo_identifier, {})
-    files_to_analyze, skipped_files, new_repo_cache = filter_files_by_cache(repo_root, repo_identifier, all_files, repo_cache)
+    file_hashes = {path: entry["hash"] for path, entry in new_repo_cache.items()}
+    model_id = load_model_id(ctx.backend)
+    if ctx.cascade.enabled:
+        model_id = f"{model_id}+{ctx.cascade.cache_key(unique_rules(rules_map))}"
+    file_keys = content_keys(file_hashes, rules_map, model_id)
 
+    # Files finished by the interrupted scan are reported as analyzed in this one, so the report matches an uninterrupted run
+    resumed: dict[str, CheckpointEntry] = {}
+    if args.resume:
+        if checkpoint.exists():
+            resumed = resume_checkpoint(checkpoint, file_keys, findings_store, report)
+            print(f"[*] Resuming the last scan: {len(resumed)} file(s) already done.")
+        else:
+            print("[!] No interrupted scan to resume for this repository. Starting a new scan.")
+    if not is_fast_path(args):
+        checkpoint.start(resume=bool(resumed))
+    files_to_analyze = [f for f in files_to_analyze if f not in resumed]
+    skipped_files = [f for f in skipped_files if f not in resumed]
+
+    with span("cache_restore", repo=repo_root.name):
+        cached_findings, skipped_files, stale_files = restore_cached_findings(skipped_files, file_keys, findings_store, report)
+        # Changed files whose exact content was already analyzed (in another path or another repo) reuse those findings
+        unanalyzable_files = [f for f in files_to_analyze if f not in file_keys]
+        reused_findings, reused_files, files_to_analyze = restore_cached_findings([f for f in files_to_analyze if f in file_keys], file_keys, findings_store, report)
+    cached_findings += reused_findings
+    files_to_analyze.extend(stale_files)
+    # Unchanged and reused files are done already; analyzed files are recorded one by one as they finish
+    cache_store.upsert(repo_identifier, {path: new_repo_cache[path] for path in skipped_files + reused_files + unanalyzable_files})
+
+    content_groups = group_by_content(files_to_analyze, file_keys)
+    deduplicated_files: dict[str, Optional[str]] = dict.fromkeys(reused_files)
+    deduplicated_files.update({path: entry.source for path, entry in resumed.items() if entry.source})
+    deduplicated_files.update({dup: paths[0] for paths in content_groups for dup in paths[1:]})
+
+    if args.cache_only:
+        unscanned_files = dict.fromkeys((path for paths in content_groups for path in paths), "no cached findings")
+        for path in unscanned_files:
+            deduplicated_files.pop(path, None)
+        print(f"[*] Cache only: {cached_findings} cached finding(s) restored, {len(unscanned_files)} file(s) need an analysis.")
+        report.finalize(ReportSummary(non_indexed_files, skipped_files, deduplicated_files, len(deduplicated_files), unscanned_files=unscanned_files))
+        print(f"[+] Report generated with cached results at: {', '.join(str(p.resolve()) for p in report.paths)}")
+        summary.findings = report.findings_count
+        return summary
+
+    # Local pre-triage: skip (or analyze last) files with no risky pattern and pass flagged lines to the model
+    with span("triage", repo=repo_root.name):
+        content_groups, triage_results, triaged_files = await asyncio.to_thread(apply_triage, repo_root, content_groups, rules_map, load_triage_config())
+    for path in triaged_files:
+        deduplicated_files.pop(path, None)
+    cache_store.upsert(repo_identifier, {path: new_repo_cache[path] for path in triaged_files})
+
+    metrics.count("files_unchanged", len(skipped_files))
+    metrics.count("files_deduplicated", len(deduplicated_files))
+    metrics.count("files_triaged", len(triaged_files))
     if skipped_files:
-        print(f"[*] Skipping {len(skipped_files)} file(s) that have not changed.")
+        print(f"[*] Skipping {len(skipped_files)} file(s) that have not changed ({cached_findings} cached finding(s) restored).")
+    if stale_files:
+        print(f"[*] Re-analyzing {len(stale_files)} unchanged file(s) whose rule or model changed.")
+    if deduplicated_files:
+        print(f"[*] {len(deduplicated_files)} file(s) share their content with another file and will reuse its findings.")
 
-    if not files_to_analyze:
+    if not content_groups:
         print("[+] No files to analyze after cache check.")
-        generate_markdown_report([], non_indexed_files, skipped_files, report_path)
-        print(f"[+] Report generated with cached results at: {report_path.resolve()}")
-        cache[repo_identifier] = new_repo_cache
-        save_cache(cache)
-        return
+        report.finalize(ReportSummary(non_indexed_files, skipped_files, deduplicated_files, len(deduplicated_files), triaged_files))
+        print(f"[+] Report generated with cached results at: {', '.join(str(p.resolve()) for p in report.paths)}")
+        if not is_fast_path(args):
+            checkpoint.complete()
+        # A --since scan or a --watch rescan only sees the changed files, so the entries of the other files are kept
+        if changed is None:
+            cache_store.prune(repo_identifier, set(new_repo_cache))
+        summary.findings = report.findings_count
+        return summary
 
-    # 4. Import and run the agent
-    from agent.pydantic_agent import Deps, analyzer, security_agent
+    scheduler, client, mode, chunking, batching, cascade, budget = ctx.scheduler, ctx.client, ctx.mode, ctx.chunking, ctx.batching, ctx.cascade, ctx.budget
+    languages = {paths[0]: rules_map[Path(paths[0]).suffix.lower()].language for paths in content_groups}
+    # Sizes from the stat of the cache check: a file removed since then must not abort the scan
+    sizes = {paths[0]: new_repo_cache[paths[0]]["size"] for paths in content_groups}
+    priority = load_priority_config()
+    if priority.enabled and len(content_groups) > 1:
+        # Riskiest files first, so a run cut short by its budget has analyzed them
+        with span("prioritize", repo=repo_root.name):
+            content_groups = await asyncio.to_thread(prioritize_groups, repo_root, content_groups, priority, triage_results, sizes, repo_cache, rules_map, model_id, findings_store)
+    jobs = pack_batches(content_groups, languages, sizes, batching)
+    batches = [job for job in jobs if len(job) > 1]
 
-    all_findings = []
-    async with httpx.AsyncClient() as client:
-        for file_path in files_to_analyze:
-            file_ext = Path(file_path).suffix.lower()
-            active_rule = rules_map.get(file_ext)
+    if args.dry_run:
+        unscanned_files = dict.fromkeys((path for paths in content_groups for path in paths), "dry run")
+        for path in unscanned_files:
+            deduplicated_files.pop(path, None)
+        code_tokens = sum(estimate_tokens(size) for size in sizes.values())
+        print(f"[*] Dry run: {len(content_groups)} unique file(s) would be analyzed in {len(jobs)} job(s) ({mode} mode), about {code_tokens} tokens of code.")
+        if batches:
+            print(f"[*] Dry run: {sum(len(b) for b in batches)} small file(s) would share {len(batches)} request(s).")
+        if cascade.enabled:
+            print(f"[*] Dry run: a cascade first pass would decide which of them get the full analysis (escalating {', '.join(cascade.escalate)}).")
+        report.finalize(ReportSummary(non_indexed_files, skipped_files, deduplicated_files, len(deduplicated_files), triaged_files, unscanned_files))
+        print(f"[+] Plan written with cached results to: {', '.join(str(p.resolve()) for p in report.paths)}")
+        summary.findings = report.findings_count
+        return summary
 
-            if not active_rule:
-                continue
+    # 4. Load the model stack (dspy, pydantic-ai, telemetry) only now that there is something to analyze
+    from agent.pydantic_agent import init_models
 
-            print(f"[*] Analyzing {file_path} with {active_rule.language} rules...")
+    init_models(ctx.backend)  # Fails fast on a missing API key before scheduling any file
 
-            deps = Deps(
-                repo_root=repo_root,
-                file_index=file_path,
-                analyzer=analyzer,
-                active_rule=active_rule,
-                http=client,
-                selector=None,
-            )
+    # Content another repository of the batch already started to analyze waits for its findings instead of a second analysis.
+    # The split and the claim of the other files happen with no await in between, so two repositories never claim the same content
+    analyses = ctx.analyses
+    waiting_groups = [paths for paths in content_groups if file_keys[paths[0]] in analyses]
+    # Held here, since the other repository drops its entries from the map once its analyses are over
+    awaited = {file_keys[paths[0]]: analyses[file_keys[paths[0]]] for paths in waiting_groups}
+    if waiting_groups:
+        content_groups = [paths for paths in content_groups if file_keys[paths[0]] not in analyses]
+        jobs = pack_batches(content_groups, languages, sizes, batching)
+        batches = [job for job in jobs if len(job) > 1]
+        print(f"[*] {len(waiting_groups)} file(s) share their content with a file of another repository of the batch and will reuse its findings.")
+    loop = asyncio.get_running_loop()
+    claimed = {file_keys[paths[0]]: loop.create_future() for paths in content_groups}
+    analyses.update(claimed)
+    if budget.limited:
+        # Which of them start is only known as the budget is spent; the end of the scan tells how many did
+        print(f"[*] Queued {len(content_groups)} unique file(s) of {repo_root.name} with {scheduler.config.workers} shared worker(s), started while they fit in the budget...")
+    else:
+        print(f"[*] Analyzing {len(content_groups)} unique file(s) of {repo_root.name} with {scheduler.config.workers} shared worker(s)...")
 
-            instructions = f"Analyze the file '{file_path}' using the rules for {active_rule.language}. First, call `read_current_file` to get the code, then call `analyze_code` to analyze it."
+    def settle(paths: list[str], findings: Optional[list[Finding]]):
+        # None tells the repositories waiting for this content to analyze it themselves
+        future = claimed.get(file_keys[paths[0]])
+        if future and not future.done():
+            future.set_result(findings)
 
+    def record(paths: list[str], findings: Optional[list[Finding]], stats: Optional[AnalysisStats] = None):
+        settle(paths, findings)
+        if findings is None:
+            for path in paths:
+                checkpoint.record(path, "failed", file_keys[path])
+            return
+        findings_store.put(file_keys[paths[0]], findings)
+        cache_store.upsert(repo_identifier, {path: new_repo_cache[path] for path in paths})
+        for path in paths:
+            checkpoint.record(path, "done", file_keys[path], source=None if path == paths[0] else paths[0], stats=stats if path == paths[0] else None)
+            report.write(path, fan_out(findings, [path]))
+
+    def hints_of(file_path: str) -> list[TriageHint]:
+        return triage_results[file_path].hints if file_path in triage_results else []
+
+    def analysis_tier(rule: LanguageRule) -> Optional[ModelTier]:
+        return cascade.tiers_for(rule)[1] if cascade.enabled else None
+
+    # Groups the budget did not allow to analyze, with the reason
+    skipped: list[tuple[list[str], str]] = []
+
+    async def reuse_analysis(paths: list[str]) -> Optional[list[str]]:
+        """Records the findings of the same content analyzed by another repository, or returns the group if it has none."""
+        findings = await awaited[file_keys[paths[0]]]
+        if findings is None:
+            return paths
+        record(paths, findings)
+        deduplicated_files[paths[0]] = None
+        return None
+
+    try:
+        # Cascade: a cheap first pass classifies every file and only the escalated ones get the full analysis
+        unique_files = len(content_groups)
+        first_pass_stats: list[AnalysisStats] = []
+        if cascade.enabled:
+
+            async def first_pass(paths: list[str]) -> tuple[Optional[str], AnalysisStats]:
+                rule = rules_map[Path(paths[0]).suffix.lower()]
+                tier = cascade.tiers_for(rule)[0]
+                max_tokens = tier.chunk_max_tokens or chunking.max_tokens
+                tokens = min(estimate_tokens(sizes[paths[0]]), max_tokens) + estimate_tokens(len(rule.prompt))
+                reason = budget.start(tokens, tier.model)
+                if reason:
+                    skipped.append((paths, reason))
+                    settle(paths, None)
+                    return None, AnalysisStats()
+                verdict, stats = await classify(paths[0], rule, repo_root, scheduler, tier, max_tokens, hints_of(paths[0]))
+                budget.finish(tokens, tier.model, [stats])
+                metrics.record_file(repo_root.name, [paths[0]], stats, kind="classification", model=tier.model)
+                if verdict not in cascade.escalate:
+                    # The verdict is final: the file is done, with no findings
+                    record(paths, [], stats)
+                return verdict, stats
+
+            verdicts = await scheduler.map(content_groups, first_pass)
+            first_pass_stats = [stats for verdict, stats in verdicts if verdict]
+            content_groups = [paths for paths, (verdict, _) in zip(content_groups, verdicts, strict=True) if verdict in cascade.escalate]
+            metrics.count("files_classified", len(first_pass_stats))
+            metrics.count("files_escalated", len(content_groups))
+            print(f"[*] Cascade first pass: {len(content_groups)}/{len(first_pass_stats)} file(s) escalated to the full analysis.")
+            jobs = pack_batches(content_groups, languages, sizes, batching)
+            batches = [job for job in jobs if len(job) > 1]
+
+        if batches:
+            print(f"[*] Packed {sum(len(b) for b in batches)} small file(s) into {len(batches)} shared request(s).")
+
+        async def analyze_and_record(groups: list[list[str]]) -> list[AnalysisStats]:
+            # The files of a job share their language, so their rule and tier
+            rule = rules_map[Path(groups[0][0]).suffix.lower()]
+            tier = analysis_tier(rule)
+            model = tier.model if tier else None
+            # The file content travels through the model context more than once on the agent path, next to the rule prompt
+            tokens = sum(estimate_tokens(sizes[paths[0]]) for paths in groups) * (2 if mode == "agent" else 1) + estimate_tokens(len(rule.prompt))
+            reason = budget.start(tokens, model)
+            if reason:
+                skipped.extend((paths, reason) for paths in groups)
+                for paths in groups:
+                    settle(paths, None)
+                return []
+
+            all_stats: list[AnalysisStats] = []
             try:
-                result = await security_agent.run(instructions, deps=deps)
-                findings_list: FindingsList = result.output
-                findings = findings_list.__root__
-
-                if findings:
-                    for finding in findings:
-                        all_findings.append(finding)
-                    print(f"[+] Found {len(findings)} potential issues in {file_path}")
-                else:
-                    print(f"[+] {file_path} analyzed. No issues found.")
-            except json.JSONDecodeError:
-                print(f"[!] Could not decode the response for {file_path}. Output: {result.output}")
-            except Exception as e:
-                print(f"[x] Error analyzing {file_path}: {e}")
+                if len(groups) > 1:
+                    file_paths = [paths[0] for paths in groups]
+                    batch_findings, stats = await analyze_small_files(file_paths, rule, repo_root, scheduler, {path: hints_of(path) for path in file_paths}, tier)
+                    all_stats.append(stats)
+                    metrics.record_file(repo_root.name, file_paths, stats, failed=batch_findings is None, model=model)
+                    if batch_findings is not None:
+                        # The cost of the batch is recorded once, on its first file
+                        for i, paths in enumerate(groups):
+                            record(paths, batch_findings[paths[0]], stats if i == 0 else None)
+                        return all_stats
+
+                for paths in groups:
+                    file_path = paths[0]
+                    findings, stats = await analyze_file(file_path, rule, repo_root, client, scheduler, chunking, mode, hints_of(file_path), tier)
+                    all_stats.append(stats)
+                    metrics.record_file(repo_root.name, [file_path], stats, failed=findings is None, model=model)
+                    record(paths, findings, stats)
+                return all_stats
+            finally:
+                budget.finish(tokens, model, all_stats)
+
+        results, reused = await asyncio.gather(scheduler.map(jobs, analyze_and_record), asyncio.gather(*(reuse_analysis(paths) for paths in waiting_groups)))
+        # Content the other repository could not analyze (failed, or left for its next scan) is analyzed here
+        fallback_groups = [paths for paths in reused if paths]
+        if fallback_groups:
+            unique_files += len(fallback_groups)
+            results += await scheduler.map([[paths] for paths in fallback_groups], analyze_and_record)
+        metrics.count("files_deduplicated", len(waiting_groups) - len(fallback_groups))
+    finally:
+        # A scan that fails must not leave the other repositories of the batch waiting. The waiters hold the future
+        # already, and later scans find the findings in the findings store, so a long --watch run keeps no entry
+        for key, future in claimed.items():
+            if not future.done():
+                future.set_result(None)
+            analyses.pop(key, None)
+
+    # Files left for the next scan: they were not recorded, so the caches still see them as changed
+    unscanned_files = {path: reason for paths, reason in skipped for path in paths}
+    for path in unscanned_files:
+        deduplicated_files.pop(path, None)
+    if unscanned_files:
+        metrics.count("files_unscanned", len(unscanned_files))
+        print(f"[!] {skipped[0][1].capitalize()}: {len(unscanned_files)} file(s) left unscanned and listed in the report. The next scan analyzes them.")
+    if budget.limited:
+        print(f"[*] Analyzed {unique_files - len(skipped)} of the {unique_files} queued unique file(s) of {repo_root.name} within the budget.")
+
+    # The usage of a resumed scan covers the files analyzed before the interruption too
+    all_stats = [entry.stats for entry in resumed.values() if entry.stats] + first_pass_stats + [stats for job_stats in results for stats in job_stats]
+    analyzed_files = unique_files - len(skipped) + sum(1 for entry in resumed.values() if not entry.source)
+    print_usage_summary(mode, all_stats, analyzed_files)
+    summary.files_analyzed = analyzed_files
+    summary.files_unscanned = len(unscanned_files)
+    summary.llm_calls = sum(s.llm_calls for s in all_stats)
+    summary.input_tokens = sum(s.input_tokens for s in all_stats)
+    summary.output_tokens = sum(s.output_tokens for s in all_stats)
+
+    # Every deduplicated file saved what an analyzed file costs on average
+    average_calls = sum(s.llm_calls for s in all_stats) / analyzed_files if analyzed_files else 0.0
+    model_calls_saved = round(average_calls * len(deduplicated_files))
+    if deduplicated_files:
+        print(f"[*] Deduplication saved {len(deduplicated_files)} analyses (about {model_calls_saved} LLM call(s)).")
 
     # 5. Generate and save the final report and cache
-    generate_markdown_report(all_findings, non_indexed_files, skipped_files, report_path)
+    report.finalize(ReportSummary(non_indexed_files, skipped_files, deduplicated_files, model_calls_saved, triaged_files, unscanned_files))
     print("\n--- FINAL REPORT ---")
-    print(f"[+] Report successfully generated at: {report_path.resolve()}")
+    for path in report.paths:
+        print(f"[+] Report successfully generated at: {path.resolve()}")
 
-    cache[repo_identifier] = new_repo_cache
-    save_cache(cache)
+    checkpoint.complete()
+    # A --since scan or a --watch rescan only sees the changed files, so the entries of the other files are kept
+    if changed is None:
+        cache_store.prune(repo_identifier, set(new_repo_cache))
+    summary.findings = report.findings_count
+    return summary
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+from typing import Literal
+
 import dspy
 
 
@@ -17,7 +19,9 @@ class StaticCodeAnalysis(dspy.Signature):
       - severity: "CRITICAL" or "WARNING"
       - explanation: why it is a problem
       - recommendation: how to mitigate it
-      - line_hint (optional): relevant line or snippet
+      - line_hint: number of the relevant line, as an integer, or null
+
+    Nothing but the array: no Markdown code fences, no text around it.
     """
 
     code: str = dspy.InputField(desc="Source code of the file to analyze")
@@ -26,6 +30,21 @@ class StaticCodeAnalysis(dspy.Signature):
     findings_json: str = dspy.OutputField(desc="JSON array of findings with severity CRITICAL/WARNING")
 
 
+class FileClassification(dspy.Signature):
+    """Quickly decides how much security review a source file needs, without analyzing it in depth.
+
+    - clean: no security-relevant code (no input handling, sinks, secrets, crypto or network/file access)
+    - suspicious: security-relevant code that may be used safely
+    - needs_review: likely vulnerable, or too complex to judge quickly
+    """
+
+    code: str = dspy.InputField(desc="Source code of the file to classify")
+    filename: str = dspy.InputField(desc="Repo-relative path of the file")
+    language_instructions: str = dspy.InputField(desc="The vulnerabilities that matter for this language")
+    verdict: Literal["clean", "suspicious", "needs_review"] = dspy.OutputField()
+    reason: str = dspy.OutputField(desc="One sentence justifying the verdict")
+
+
 class PromptComposer(dspy.Signature):
     """Creates the system_prompt for the JS/TS security agent."""
 
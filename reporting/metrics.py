@@ -0,0 +1,211 @@
+import json
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from deps.deps import AnalysisStats
+
+# USD per million input / output tokens, used to estimate the cost of a scan when config.yaml sets no price
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+SLOWEST_FILES = 5
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = True
+    input_price: Optional[float] = None  # USD per million input tokens, overrides MODEL_PRICES
+    output_price: Optional[float] = None  # USD per million output tokens
+
+
+@dataclass
+class StageMetrics:
+    count: int = 0
+    seconds: float = 0.0  # Summed over every span, so concurrent stages can add up to more than the scan's wall time
+    max_seconds: float = 0.0
+
+
+@dataclass
+class FileMetrics:
+    repo: str
+    paths: list[str]  # The files of a batched request share one entry
+    status: str  # "done", or "failed" when the findings could not be obtained
+    kind: str  # "analysis", or "classification" for the first pass of the cascade
+    model: str
+    wall_time: float
+    model_latency: float
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    retries: int
+    cost: Optional[float]  # None when the price of the model is unknown
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+class ScanMetrics:
+    """
+    Collects the time spent in each stage of a run and the cost of each analyzed file.
+
+    Spans are also forwarded to `exporter` (e.g. `logfire.span`) when telemetry is enabled.
+    """
+
+    def __init__(self, model_name: str, config: Optional[MetricsConfig] = None, exporter: Optional[Callable[..., AbstractContextManager]] = None):
+        self.model_name = model_name
+        self.config = config or MetricsConfig()
+        self.exporter = exporter
+        self.stages: dict[str, StageMetrics] = {}
+        self.counters: dict[str, int] = {}
+        self.files: list[FileMetrics] = []
+        self.repos: list[str] = []
+        self.started = time.perf_counter()
+        # Spans end in worker threads too (hashing, DSPy calls)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[None]:
+        """Times a stage. Spans of the same name are aggregated."""
+        exported = self.exporter(name, **attributes) if self.exporter else nullcontext()
+        start = time.perf_counter()
+        try:
+            with exported:
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, StageMetrics())
+                stage.count += 1
+                stage.seconds += elapsed
+                stage.max_seconds = max(stage.max_seconds, elapsed)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def estimate_cost(self, model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+        input_price, output_price = MODEL_PRICES.get(model, (None, None))
+        input_price = self.config.input_price if self.config.input_price is not None else input_price
+        output_price = self.config.output_price if self.config.output_price is not None else output_price
+        if input_price is None or output_price is None:
+            return None
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def record_file(self, repo: str, paths: list[str], stats: AnalysisStats, failed: bool = False, kind: str = "analysis", model: Optional[str] = None):
+        """Records the cost of one analysis request, of a single file or of a batch of small files."""
+        model = model or self.model_name
+        entry = FileMetrics(
+            repo=repo,
+            paths=paths,
+            status="failed" if failed else "done",
+            kind=kind,
+            model=model,
+            wall_time=stats.latency,
+            model_latency=stats.model_latency,
+            llm_calls=stats.llm_calls,
+            input_tokens=stats.input_tokens,
+            output_tokens=stats.output_tokens,
+            retries=stats.retries,
+            cost=self.estimate_cost(model, stats.input_tokens, stats.output_tokens),
+        )
+        with self._lock:
+            self.files.append(entry)
+            if kind == "analysis" and not failed:
+                self.counters["files_analyzed"] = self.counters.get("files_analyzed", 0) + len(paths)
+
+    def to_dict(self) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        wall_times = [f.wall_time for f in self.files]
+        model_latencies = [f.model_latency for f in self.files]
+        costs = [f.cost for f in self.files]
+        analyzed = self.counters.get("files_analyzed", 0)
+        classified = self.counters.get("files_classified", 0)
+        return {
+            "model": self.model_name,
+            "repos": self.repos,
+            "duration": elapsed,
+            "files_per_minute": analyzed / elapsed * 60 if elapsed else 0.0,
+            # Share of the files classified by the cascade's first pass that got the full analysis
+            "escalation_rate": self.counters.get("files_escalated", 0) / classified if classified else None,
+            "latency": {
+                "p50": percentile(wall_times, 50),
+                "p95": percentile(wall_times, 95),
+                "model_p50": percentile(model_latencies, 50),
+                "model_p95": percentile(model_latencies, 95),
+            },
+            "totals": {
+                "llm_calls": sum(f.llm_calls for f in self.files),
+                "input_tokens": sum(f.input_tokens for f in self.files),
+                "output_tokens": sum(f.output_tokens for f in self.files),
+                "retries": sum(f.retries for f in self.files),
+                "cost": None if None in costs else sum(costs),
+            },
+            "counters": dict(self.counters),
+            "stages": {name: asdict(stage) for name, stage in self.stages.items()},
+            "slowest_files": [asdict(f) for f in self.slowest()],
+            "files": [asdict(f) for f in self.files],
+        }
+
+    def slowest(self, n: int = SLOWEST_FILES) -> list[FileMetrics]:
+        return sorted(self.files, key=lambda f: f.wall_time, reverse=True)[:n]
+
+    def write(self, output_path: Path) -> dict[str, Any]:
+        """Writes the metrics of the run as JSON and returns them."""
+        data = self.to_dict()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        return data
+
+    def print_summary(self, data: dict[str, Any]):
+        """Prints the stage timings, latency percentiles, throughput and slowest files of a run."""
+        print("\n--- SCAN METRICS ---")
+        print(f"{'Stage':<20} {'Count':>7} {'Total':>10} {'Max':>9}")
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1].seconds):
+            print(f"{name:<20} {stage.count:>7} {stage.seconds:>9.2f}s {stage.max_seconds:>8.2f}s")
+        if not self.files:
+            return
+        latency, totals = data["latency"], data["totals"]
+        cost = f"${totals['cost']:.4f}" if totals["cost"] is not None else f"unknown (no price for {', '.join(sorted({f.model for f in self.files if f.cost is None}))})"
+        print(f"[*] Latency per request: p50 {latency['p50']:.1f}s, p95 {latency['p95']:.1f}s (model p50 {latency['model_p50']:.1f}s, p95 {latency['model_p95']:.1f}s)")
+        print(f"[*] Throughput: {data['files_per_minute']:.1f} files/min, {totals['retries']} retries, estimated cost {cost}")
+        if data["escalation_rate"] is not None:
+            print(f"[*] Cascade: {data['escalation_rate']:.0%} of {self.counters['files_classified']} classified file(s) escalated to the full analysis")
+        repaired, reasked = self.counters.get("findings_repaired", 0), self.counters.get("findings_reasked", 0)
+        if repaired or reasked:
+            print(f"[*] Malformed findings: {repaired} response(s) repaired locally without another round trip, {reasked} asked again")
+        print("[*] Slowest files:")
+        for f in self.slowest():
+            batch = f" and {len(f.paths) - 1} other file(s)" if len(f.paths) > 1 else ""
+            print(f"    {f.wall_time:>7.1f}s  {f.repo}: {f.paths[0]}{batch} ({f.input_tokens} in / {f.output_tokens} out tokens, {f.retries} retries)")
+
+
+# Metrics of the current run. Tasks and threads started by the run inherit it, so deep call sites can add spans
+current_metrics: ContextVar[Optional[ScanMetrics]] = ContextVar("current_metrics", default=None)
+
+
+def span(name: str, **attributes: Any) -> AbstractContextManager:
+    """Times a stage against the current run's metrics, if any."""
+    metrics = current_metrics.get()
+    return metrics.span(name, **attributes) if metrics else nullcontext()
+
+
+def count(name: str, n: int = 1):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.count(name, n)
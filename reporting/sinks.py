@@ -0,0 +1,288 @@
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Optional
+
+from deps.deps import Finding
+from reporting.metrics import span
+
+REPORT_FORMATS = ("markdown", "jsonl", "sarif")
+PARTIAL_SUFFIX = ".partial"
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_LEVELS = {"CRITICAL": "error", "WARNING": "warning"}
+TOOL_NAME = "security-mcp-check"
+
+# Size of the blocks copied from the partial Markdown into the final report
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+@dataclass
+class ReportSummary:
+    """Everything the report lists besides the findings, known once the scan is over."""
+
+    unanalyzed_files: list[str] = field(default_factory=list)
+    skipped_files: list[str] = field(default_factory=list)
+    deduplicated_files: dict[str, Optional[str]] = field(default_factory=dict)
+    model_calls_saved: int = 0
+    triaged_files: list[str] = field(default_factory=list)
+    unscanned_files: dict[str, str] = field(default_factory=dict)  # Files that needed an analysis this run did not make, with the reason
+
+
+class ReportSink(ABC):
+    """
+    Receives the findings of each file as soon as it is done.
+
+    Findings are appended to `<path>.partial`, which survives a crash, and `finalize` turns it into the report at `path`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.partial_path = path.with_name(path.name + PARTIAL_SUFFIX)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # No newline translation, so positions in the text stream are byte offsets.
+        # The file stays open across `write` calls for the whole scan; `finalize` or `close` closes it
+        self._file: Optional[IO[str]] = open(self.partial_path, "w", encoding="utf-8", newline="")  # noqa: SIM115
+        self.findings_count = 0
+
+    def write(self, file_path: str, findings: list[Finding]):
+        """Appends the findings of one file and flushes them to disk."""
+        if not findings or self._file is None:
+            return
+        self._write(file_path, findings)
+        self._file.flush()
+        self.findings_count += len(findings)
+
+    @abstractmethod
+    def _write(self, file_path: str, findings: list[Finding]):
+        pass
+
+    @abstractmethod
+    def _finalize(self, partial: IO[str], summary: ReportSummary):
+        """Writes the final report into `partial`, which is then moved to `path`."""
+
+    def finalize(self, summary: ReportSummary):
+        if self._file is None:
+            return
+        self._finalize(self._file, summary)
+        self._file.close()
+        self._file = None
+        os.replace(self.partial_path, self.path)
+
+    def close(self):
+        """Closes the sink, leaving the partial output in place if it was not finalized."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlSink(ReportSink):
+    """One JSON object per finding."""
+
+    def _write(self, file_path: str, findings: list[Finding]):
+        for f in findings:
+            self._file.write(json.dumps(asdict(f)) + "\n")
+
+    def _finalize(self, partial: IO[str], summary: ReportSummary):
+        pass
+
+
+def _rule_id(issue: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", issue.lower()).strip("-")[:64] or "finding"
+
+
+class SarifSink(ReportSink):
+    """SARIF 2.1.0 log, for code scanning tools. The results array is streamed and the document closed on finalize."""
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._has_results = False
+        header = {"$schema": SARIF_SCHEMA, "version": "2.1.0"}
+        driver = {"name": TOOL_NAME, "rules": []}
+        # Everything up to the opening of the results array
+        self._file.write(json.dumps(header)[:-1] + ', "runs": [{"tool": ' + json.dumps({"driver": driver}) + ', "results": [\n')
+        self._file.flush()
+
+    def _write(self, file_path: str, findings: list[Finding]):
+        for f in findings:
+            location: dict = {"artifactLocation": {"uri": file_path}}
+            if f.line_hint is not None and f.line_hint >= 1:
+                location["region"] = {"startLine": f.line_hint}
+            result = {
+                "ruleId": _rule_id(f.issue),
+                "level": SARIF_LEVELS.get(f.severity, "warning"),
+                "message": {"text": f"{f.issue}: {f.explanation}"},
+                "locations": [{"physicalLocation": location}],
+            }
+            if f.recommendation:
+                result["properties"] = {"recommendation": f.recommendation}
+            self._file.write((",\n" if self._has_results else "") + json.dumps(result))
+            self._has_results = True
+
+    def _finalize(self, partial: IO[str], summary: ReportSummary):
+        partial.write("\n]}]}\n")
+
+
+def _severity_cell(severity: str) -> str:
+    if severity == "CRITICAL":
+        return "<font color='red'>CRITICAL</font>"
+    if severity == "WARNING":
+        return "<font color='orange'>WARNING</font>"
+    return severity
+
+
+def _file_list(title: str, intro: str, lines: list[str]) -> str:
+    return f"\n---\n\n### {title}\n\n{intro}\n\n" + "\n".join(lines)
+
+
+class MarkdownSink(ReportSink):
+    """
+    The Markdown report with colors.
+
+    The partial file holds one section per file in completion order. On finalize the sections are
+    copied in path order into the final report, so only their offsets are kept in memory.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._sections: list[tuple[str, int, int]] = []  # (file path, offset, length) in the partial file
+
+    def _write(self, file_path: str, findings: list[Finding]):
+        section = f"\n---\n\n### File: `{file_path}`\n\n"
+        section += "| Severity | Issue | Explanation | Recommendation | Aprox Line |\n"
+        section += "|----------|-------|-------------|----------------|------------|\n"
+        for f in sorted(findings, key=lambda x: x.severity):
+            line = f.line_hint if f.line_hint is not None else "N/A"
+            recommendation = f.recommendation if f.recommendation is not None else "-"
+            section += f"| {_severity_cell(f.severity)} | {f.issue} | {f.explanation} | {recommendation} | {line} |\n"
+        data = section.encode("utf-8")
+        offset = self._file.tell()
+        self._file.write(section)
+        self._sections.append((file_path, offset, len(data)))
+
+    def _finalize(self, partial: IO[str], summary: ReportSummary):
+        partial.flush()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as out, open(self.partial_path, "rb") as sections:
+            out.write("# Security Analysis Report\n\nThis report details the security vulnerabilities found by the AI agent.\n")
+            if not self.findings_count and not summary.skipped_files:
+                out.write("\n**No security vulnerabilities were found in the analyzed files.**\n")
+            elif not self.findings_count:
+                out.write("\n**No new security vulnerabilities were found. All files passed the cache check.**\n")
+
+            for _, offset, length in sorted(self._sections):
+                sections.seek(offset)
+                while length > 0:
+                    block = sections.read(min(length, COPY_BUFFER_SIZE))
+                    if not block:
+                        break
+                    out.write(block.decode("utf-8"))
+                    length -= len(block)
+
+            if summary.skipped_files:
+                out.write(
+                    _file_list(
+                        "Skipped Files (Unchanged)",
+                        "The following files were not analyzed in this run because their content has not changed since the last analysis. Their findings above were restored from the cache:",
+                        [f"- `{f}`" for f in sorted(summary.skipped_files)],
+                    )
+                )
+            if summary.deduplicated_files:
+                out.write(
+                    _file_list(
+                        "Deduplicated Files",
+                        f"The following files have the same content as another file, so its findings were reused instead of analyzing them again. "
+                        f"This saved {len(summary.deduplicated_files)} analyses (about {summary.model_calls_saved} model calls):",
+                        [
+                            f"- `{f}` (same as `{source}`)" if source else f"- `{f}` (identical content analyzed in a previous scan or another repository of the batch)"
+                            for f, source in sorted(summary.deduplicated_files.items())
+                        ],
+                    )
+                )
+            if summary.triaged_files:
+                out.write(
+                    _file_list(
+                        "Triaged Files (No Risky Patterns)",
+                        "The following files were not sent to the model because the local pre-triage found none of the sinks, sources or secrets declared in the rules' `triage.yaml`:",
+                        [f"- `{f}`" for f in sorted(summary.triaged_files)],
+                    )
+                )
+            if summary.unscanned_files:
+                out.write(
+                    _file_list(
+                        "Unscanned Files",
+                        "The following files changed since their last analysis but were not analyzed in this run, so their findings are not included:",
+                        [f"- `{f}` ({reason})" for f, reason in sorted(summary.unscanned_files.items())],
+                    )
+                )
+            if summary.unanalyzed_files:
+                out.write(
+                    _file_list(
+                        "Unanalyzed Files",
+                        "The following files were not analyzed because their extensions are not in the whitelist or they are in the blacklist:",
+                        [f"- `{f}`" for f in sorted(summary.unanalyzed_files)],
+                    )
+                )
+        # The partial file is replaced by the assembled report
+        os.replace(tmp_path, self.partial_path)
+
+
+SINKS = {"markdown": (MarkdownSink, ".md"), "jsonl": (JsonlSink, ".jsonl"), "sarif": (SarifSink, ".sarif")}
+
+
+class ReportWriter:
+    """Fans the findings of every completed file out to several sinks."""
+
+    def __init__(self, sinks: list[ReportSink], listener: Optional[Callable[[str, list[Finding]], None]] = None):
+        self.sinks = sinks
+        # Called with the findings of every written file, e.g. to keep them in memory between the rescans of --watch
+        self.listener = listener
+
+    @property
+    def findings_count(self) -> int:
+        return self.sinks[0].findings_count if self.sinks else 0
+
+    @property
+    def paths(self) -> list[Path]:
+        return [sink.path for sink in self.sinks]
+
+    def write(self, file_path: str, findings: list[Finding]):
+        with span("report_write"):
+            for sink in self.sinks:
+                sink.write(file_path, findings)
+        if self.listener:
+            self.listener(file_path, findings)
+
+    def finalize(self, summary: ReportSummary):
+        with span("report_finalize"):
+            for sink in self.sinks:
+                sink.finalize(summary)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_report(report_dir: Path, repo_name: str, formats: list[str], listener: Optional[Callable[[str, list[Finding]], None]] = None, kind: str = "security-report") -> ReportWriter:
+    """Opens one sink per format, writing to `<report_dir>/<repo_name>-<kind>.<ext>`."""
+    sinks = []
+    for fmt in formats:
+        sink_cls, ext = SINKS[fmt]
+        sinks.append(sink_cls(report_dir / f"{repo_name}-{kind}{ext}"))
+    return ReportWriter(sinks, listener)
@@ -0,0 +1,44 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class RepoSummary:
+    """Outcome of scanning one repository, as listed in the batch summary."""
+
+    repo: str
+    files_indexed: int = 0
+    files_analyzed: int = 0
+    files_unscanned: int = 0  # Left for the next scan by the budget of the run
+    findings: int = 0
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    duration: float = 0.0
+    reports: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def write_batch_summary(summaries: list[RepoSummary], output_path: Path):
+    """Writes the per-repo results of a batch as a Markdown table, with the raw numbers in a JSON file next to it."""
+    failed = [s for s in summaries if s.error]
+    lines = [
+        "# Batch Security Analysis Summary\n",
+        f"{len(summaries)} repositories scanned, {len(failed)} failed. "
+        f"{sum(s.files_analyzed for s in summaries)} files analyzed, {sum(s.findings for s in summaries)} findings, "
+        f"{sum(s.llm_calls for s in summaries)} LLM calls ({sum(s.input_tokens for s in summaries)} in / {sum(s.output_tokens for s in summaries)} out tokens).\n",
+        "| Repository | Files | Analyzed | Unscanned | Findings | LLM Calls | Duration | Report |",
+        "|------------|-------|----------|-----------|----------|-----------|----------|--------|",
+    ]
+    for s in sorted(summaries, key=lambda s: s.repo):
+        report = f"error: {s.error}" if s.error else ", ".join(f"`{r}`" for r in s.reports)
+        lines.append(f"| `{s.repo}` | {s.files_indexed} | {s.files_analyzed} | {s.files_unscanned} | {s.findings} | {s.llm_calls} | {s.duration:.0f}s | {report} |")
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp_path = output_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps([asdict(s) for s in summaries], indent=2), encoding="utf-8")
+    os.replace(tmp_path, output_path.with_suffix(".json"))
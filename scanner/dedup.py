@@ -0,0 +1,29 @@
+from dataclasses import replace
+from pathlib import Path
+
+from agent.rules import LanguageRule
+from cache.findings import findings_key
+from deps.deps import Finding
+
+
+def content_keys(file_hashes: dict[str, str], rules_map: dict[str, LanguageRule], model_name: str) -> dict[str, str]:
+    """Content address of every file with a rule: identical code analyzed with the same rule and model shares a key."""
+    keys = {}
+    for file_path, file_hash in file_hashes.items():
+        rule = rules_map.get(Path(file_path).suffix.lower())
+        if rule:
+            keys[file_path] = findings_key(file_hash, rule.prompt_hash, model_name)
+    return keys
+
+
+def group_by_content(files: list[str], keys: dict[str, str]) -> list[list[str]]:
+    """Groups byte-identical files. The first path of each group is analyzed on behalf of the others."""
+    groups: dict[str, list[str]] = {}
+    for file_path in files:
+        groups.setdefault(keys[file_path], []).append(file_path)
+    return list(groups.values())
+
+
+def fan_out(findings: list[Finding], paths: list[str]) -> list[Finding]:
+    """Copies the findings of one file to every path that shares its content."""
+    return [replace(f, file_path=file_path) for file_path in paths for f in findings]
@@ -0,0 +1,143 @@
+import hashlib
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from scanner.walker import without_ignored_dirs
+
+# Commits fetched by the first attempt to reach the merge base of a shallow clone, doubled on each further attempt
+DEEPEN_STEP = 50
+MAX_DEEPEN_STEPS = 5
+
+
+@dataclass
+class CloneConfig:
+    depth: int = 1  # 0 clones the full history
+    blob_filter: bool = True  # Partial clone: blobs are fetched only when checked out
+    sparse: bool = True  # Check out only the files with whitelisted extensions
+    workers: int = 4  # Repositories cloned or updated at a time in batch mode
+
+
+def _git(root: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=root, check=True, capture_output=True, text=True)
+
+
+def clone_args(config: CloneConfig) -> list[str]:
+    """Options that keep `git clone` and `git fetch` light: shallow history and no blobs up front."""
+    args = []
+    if config.depth:
+        args += ["--depth", str(config.depth)]
+    if config.blob_filter:
+        args.append("--filter=blob:none")
+    return args
+
+
+def normalize_url(url: str) -> str:
+    """`url` without the trailing slash and `.git` suffix that do not change the repository it points to."""
+    return url.rstrip("/").removesuffix(".git")
+
+
+def repo_slug(name: str, identifier: str) -> str:
+    """
+    The clone directory and report name of a repository: its `name` and a short hash of its URL or path,
+    so same-named repositories (e.g. github.com/a/mcp-server and github.com/b/mcp-server) never share them.
+    """
+    return f"{name}-{hashlib.sha256(normalize_url(identifier).encode()).hexdigest()[:8]}"
+
+
+def clone(url: str, base_dir: Path, repo_path: Path, config: CloneConfig, extensions: set[str]):
+    """Clones `url` into `repo_path`, checking out only the whitelisted extensions when `config.sparse` is set."""
+    if not config.sparse:
+        _git(base_dir, "clone", *clone_args(config), url, repo_path.name)
+        return
+    _git(base_dir, "clone", *clone_args(config), "--no-checkout", url, repo_path.name)
+    patterns = sorted(f"*{ext}" for ext in extensions)
+    # Non-cone patterns match file names in any directory, so files of other extensions are never downloaded
+    _git(repo_path, "sparse-checkout", "set", "--no-cone", *patterns)
+    _git(repo_path, "checkout")
+
+
+def is_shallow(root: Path) -> bool:
+    try:
+        return _git(root, "rev-parse", "--is-shallow-repository").stdout.strip() == "true"
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+def _resolve(root: Path, ref: str) -> Optional[str]:
+    try:
+        return _git(root, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}").stdout.strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def resolve_ref(root: Path, ref: str, config: CloneConfig) -> str:
+    """Resolves `ref` to a commit, fetching it from origin when a shallow clone does not have it yet."""
+    commit = _resolve(root, ref)
+    if commit:
+        return commit
+    print(f"[*] Fetching {ref} from origin...")
+    _git(root, "fetch", *clone_args(config), "origin", ref.removeprefix("origin/"))
+    commit = _resolve(root, "FETCH_HEAD")
+    if not commit:
+        raise ValueError(f"Could not resolve {ref!r} in {root}")
+    return commit
+
+
+def merge_base(root: Path, commit: str) -> Optional[str]:
+    """The merge base of `commit` and HEAD, deepening a shallow history step by step until it is reached."""
+    deepen = DEEPEN_STEP
+    for attempt in range(MAX_DEEPEN_STEPS + 1):
+        try:
+            return _git(root, "merge-base", commit, "HEAD").stdout.strip()
+        except subprocess.CalledProcessError:
+            if attempt == MAX_DEEPEN_STEPS or not is_shallow(root):
+                return None
+        try:
+            _git(root, "fetch", f"--deepen={deepen}", "origin")
+        except subprocess.CalledProcessError:
+            return None
+        deepen *= 2
+    return None
+
+
+def changed_files(root: Path, since: str, ignored_dirs: set[str], config: CloneConfig) -> list[str]:
+    """
+    Lists the files added or modified since `since` (committed, staged, unstaged and untracked), without walking or hashing the tree.
+
+    Changes are taken from the merge base of `since` and HEAD, as a pull request shows them. When a shallow
+    history does not reach the merge base, the working tree is compared with `since` directly.
+    """
+    commit = resolve_ref(root, since, config)
+    base = merge_base(root, commit)
+    if base is None:
+        print(f"[!] Warning: No common ancestor of {since} and HEAD in the local history. Comparing with {since} directly.")
+        base = commit
+
+    # Without rename detection the diff only needs trees, so a blobless clone fetches nothing
+    diff = _git(root, "diff", "--name-only", "--no-renames", "--diff-filter=d", "-z", base).stdout
+    untracked = _git(root, "ls-files", "--others", "--exclude-standard", "-z").stdout
+    paths = [p for p in (diff + untracked).split("\0") if p]
+    return without_ignored_dirs(dict.fromkeys(paths), ignored_dirs)
+
+
+def churn(root: Path, days: int) -> dict[str, int]:
+    """
+    Counts the commits of the last `days` days that touched each file.
+
+    Empty when `root` is not a git checkout or is a shallow clone: its grafted first commit touches every
+    file, so the counts would say nothing about which files change often.
+    """
+    if not (root / ".git").exists() or is_shallow(root):
+        return {}
+    try:
+        # Only commit trees are read, so a blobless clone fetches nothing
+        log = _git(root, "log", f"--since={days} days ago", "--name-only", "--no-renames", "--format=", "-z").stdout
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return {}
+    counts: dict[str, int] = {}
+    for path in log.replace("\n", "\0").split("\0"):
+        if path:
+            counts[path] = counts.get(path, 0) + 1
+    return counts
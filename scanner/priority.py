@@ -0,0 +1,84 @@
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# File names (without extension) of typical entry points, where untrusted input enters the application
+DEFAULT_ENTRY_POINTS = [
+    "index",
+    "main",
+    "app",
+    "server",
+    "api",
+    "routes",
+    "router",
+    "urls",
+    "views",
+    "controller",
+    "handler",
+    "handlers",
+    "middleware",
+    "auth",
+    "login",
+    "wsgi",
+    "asgi",
+    "manage",
+]
+
+
+@dataclass
+class PriorityConfig:
+    enabled: bool = True
+    entry_points: list[str] = field(default_factory=lambda: list(DEFAULT_ENTRY_POINTS))
+    churn_days: int = 90  # Commits of this window count as churn, 0 skips the git log
+    triage_weight: float = 1.0  # Per point of pre-triage score
+    entry_point_weight: float = 4.0
+    churn_weight: float = 1.0  # Per doubling of the commits touching the file
+    findings_weight: float = 2.0  # Per doubling of the findings of the file's last analyzed content
+    size_weight: float = 0.5  # Per doubling of the size in KB
+
+
+@dataclass
+class FileSignals:
+    triage_score: int = 0
+    entry_point: bool = False
+    churn: int = 0
+    past_findings: int = 0
+    size: int = 0
+
+
+def priority_score(signals: FileSignals, config: PriorityConfig) -> float:
+    return (
+        config.triage_weight * signals.triage_score
+        + config.entry_point_weight * signals.entry_point
+        + config.churn_weight * math.log2(1 + signals.churn)
+        + config.findings_weight * math.log2(1 + signals.past_findings)
+        + config.size_weight * math.log2(1 + signals.size / 1024)
+    )
+
+
+def prioritize(
+    groups: list[list[str]],
+    config: PriorityConfig,
+    triage_scores: dict[str, int],
+    sizes: dict[str, int],
+    churn: dict[str, int],
+    past_findings: dict[str, int],
+) -> list[list[str]]:
+    """
+    Orders content groups by their likely risk, highest first, so a scan cut short by its budget has analyzed the riskiest files.
+
+    A group takes the strongest signal of its paths: it is an entry point if any of its copies is one.
+    """
+    entry_points = {name.lower() for name in config.entry_points}
+
+    def score(paths: list[str]) -> float:
+        signals = FileSignals(
+            triage_score=triage_scores.get(paths[0], 0),
+            entry_point=any(Path(path).stem.lower() in entry_points for path in paths),
+            churn=max(churn.get(path, 0) for path in paths),
+            past_findings=max(past_findings.get(path, 0) for path in paths),
+            size=sizes.get(paths[0], 0),
+        )
+        return priority_score(signals, config)
+
+    return sorted(groups, key=lambda paths: -score(paths))
@@ -0,0 +1,204 @@
+import os
+import re
+import subprocess
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Optional
+
+
+def _translate(pattern: str) -> str:
+    """Translates a .gitignore glob into a regular expression body."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        else:
+            c = pattern[i]
+            if c == "*":
+                out.append("[^/]*")
+            elif c == "?":
+                out.append("[^/]")
+            elif c == "[" and (end := pattern.find("]", i + 2)) != -1:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+            elif c == "\\" and i + 1 < len(pattern):
+                i += 1
+                out.append(re.escape(pattern[i]))
+            else:
+                out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """Patterns of a single .gitignore file, matched against paths relative to the directory that holds it."""
+
+    def __init__(self, base: str, lines: list[str]):
+        self.base = base  # Repo-relative directory of the .gitignore, "" for the root
+        self.rules: list[tuple[re.Pattern, bool, bool, bool]] = []
+
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            # A slash anywhere but at the end anchors the pattern to the .gitignore directory
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if not line:
+                continue
+            self.rules.append((re.compile(f"^{_translate(line)}$"), negate, dir_only, anchored))
+
+    @classmethod
+    def from_file(cls, path: Path, base: str) -> "GitIgnore":
+        try:
+            return cls(base, path.read_text(encoding="utf-8", errors="ignore").splitlines())
+        except OSError:
+            return cls(base, [])
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Returns True if ignored, False if re-included by a negation, None if no pattern applies."""
+        if self.base:
+            rel_path = rel_path[len(self.base) + 1 :]
+        name = rel_path.rsplit("/", 1)[-1]
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path if anchored else name):
+                result = not negate
+        return result
+
+
+def _is_ignored(rel_path: str, is_dir: bool, ignores: list[GitIgnore]) -> bool:
+    # Deeper .gitignore files take precedence over their parents
+    for gitignore in reversed(ignores):
+        result = gitignore.match(rel_path, is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def _walk(root: Path, ignored_dirs: set[str], use_gitignore: bool) -> Iterator[tuple[str, bool]]:
+    """Yields the repo-relative POSIX paths of files and directories with whether they are a directory, pruning blacklisted and gitignored directories."""
+    stack: list[tuple[str, list[GitIgnore]]] = [("", [])]
+    while stack:
+        rel_dir, ignores = stack.pop()
+        try:
+            with os.scandir(root / rel_dir if rel_dir else root) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        if use_gitignore and any(e.name == ".gitignore" for e in entries):
+            ignores = [*ignores, GitIgnore.from_file(root / rel_dir / ".gitignore", rel_dir)]
+
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in ignored_dirs or (ignores and _is_ignored(rel_path, True, ignores)):
+                    continue
+                stack.append((rel_path, ignores))
+                yield rel_path, True
+            elif is_file and not (ignores and _is_ignored(rel_path, False, ignores)):
+                yield rel_path, False
+
+
+def walk_files(root: Path, ignored_dirs: set[str], use_gitignore: bool = True) -> Iterator[str]:
+    """Yields repo-relative POSIX paths of files, pruning blacklisted and gitignored directories before descending."""
+    return (path for path, is_dir in _walk(root, ignored_dirs, use_gitignore) if not is_dir)
+
+
+def walk_dirs(root: Path, ignored_dirs: set[str], use_gitignore: bool = True) -> Iterator[str]:
+    """Yields repo-relative POSIX paths of directories, starting with the root itself as `""`."""
+    yield ""
+    yield from (path for path, is_dir in _walk(root, ignored_dirs, use_gitignore) if is_dir)
+
+
+def _git_ls_files(root: Path, *args: str) -> list[str]:
+    result = subprocess.run(["git", "ls-files", "-z", *args], cwd=root, check=True, capture_output=True)
+    return [p for p in result.stdout.decode("utf-8", errors="surrogateescape").split("\0") if p]
+
+
+def git_files(root: Path, ignored_dirs: set[str]) -> Optional[list[str]]:
+    """Lists tracked and untracked, non-ignored files with `git ls-files`. Returns None if `root` is not a git checkout."""
+    if not (root / ".git").exists():
+        return None
+    try:
+        # Gitlinks (mode 160000) are submodules, which are directories rather than files.
+        # Entries tagged "S" (skip-worktree) are outside a sparse checkout and not on disk.
+        staged = _git_ls_files(root, "--stage", "-t")
+        cached = [line.split("\t", 1)[1] for line in staged if not line.startswith("S ") and line[2:8] != "160000"]
+        others = _git_ls_files(root, "--others", "--exclude-standard")
+        deleted = set(_git_ls_files(root, "--deleted"))
+    except (subprocess.CalledProcessError, FileNotFoundError, IndexError):
+        return None
+
+    return without_ignored_dirs((path for path in dict.fromkeys(cached + others) if path not in deleted), ignored_dirs)
+
+
+def without_gitignored(root: Path, paths: list[str]) -> list[str]:
+    """Drops the paths ignored by git (tracked files are never ignored). Returns `paths` unchanged if `root` is not a git checkout."""
+    if not paths or not (root / ".git").exists():
+        return paths
+    try:
+        # Exits with 1 when no path is ignored
+        result = subprocess.run(["git", "check-ignore", "-z", "--stdin"], cwd=root, input="\0".join(paths).encode("utf-8", errors="surrogateescape"), capture_output=True)
+    except FileNotFoundError:
+        return paths
+    if result.returncode not in (0, 1):
+        return paths
+    ignored = set(result.stdout.decode("utf-8", errors="surrogateescape").split("\0"))
+    return [path for path in paths if path not in ignored]
+
+
+def without_ignored_dirs(paths: Iterable[str], ignored_dirs: set[str]) -> list[str]:
+    """Drops the repo-relative paths that sit inside a blacklisted directory."""
+    return [path for path in paths if not any(part in ignored_dirs for part in path.split("/")[:-1])]
+
+
+def build_file_index(
+    root: Path,
+    allowed_exts: set[str],
+    ignored_dirs: set[str],
+    ignored_files: set[str],
+    files: Optional[Iterable[str]] = None,
+) -> tuple[list[str], list[str]]:
+    """Splits the files of the repo (or the given `files`, e.g. those changed since a ref) into whitelisted and other files."""
+    indexed_files = []
+    non_indexed_files = []
+
+    if files is None:
+        files = git_files(root, ignored_dirs)
+    if files is None:
+        files = walk_files(root, ignored_dirs)
+
+    for path_str in sorted(files):
+        name = path_str.rsplit("/", 1)[-1]
+        if name in ignored_files:
+            continue
+        if os.path.splitext(name)[1].lower() in allowed_exts:
+            indexed_files.append(path_str)
+        else:
+            non_indexed_files.append(path_str)
+    return indexed_files, non_indexed_files
@@ -0,0 +1,304 @@
+"""
+File change notifications and the local endpoint of the `--watch` daemon.
+
+Changes come from Linux inotify when available and from polling the tree otherwise. Bursts of events
+(an editor saving, a checkout, a formatter run) are debounced into one batch of repo-relative paths.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import hmac
+import ipaddress
+import json
+import os
+import re
+import secrets
+import socket
+import struct
+import sys
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from scanner.walker import walk_dirs, walk_files
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+# A None in the change queue means events were lost, so the whole repository must be checked again
+Change = Optional[str]
+
+# The request line of an HTTP request, e.g. a cross-site fetch from a browser to the loopback endpoint
+HTTP_REQUEST_LINE = re.compile(rb"^[A-Z]+ \S+ HTTP/\d")
+
+
+@dataclass
+class WatchConfig:
+    backend: str = "auto"  # "inotify", "poll", or "auto" for inotify where available
+    debounce: float = 0.5  # Seconds without a new event before a batch of changes is scanned
+    max_delay: float = 5.0  # Longest a batch waits while events keep coming
+    poll_interval: float = 2.0  # Seconds between two walks of the tree with the polling backend
+    endpoint: Optional[str] = ".agent_watch.sock"  # Unix socket path or "127.0.0.1:<port>" for scan jobs, None to disable
+    token_file: str = ".agent_watch.token"  # Secret every job sent to a TCP endpoint must carry, readable by the current user only
+    allow_other_repos: bool = False  # Accept jobs that scan another directory or a URL, not only the watched repository
+
+
+class InotifyWatcher:
+    """Watches every directory of the repo with Linux inotify, adding the directories created afterwards."""
+
+    def __init__(self, root: Path, ignored_dirs: set[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.root = root
+        self.ignored_dirs = ignored_dirs
+        self._dirs: dict[int, str] = {}
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        try:
+            for rel_dir in walk_dirs(root, ignored_dirs):
+                self._watch(rel_dir)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch(self, rel_dir: str):
+        wd = self._add_watch(self._fd, os.fsencode(self.root / rel_dir), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (raise fs.inotify.max_user_watches)")
+            return  # The directory is already gone
+        self._dirs[wd] = rel_dir
+
+    def start(self, queue: "asyncio.Queue[Change]"):
+        asyncio.get_running_loop().add_reader(self._fd, self._read, queue)
+
+    def _read(self, queue: "asyncio.Queue[Change]"):
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                queue.put_nowait(None)
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            rel_dir = self._dirs.get(wd)
+            if rel_dir is None or not name:
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                if name not in self.ignored_dirs:
+                    self._watch_new_dir(rel_path, queue)
+                continue
+            # Removed directories are queued too, so the files under them are dropped from the report
+            queue.put_nowait(rel_path)
+
+    def _watch_new_dir(self, rel_path: str, queue: "asyncio.Queue[Change]"):
+        try:
+            for sub_dir in walk_dirs(self.root / rel_path, self.ignored_dirs):
+                self._watch(f"{rel_path}/{sub_dir}" if sub_dir else rel_path)
+        except OSError as e:
+            print(f"[!] Warning: Could not watch {rel_path}: {e}")
+        # Its files may have been written before the watch was added
+        for path in walk_files(self.root / rel_path, self.ignored_dirs):
+            queue.put_nowait(f"{rel_path}/{path}")
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self._fd)
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Walks the tree every `interval` seconds and compares the mtime and size of the files with `extensions`."""
+
+    def __init__(self, root: Path, ignored_dirs: set[str], extensions: set[str], interval: float):
+        self.root = root
+        self.ignored_dirs = ignored_dirs
+        self.extensions = extensions
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._task: Optional[asyncio.Task] = None
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for path in walk_files(self.root, self.ignored_dirs):
+            if os.path.splitext(path)[1].lower() not in self.extensions:
+                continue
+            try:
+                st = os.stat(self.root / path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def start(self, queue: "asyncio.Queue[Change]"):
+        self._task = asyncio.create_task(self._poll(queue))
+
+    async def _poll(self, queue: "asyncio.Queue[Change]"):
+        while True:
+            await asyncio.sleep(self.interval)
+            snapshot = await asyncio.to_thread(self._scan)
+            for path in snapshot.keys() | self._snapshot.keys():
+                if snapshot.get(path) != self._snapshot.get(path):
+                    queue.put_nowait(path)
+            self._snapshot = snapshot
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+
+
+def open_watcher(root: Path, ignored_dirs: set[str], extensions: set[str], config: WatchConfig) -> InotifyWatcher | PollingWatcher:
+    """Picks the watcher of `config.backend`, falling back to polling where inotify is unavailable."""
+    if config.backend != "poll" and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, ignored_dirs)
+        except (OSError, AttributeError) as e:
+            print(f"[!] Warning: Could not watch {root} with inotify ({e}). Polling every {config.poll_interval}s instead.")
+    elif config.backend == "inotify":
+        print(f"[!] Warning: inotify is only available on Linux. Polling every {config.poll_interval}s instead.")
+    return PollingWatcher(root, ignored_dirs, extensions, config.poll_interval)
+
+
+async def watch_changes(root: Path, ignored_dirs: set[str], extensions: set[str], config: WatchConfig) -> AsyncIterator[Optional[set[str]]]:
+    """
+    Yields the repo-relative paths changed (created, modified, moved or deleted) in debounced batches.
+
+    A batch of None means events were lost and every file must be checked again.
+    """
+    queue: asyncio.Queue[Change] = asyncio.Queue()
+    watcher = await asyncio.to_thread(open_watcher, root, ignored_dirs, extensions, config)
+    print(f"[*] Watching {root} for changes ({type(watcher).__name__}).")
+    watcher.start(queue)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            batch: set[Change] = {await queue.get()}
+            deadline = loop.time() + config.max_delay
+            while (timeout := min(config.debounce, deadline - loop.time())) > 0:
+                try:
+                    batch.add(await asyncio.wait_for(queue.get(), timeout))
+                except TimeoutError:
+                    break
+            yield None if None in batch else {path for path in batch if path is not None}
+    finally:
+        watcher.close()
+
+
+def parse_endpoint(endpoint: str) -> tuple[str, int] | Path:
+    """
+    A `host:port` endpoint is a loopback TCP address, anything else the path of a Unix socket.
+
+    Raises ValueError for a non-loopback address, or for a Unix socket on a platform without them (Windows).
+    """
+    host, _, port = endpoint.rpartition(":")
+    if host and port.isdigit():
+        host = host.strip("[]")
+        if not ipaddress.ip_address("127.0.0.1" if host == "localhost" else host).is_loopback:
+            raise ValueError(f"The watch endpoint must be a loopback address, not {host}")
+        return host, int(port)
+    if not hasattr(socket, "AF_UNIX"):
+        raise ValueError(f"Unix sockets are not available on this platform, set watch.endpoint to a 127.0.0.1:<port> address instead of {endpoint}")
+    return Path(endpoint)
+
+
+def write_token(path: Path) -> str:
+    """Writes a new random token to `path`, readable and writable by the current user only."""
+    token = secrets.token_urlsafe(32)
+    path.unlink(missing_ok=True)  # An existing file would keep its mode
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+async def serve(endpoint: str, handler: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]], token_file: Path) -> asyncio.AbstractServer:
+    """
+    Accepts scan jobs as JSON lines on `endpoint` and answers each one with the JSON line returned by `handler`.
+
+    A Unix socket is only accessible to the current user. Any local process can connect to a TCP endpoint, so its jobs
+    must carry the token written to `token_file`. A connection sending HTTP is dropped unanswered.
+    """
+    address = parse_endpoint(endpoint)
+    token = None if isinstance(address, Path) else write_token(token_file)
+
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                if HTTP_REQUEST_LINE.match(line):
+                    break
+                authorized = True
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a scan job must be a JSON object")
+                    authorized = token is None or hmac.compare_digest(str(request.pop("token", "")), token)
+                    response = await handler(request) if authorized else {"ok": False, "error": f"invalid token, see {token_file}"}
+                except (ValueError, TypeError) as e:
+                    response = {"ok": False, "error": f"invalid request: {e}"}
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+                if not authorized:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # The client went away, or the daemon is stopping
+        finally:
+            writer.close()
+
+    if isinstance(address, Path):
+        address.unlink(missing_ok=True)  # Left over by a daemon that was killed
+        # The socket file takes its mode from the umask when it is bound, so it is never open to other users, not even
+        # before a chmod. The daemon starts listening before its first scan, with nothing else creating files meanwhile
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(on_client, path=address)
+        finally:
+            os.umask(umask)
+    else:
+        server = await asyncio.start_server(on_client, *address)
+    return server
+
+
+async def submit(endpoint: str, request: dict[str, Any], token_file: Path) -> dict[str, Any]:
+    """Sends one scan job to a running daemon and returns its answer. A job for a TCP endpoint carries the token of `token_file`."""
+    address = parse_endpoint(endpoint)
+    if isinstance(address, Path):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        request = {**request, "token": token_file.read_text(encoding="utf-8").strip()}
+        reader, writer = await asyncio.open_connection(*address)
+    try:
+        writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await writer.drain()
+        line = await reader.readline()
+    finally:
+        writer.close()
+    if not line:
+        raise ConnectionError("The daemon closed the connection without answering")
+    return json.loads(line)
@@ -0,0 +1,103 @@
+import subprocess
+import sys
+import tempfile
+import unittest
+from argparse import Namespace
+from pathlib import Path
+
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from main import report_kind, unique_targets  # noqa: E402
+
+
+def git(cwd: Path, *args: str):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def make_origin(path: Path, file_name: str):
+    """A git repository with one risky file, standing in for a remote."""
+    path.mkdir(parents=True)
+    (path / file_name).write_text("import subprocess\n\n\ndef run(value):\n    subprocess.run(value, shell=True)\n", encoding="utf-8")
+    git(path, "init", "-q")
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "init")
+
+
+def make_workdir(tmp_path: Path, latency: float) -> Path:
+    """A working directory whose config.yaml selects the fake backend."""
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    with open(ROOT / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config["model"] = {**config["model"], "backend": "fake", "fake": {"latency": latency, "findings_rate": 1.0}}
+    config["metrics"] = {**(config.get("metrics") or {}), "enabled": False}
+    (workdir / "config.yaml").write_text(yaml.safe_dump(config), encoding="utf-8")
+    (workdir / "rules").symlink_to(ROOT / "rules")
+    return workdir
+
+
+class SameNamedRepositoriesTest(unittest.TestCase):
+    def test_clones_and_reports_are_kept_apart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            make_origin(tmp_path / "a" / "mcp-server", "server_a.py")
+            make_origin(tmp_path / "b" / "mcp-server", "server_b.py")
+            workdir = make_workdir(tmp_path, latency=0)
+            url_a, url_b = (f"file://{tmp_path / owner / 'mcp-server'}" for owner in ("a", "b"))
+            # The same repository twice, once with a .git suffix
+            (workdir / "batch.txt").write_text(f"{url_a}\n{url_b}\n{url_a}.git\n", encoding="utf-8")
+
+            proc = subprocess.run([sys.executable, str(ROOT / "main.py"), "--batch", "batch.txt", "--backend", "fake"], cwd=workdir, capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+
+            clones = sorted(p for p in (workdir / "repos").iterdir())
+            self.assertEqual(len(clones), 2)
+            self.assertEqual({sorted(p.name for p in clone.glob("*.py"))[0] for clone in clones}, {"server_a.py", "server_b.py"})
+            reports = sorted((workdir / "reports").glob("*-security-report.md"))
+            self.assertEqual(len(reports), 2)
+            contents = [report.read_text(encoding="utf-8") for report in reports]
+            self.assertEqual(sorted("server_a.py" in text for text in contents), [False, True])
+            self.assertEqual(sorted("server_b.py" in text for text in contents), [False, True])
+
+
+class SharedContentTest(unittest.TestCase):
+    def test_identical_files_of_a_batch_are_analyzed_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            make_origin(tmp_path / "first", "server.py")
+            make_origin(tmp_path / "second", "server.py")
+            workdir = make_workdir(tmp_path, latency=0.2)
+            (workdir / "batch.txt").write_text(f"file://{tmp_path / 'first'}\nfile://{tmp_path / 'second'}\n", encoding="utf-8")
+
+            proc = subprocess.run([sys.executable, str(ROOT / "main.py"), "--batch", "batch.txt", "--backend", "fake"], cwd=workdir, capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+
+            # Whether the second repository waits for the running analysis or finds it in the findings store, only one is made
+            self.assertEqual(proc.stdout.count("[*] Analyzing 1 unique file(s)"), 1, proc.stdout)
+            reports = sorted((workdir / "reports").glob("*-security-report.md"))
+            self.assertEqual(len(reports), 2)
+            for report in reports:
+                self.assertIn("server.py", report.read_text(encoding="utf-8"))
+
+
+class UniqueTargetsTest(unittest.TestCase):
+    def test_duplicates_are_dropped(self):
+        targets = [("https://github.com/a/mcp-server", None), ("https://github.com/a/mcp-server.git/", None), ("https://github.com/b/mcp-server", None)]
+        self.assertEqual(unique_targets(targets), [targets[0], targets[2]])
+
+    def test_directories_are_compared_resolved(self):
+        self.assertEqual(len(unique_targets([(None, Path("repos")), (None, Path("./repos")), (None, Path("other"))])), 2)
+
+
+class ReportKindTest(unittest.TestCase):
+    def test_since_scan_has_its_own_report(self):
+        self.assertEqual(report_kind(Namespace(since=None, index_only=False, dry_run=False)), "security-report")
+        self.assertEqual(report_kind(Namespace(since="origin/main", index_only=False, dry_run=False)), "since-origin-main-security-report")
+        self.assertEqual(report_kind(Namespace(since="HEAD~3", index_only=False, dry_run=True)), "since-HEAD-3-security-plan")
+
+
+if __name__ == "__main__":
+    unittest.main()
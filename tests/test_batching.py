@@ -0,0 +1,44 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from agent.batching import BatchingConfig, pack_batches  # noqa: E402
+from config import filter_files_by_cache  # noqa: E402
+
+
+class PackBatchesTest(unittest.TestCase):
+    def test_sizes_of_just_written_files(self):
+        # Every file was modified within the racy window, as in a fresh clone or a --watch rescan
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "big.py").write_text("value = 1\n" * 10000, encoding="utf-8")
+            for i in range(3):
+                (root / f"small_{i}.py").write_text(f"value = {i}\n", encoding="utf-8")
+            files = sorted(p.name for p in root.iterdir())
+            _, _, entries = filter_files_by_cache(root, "repo", files, {})
+
+        groups = [[path] for path in files]
+        sizes = {path: entries[path]["size"] for path in files}
+        self.assertEqual(sizes["big.py"], 100000)
+        jobs = pack_batches(groups, dict.fromkeys(files, "Python"), sizes, BatchingConfig())
+        self.assertEqual(jobs, [[["big.py"]], [["small_0.py"], ["small_1.py"], ["small_2.py"]]])
+
+    def test_batches_keep_to_their_language_and_budget(self):
+        groups = [["a.py"], ["b.js"], ["c.py"], ["d.py"]]
+        languages = {"a.py": "Python", "b.js": "JavaScript", "c.py": "Python", "d.py": "Python"}
+        sizes = dict.fromkeys(languages, 4000)  # About 1000 tokens each
+        jobs = pack_batches(groups, languages, sizes, BatchingConfig(max_tokens=2500))
+        self.assertEqual(jobs, [[["a.py"], ["c.py"]], [["b.js"]], [["d.py"]]])
+
+    def test_disabled_batching_gives_one_job_per_group(self):
+        groups = [["a.py", "copy_of_a.py"], ["b.py"]]
+        jobs = pack_batches(groups, {"a.py": "Python", "b.py": "Python"}, {"a.py": 10, "b.py": 10}, BatchingConfig(enabled=False))
+        self.assertEqual(jobs, [[groups[0]], [groups[1]]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from agent.budget import BudgetConfig, ScanBudget, parse_deadline  # noqa: E402
+from deps.deps import AnalysisStats  # noqa: E402
+
+
+def make_budget(**config) -> ScanBudget:
+    # One dollar per million tokens, input and output alike
+    return ScanBudget(BudgetConfig(**config), "test-model", lambda model, input_tokens, output_tokens: (input_tokens + output_tokens) / 1_000_000)
+
+
+class ScanBudgetTest(unittest.TestCase):
+    def test_unlimited_budget_admits_everything(self):
+        budget = make_budget()
+        self.assertFalse(budget.limited)
+        self.assertIsNone(budget.start(10**9))
+
+    def test_oversized_analysis_does_not_block_smaller_ones(self):
+        budget = make_budget(max_tokens=5000)
+        self.assertEqual(budget.start(26000), "token budget exhausted")
+        self.assertIsNone(budget.exhausted)
+        self.assertIsNone(budget.start(1000))
+        self.assertIsNone(budget.start(1000))
+
+    def test_in_flight_reservations_count(self):
+        budget = make_budget(max_tokens=5000)
+        self.assertIsNone(budget.start(3000))
+        self.assertEqual(budget.start(3000), "token budget exhausted")
+        budget.finish(3000, None, [AnalysisStats(input_tokens=1000, output_tokens=500)])
+        # Calibrated on what the first analysis used: half its estimate
+        self.assertIsNone(budget.start(3000))
+
+    def test_spent_budget_refuses_every_later_analysis(self):
+        budget = make_budget(max_tokens=5000)
+        self.assertIsNone(budget.start(4000))
+        budget.finish(4000, None, [AnalysisStats(input_tokens=4500, output_tokens=600)])
+        self.assertEqual(budget.start(1), "token budget exhausted")
+        self.assertEqual(budget.exhausted, "token budget exhausted")
+
+    def test_cost_limit(self):
+        budget = make_budget(max_cost=0.01)
+        self.assertEqual(budget.start(20000), "cost budget exhausted")
+        self.assertIsNone(budget.start(5000))
+
+    def test_passed_deadline_is_final(self):
+        budget = make_budget(deadline="0s")
+        self.assertEqual(budget.start(1), "deadline reached")
+        self.assertEqual(budget.exhausted, "deadline reached")
+
+    def test_parse_deadline(self):
+        self.assertEqual(parse_deadline("90m"), 5400)
+        self.assertEqual(parse_deadline("2h"), 7200)
+        with self.assertRaises(ValueError):
+            parse_deadline("soon")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from cache.checkpoint import ScanCheckpoint  # noqa: E402
+from cache.findings import FindingsStore  # noqa: E402
+from deps.deps import AnalysisStats, Finding  # noqa: E402
+from main import resume_checkpoint  # noqa: E402
+from reporting.sinks import open_report  # noqa: E402
+
+
+def finding(file_path: str) -> Finding:
+    return Finding(file_path=file_path, issue="Command injection", severity="CRITICAL", explanation="", recommendation=None, line_hint=2)
+
+
+class CheckpointResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.store = FindingsStore(self.root / "findings")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def interrupted_scan(self) -> ScanCheckpoint:
+        """A scan that finished a.py, b.py (same content as a.py) and c.py, failed d.py and was then killed."""
+        checkpoint = ScanCheckpoint("repo", self.root / "checkpoints")
+        checkpoint.start()
+        self.store.put("key-a", [finding("a.py")])
+        checkpoint.record("a.py", "done", "key-a", stats=AnalysisStats(llm_calls=1))
+        checkpoint.record("b.py", "done", "key-a", source="a.py")
+        self.store.put("key-c", [])
+        checkpoint.record("c.py", "done", "key-c")
+        checkpoint.record("d.py", "failed", "key-d")
+        checkpoint.close()
+        return ScanCheckpoint("repo", self.root / "checkpoints")
+
+    def test_finished_files_are_restored(self):
+        checkpoint = self.interrupted_scan()
+        self.assertTrue(checkpoint.exists())
+        file_keys = {"a.py": "key-a", "b.py": "key-a", "c.py": "key-c", "d.py": "key-d"}
+        with open_report(self.root / "reports", "repo", ["jsonl"]) as report:
+            resumed = resume_checkpoint(checkpoint, file_keys, self.store, report)
+            self.assertEqual(report.findings_count, 2)
+        self.assertEqual(sorted(resumed), ["a.py", "b.py", "c.py"])
+        self.assertEqual(resumed["b.py"].source, "a.py")
+        self.assertEqual(resumed["a.py"].stats.llm_calls, 1)
+
+    def test_files_changed_since_the_interruption_are_analyzed_again(self):
+        checkpoint = self.interrupted_scan()
+        file_keys = {"a.py": "key-a2", "b.py": "key-a", "c.py": "key-c"}
+        self.store._path("key-c").unlink()  # Evicted since
+        with open_report(self.root / "reports", "repo", ["jsonl"]) as report:
+            resumed = resume_checkpoint(checkpoint, file_keys, self.store, report)
+        self.assertEqual(sorted(resumed), ["b.py"])
+
+    def test_resumed_journal_continues_after_a_cut_short_line(self):
+        checkpoint = self.interrupted_scan()
+        with open(checkpoint.path, "a", encoding="utf-8") as f:
+            f.write('{"path": "e.py", "sta')  # Killed while writing
+        checkpoint.start(resume=True)
+        checkpoint.record("e.py", "done", "key-e")
+        checkpoint.close()
+        self.assertEqual(sorted(ScanCheckpoint("repo", self.root / "checkpoints").load()), ["a.py", "b.py", "c.py", "d.py", "e.py"])
+
+    def test_completed_scan_removes_its_journal(self):
+        checkpoint = self.interrupted_scan()
+        checkpoint.start(resume=True)
+        checkpoint.complete()
+        self.assertFalse(checkpoint.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.chunking import Chunk, merge_chunk_findings  # noqa: E402
+from deps.deps import Finding  # noqa: E402
+
+
+def finding(issue: str, line: int) -> Finding:
+    return Finding(file_path="app.py", issue=issue, severity="CRITICAL", explanation="", recommendation=None, line_hint=line)
+
+
+class MergeChunkFindingsTest(unittest.TestCase):
+    def test_overlap_keeps_different_issues_on_the_same_line(self):
+        first, second = Chunk(1, 30, ""), Chunk(20, 50, "")
+        results = [
+            (first, [finding("Command injection", 25)]),
+            (second, [finding("command injection.", 25), finding("Path traversal", 25)]),
+        ]
+        self.assertEqual([f.issue for f in merge_chunk_findings(results)], ["Command injection", "Path traversal"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from cache.findings import FindingsStore, findings_key  # noqa: E402
+from deps.deps import Finding  # noqa: E402
+
+
+def finding(issue: str) -> Finding:
+    return Finding(file_path="app.py", issue=issue, severity="WARNING", explanation="", recommendation=None, line_hint=3)
+
+
+class FindingsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = FindingsStore(Path(self.tmp.name))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_and_get(self):
+        key = findings_key("file", "rule", "model")
+        self.assertIsNone(self.store.get(key))
+        self.store.put(key, [finding("Command injection")])
+        self.assertEqual([f.file_path for f in self.store.get(key, "other.py")], ["other.py"])
+        self.assertEqual(self.store.count(key), 1)
+
+    def test_put_leaves_no_temporary_file(self):
+        key = findings_key("file", "rule", "model")
+        self.store.put(key, [finding("a")])
+        self.store.put(key, [finding("b")])
+        self.assertEqual([p.suffix for p in Path(self.tmp.name).rglob("*") if p.is_file()], [".json"])
+        self.assertEqual([f.issue for f in self.store.get(key)], ["b"])
+
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        FindingsStore(root).put(findings_key("old", "rule", "model"), [])
+        self.old_entry = next(root.rglob("*.json"))
+        long_ago = time.time() - 90 * 86400
+        os.utime(self.old_entry, (long_ago, long_ago))
+        self.store = FindingsStore(root, max_age_days=30)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_a_run_that_stored_nothing_does_not_evict(self):
+        self.assertEqual(self.store.evict(), 0)
+        self.assertTrue(self.old_entry.exists())
+
+    def test_eviction_is_throttled(self):
+        self.store.put(findings_key("new", "rule", "model"), [])
+        self.assertEqual(self.store.evict(), 1)
+        self.assertFalse(self.old_entry.exists())
+        self.store.put(findings_key("other", "rule", "model"), [])
+        self.assertEqual(self.store.evict(), 0)  # Evicted less than EVICT_INTERVAL ago
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.repair import coerce_line_hint, repair_json  # noqa: E402
+
+
+class RepairJsonTest(unittest.TestCase):
+    def test_trailing_commas_are_dropped(self):
+        self.assertEqual(repair_json('```json\n[{"issue": "a", "line_hint": 3,},]\n```'), [{"issue": "a", "line_hint": 3}])
+
+    def test_escaped_quote_does_not_end_the_string(self):
+        text = '[{"issue": "a \\"quoted, ]\\" x", "severity": "WARNING",},]'
+        self.assertEqual(repair_json(text), [{"issue": 'a "quoted, ]" x', "severity": "WARNING"}])
+
+    def test_escaped_backslash_ends_before_the_quote(self):
+        self.assertEqual(repair_json('[{"issue": "C:\\\\", "severity": "WARNING",}]'), [{"issue": "C:\\", "severity": "WARNING"}])
+
+
+class CoerceLineHintTest(unittest.TestCase):
+    def test_line_references(self):
+        self.assertEqual([coerce_line_hint(v) for v in (12, "12", "L12", "line 12", "12-15", 12.0)], [12] * 6)
+
+    def test_snippets_are_not_line_numbers(self):
+        self.assertIsNone(coerce_line_hint("eval(x[0])"))
+
+
+if __name__ == "__main__":
+    unittest.main()
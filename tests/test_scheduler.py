@@ -0,0 +1,118 @@
+import asyncio
+import sys
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from agent.fake_lm import FakeBackend, FakeLMConfig, FakeLMError  # noqa: E402
+from agent.scheduler import AnalysisScheduler, RateLimiter, SchedulerConfig, is_retryable  # noqa: E402
+
+
+def make_scheduler(**config) -> AnalysisScheduler:
+    return AnalysisScheduler(SchedulerConfig(**{"max_retries": 3, "backoff_base": 0.001, "backoff_max": 0.01, **config}))
+
+
+class RetryTest(unittest.IsolatedAsyncioTestCase):
+    async def test_retryable_errors_are_retried(self):
+        errors = [FakeLMError(429), FakeLMError(503)]
+        calls = 0
+
+        async def call() -> str:
+            nonlocal calls
+            calls += 1
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        self.assertEqual(await make_scheduler().call(call), "ok")
+        self.assertEqual(calls, 3)
+
+    async def test_retries_are_bounded(self):
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            raise FakeLMError(429)
+
+        with self.assertRaises(FakeLMError):
+            await make_scheduler(max_retries=2).call(call)
+        self.assertEqual(calls, 3)
+
+    async def test_other_errors_are_not_retried(self):
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            raise FakeLMError(400)
+
+        with self.assertRaises(FakeLMError):
+            await make_scheduler().call(call)
+        self.assertEqual(calls, 1)
+
+    async def test_fake_backend_errors_are_retried_until_a_call_succeeds(self):
+        backend = FakeBackend(FakeLMConfig(error_rate=0.5))
+
+        async def call() -> str:
+            backend.maybe_fail(backend.rng("app.py"))
+            return "ok"
+
+        self.assertEqual(await make_scheduler(max_retries=20).call(call), "ok")
+
+    def test_retry_after_header_sets_the_delay(self):
+        error = FakeLMError(429)
+        error.response = SimpleNamespace(headers={"retry-after": "0.005"})
+        self.assertTrue(is_retryable(error))
+        self.assertEqual(make_scheduler()._backoff(0, error), 0.005)
+        error.response.headers["retry-after"] = "120"
+        self.assertEqual(make_scheduler()._backoff(0, error), 0.01)  # Capped by backoff_max
+
+
+class MapTest(unittest.IsolatedAsyncioTestCase):
+    async def test_workers_bound_the_jobs_in_flight(self):
+        scheduler = make_scheduler(workers=2)
+        in_flight = peak = 0
+
+        async def job(n: int) -> int:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return n * 2
+
+        self.assertEqual(await scheduler.map(range(6), job), [0, 2, 4, 6, 8, 10])
+        self.assertEqual(peak, 2)
+
+
+class RateLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_per_window(self):
+        limiter = RateLimiter(requests_per_minute=2, window=0.2)
+        start = time.monotonic()
+        await limiter.acquire()
+        await limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    async def test_tokens_per_window(self):
+        limiter = RateLimiter(tokens_per_minute=100, window=0.2)
+        start = time.monotonic()
+        await limiter.acquire(80)
+        await limiter.acquire(80)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    async def test_oversized_request_passes_an_empty_window(self):
+        limiter = RateLimiter(tokens_per_minute=100, window=0.2)
+        start = time.monotonic()
+        await limiter.acquire(500)
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
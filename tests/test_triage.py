@@ -0,0 +1,72 @@
+import io
+import sys
+import unittest
+from contextlib import redirect_stdout
+from dataclasses import replace
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from agent.rules import LanguageRule  # noqa: E402
+from agent.triage import TriageConfig, TriagePattern, TriageRules, load_triage_rules, triage_code  # noqa: E402
+from main import apply_triage  # noqa: E402
+
+MCP_READ_TOOL = """import { readFileSync } from "fs";
+
+server.tool("read", async ({ path }) => readFileSync(path));
+"""
+
+
+class JavaScriptTriageTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = load_triage_rules(ROOT / "rules" / "javascript" / "triage.yaml")
+
+    def test_mcp_tool_reading_a_bare_fs_import_is_flagged(self):
+        result = triage_code(MCP_READ_TOOL, "server.js", self.rules)
+        self.assertGreaterEqual(result.score, self.rules.min_score)
+        self.assertEqual({h.name for h in result.hints}, {"file system access", "MCP tool handler"})
+
+    def test_clean_files_are_not_skipped_by_default(self):
+        self.assertFalse(TriageConfig().skip_clean)
+
+
+class PythonTriageTest(unittest.TestCase):
+    def test_mcp_tool_handler_is_flagged(self):
+        rules = load_triage_rules(ROOT / "rules" / "python" / "triage.yaml")
+        result = triage_code("@mcp.tool()\ndef read(path: str) -> str:\n    return path\n", "server.py", rules)
+        self.assertGreaterEqual(result.score, rules.min_score)
+
+
+class CallFallbackTest(unittest.TestCase):
+    """Call patterns matched as text, for JavaScript and Python that does not parse."""
+
+    def setUp(self):
+        self.rules = TriageRules([TriagePattern(name="shell", call="exec", kwargs={"shell": True}, weight=5)])
+
+    def test_keyword_argument_is_required(self):
+        self.assertEqual(triage_code("exec(cmd);\nrun({ shell: true });\n", "app.js", self.rules).score, 0)
+        self.assertEqual(triage_code("exec(cmd, { shell: false });\n", "app.js", self.rules).score, 0)
+
+    def test_keyword_argument_inside_the_call(self):
+        self.assertEqual(triage_code("exec(build(cmd), {\n  shell: true,\n});\n", "app.js", self.rules).score, 5)
+        self.assertEqual(triage_code("exec(cmd, shell=True)\ndef broken(:\n", "app.py", self.rules).score, 5)
+
+
+class TriageCacheKeyTest(unittest.TestCase):
+    def test_triage_patterns_are_part_of_the_prompt_hash(self):
+        rule = LanguageRule(language="Python", extensions=[".py"], prompt="Find vulnerabilities.")
+        with_triage = replace(rule, triage=TriageRules([TriagePattern(name="eval", call="eval")]))
+        changed = replace(rule, triage=TriageRules([TriagePattern(name="eval", call="eval", weight=3)]))
+        self.assertEqual(len({rule.prompt_hash, with_triage.prompt_hash, changed.prompt_hash}), 3)
+
+    def test_no_message_without_triage_patterns(self):
+        rule = LanguageRule(language="Text", extensions=[".txt"], prompt="")
+        out = io.StringIO()
+        with redirect_stdout(out):
+            groups, results, triaged = apply_triage(ROOT, [["a.txt"]], {".txt": rule}, TriageConfig())
+        self.assertEqual((groups, results, triaged, out.getvalue()), ([["a.txt"]], {}, [], ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import socket
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scanner.watch import serve, submit  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TcpEndpointTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.token_file = Path(self.tmp.name) / "token"
+        self.port = free_port()
+        self.jobs: list[dict] = []
+
+        async def handler(request: dict) -> dict:
+            self.jobs.append(request)
+            return {"ok": True}
+
+        self.server = await serve(f"127.0.0.1:{self.port}", handler, self.token_file)
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.tmp.cleanup()
+
+    async def test_jobs_with_the_token_are_accepted(self):
+        self.assertEqual(self.token_file.stat().st_mode & 0o777, 0o600)
+        self.assertEqual(await submit(f"127.0.0.1:{self.port}", {"action": "status"}, self.token_file), {"ok": True})
+        self.assertEqual(self.jobs, [{"action": "status"}])
+
+    async def test_jobs_without_the_token_are_refused(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b'{"directory": "/"}\n{"directory": "/"}\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        self.assertFalse(response["ok"])
+        self.assertEqual(await reader.readline(), b"")  # Dropped after the first refusal
+        writer.close()
+        self.assertEqual(self.jobs, [])
+
+    async def test_http_requests_are_dropped(self):
+        token = self.token_file.read_text(encoding="utf-8")
+        body = json.dumps({"directory": "/", "token": token})
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"POST / HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: text/plain\r\n\r\n{body}\n".encode())
+        await writer.drain()
+        self.assertEqual(await reader.readline(), b"")
+        writer.close()
+        self.assertEqual(self.jobs, [])
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets only")
+class UnixEndpointTest(unittest.IsolatedAsyncioTestCase):
+    async def test_socket_is_private_from_the_start(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "watch.sock"
+
+            async def handler(request: dict) -> dict:
+                return {"ok": True}
+
+            server = await serve(str(path), handler, Path(tmp) / "token")
+            try:
+                self.assertEqual(path.stat().st_mode & 0o077, 0)
+                self.assertFalse((Path(tmp) / "token").exists())
+                self.assertEqual(await submit(str(path), {"action": "status"}, Path(tmp) / "token"), {"ok": True})
+            finally:
+                server.close()
+                await server.wait_closed()
+
+
+if __name__ == "__main__":
+    unittest.main()